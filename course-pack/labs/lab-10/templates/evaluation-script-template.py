@@ -22,6 +22,11 @@ from pathlib import Path
 from typing import Dict, List, Any
 import argparse
 
+try:
+    import tiktoken  # optional: exact token counts for cost estimates
+except ImportError:
+    tiktoken = None
+
 # TODO: Import your system's query function
 # from your_project import query_system
 
@@ -69,6 +74,16 @@ def evaluate_criteria_based(response: str, criteria: Dict[str, bool]) -> float:
     return 0.75
 
 
+def count_tokens(text: str, model: str = "gpt-4") -> int:
+    """Token count with tiktoken if installed, else ~4 characters per token"""
+    if tiktoken is not None:
+        try:
+            return len(tiktoken.encoding_for_model(model).encode(text))
+        except Exception:
+            pass  # unknown model, or the encoding can't be downloaded
+    return len(text) // 4
+
+
 def estimate_cost(query: str, response: str, model: str = "gpt-4") -> float:
     """
     Estimate API cost based on token counts
@@ -77,9 +92,8 @@ def estimate_cost(query: str, response: str, model: str = "gpt-4") -> float:
     - GPT-4: $0.03/1K input tokens, $0.06/1K output tokens
     - GPT-3.5: $0.0015/1K input tokens, $0.002/1K output tokens
     """
-    # Rough token estimation: ~4 characters per token
-    input_tokens = len(query) / 4
-    output_tokens = len(response) / 4
+    input_tokens = count_tokens(query, model)
+    output_tokens = count_tokens(response, model)
     
     if model == "gpt-4":
         cost = (input_tokens / 1000 * 0.03) + (output_tokens / 1000 * 0.06)
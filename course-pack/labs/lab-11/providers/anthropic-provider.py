@@ -1,42 +1,158 @@
-from anthropic import Anthropic
+from anthropic import Anthropic, AsyncAnthropic, DefaultHttpxClient, DefaultAsyncHttpxClient
+from anthropic.types import Usage
+import asyncio
 import time
-from .base_provider import LLMProvider, ProviderResponse, ProviderError
+from typing import AsyncIterator, Iterator, Optional
+from .base_provider import LLMProvider, ProviderResponse, ProviderError, StreamChunk, StreamTimer, retry_after_header
+from .batch import AnthropicBatchBackend
+from .http_pool import get_http_client, get_async_http_client
+from .token_counter import TOKEN_COUNTER
 
 class AnthropicProvider(LLMProvider):
     # TODO: Add Anthropic pricing
+    # Prompt caching: reads bill at 0.1x input, writes at 1.25x (5-minute TTL)
     PRICING = {
-        "claude-sonnet-4-20250514": {"input": 3.00, "output": 15.00},
-        "claude-haiku-3-5-20241022": {"input": 0.80, "output": 4.00},
+        "claude-sonnet-4-20250514": {"input": 3.00, "output": 15.00, "cached_input": 0.30, "cache_write": 3.75},
+        "claude-haiku-3-5-20241022": {"input": 0.80, "output": 4.00, "cached_input": 0.08, "cache_write": 1.00},
     }
+    # Tier 1 quotas (input tokens per minute); check your console's limits page
+    RATE_LIMITS = {
+        "claude-sonnet-4-20250514": {"rpm": 50, "tpm": 30_000},
+        "claude-haiku-3-5-20241022": {"rpm": 50, "tpm": 50_000},
+    }
+    # Output has its own (OTPM) limit, and cached reads don't count towards ITPM
+    TPM_INCLUDES_OUTPUT = False
+    MAX_BATCH_REQUESTS = 100_000
     
-    def __init__(self, api_key: str, model: str = "claude-haiku-3-5-20241022"):
-        super().__init__(api_key, model)
+    def __init__(self, api_key: str, model: str = "claude-haiku-3-5-20241022",
+                 system_prompt: Optional[str] = None, cache_prompt: bool = True):
+        super().__init__(api_key, model, system_prompt)
+        # Mark the system prompt as a cache breakpoint (ignored below the model's
+        # minimum cacheable length: 1024 tokens, 2048 for Haiku)
+        self.cache_prompt = cache_prompt
         # TODO: Initialize Anthropic client
-        self.client = Anthropic(api_key=api_key)
+        self.client = Anthropic(api_key=api_key, http_client=get_http_client(DefaultHttpxClient))
+        self._async_client = None
+        self._async_loop = None
+        self.batch_backend = AnthropicBatchBackend(self.client)
+    
+    @property
+    def async_client(self) -> AsyncAnthropic:
+        # One async client per event loop, all sharing the loop's connection pool
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            self._async_client = AsyncAnthropic(
+                api_key=self.api_key,
+                http_client=get_async_http_client(DefaultAsyncHttpxClient)
+            )
+            self._async_loop = loop
+        return self._async_client
     
     def generate(self, prompt: str, max_tokens: int = 500) -> ProviderResponse:
         start = time.time()
         
         # TODO: Call Anthropic API (hint: use client.messages.create)
         response = self.client.messages.create(
-            model=self.model,
-            max_tokens=max_tokens,
-            messages=[{"role": "user", "content": prompt}]
+            **self._request_params(prompt, max_tokens)
         )
         
         latency = (time.time() - start) * 1000
         
         # TODO: Calculate cost (similar to OpenAI)
-        pricing = self.PRICING[self.model]
-        input_cost = (response.usage.input_tokens / 1_000_000) * pricing["input"]
-        output_cost = (response.usage.output_tokens / 1_000_000) * pricing["output"]
+        # Note: Anthropic uses content[0].text
+        return self._to_response(response.content[0].text, response.usage, latency, prompt=prompt)
+    
+    async def agenerate(self, prompt: str, max_tokens: int = 500) -> ProviderResponse:
+        start = time.time()
+        
+        response = await self.async_client.messages.create(
+            **self._request_params(prompt, max_tokens)
+        )
         
+        latency = (time.time() - start) * 1000
+        return self._to_response(response.content[0].text, response.usage, latency, prompt=prompt)
+    
+    def generate_stream(self, prompt: str, max_tokens: int = 500) -> Iterator[StreamChunk]:
+        timer = StreamTimer()
+        with self.client.messages.stream(
+            **self._request_params(prompt, max_tokens)
+        ) as stream:
+            for text in stream.text_stream:
+                timer.tick()
+                yield StreamChunk(text)
+            message = stream.get_final_message()
+        yield StreamChunk("", self._to_response(
+            "".join(block.text for block in message.content if block.type == "text"),
+            message.usage, timer.latency_ms, timer, prompt
+        ))
+    
+    async def agenerate_stream(self, prompt: str, max_tokens: int = 500) -> AsyncIterator[StreamChunk]:
+        timer = StreamTimer()
+        async with self.async_client.messages.stream(
+            **self._request_params(prompt, max_tokens)
+        ) as stream:
+            async for text in stream.text_stream:
+                timer.tick()
+                yield StreamChunk(text)
+            message = await stream.get_final_message()
+        yield StreamChunk("", self._to_response(
+            "".join(block.text for block in message.content if block.type == "text"),
+            message.usage, timer.latency_ms, timer, prompt
+        ))
+    
+    def batch_request(self, custom_id: str, prompt: str, max_tokens: int = 500) -> dict:
+        return {
+            "custom_id": custom_id,
+            "params": self._request_params(prompt, max_tokens)
+        }
+    
+    def parse_batch_result(self, record: dict, latency_ms: float) -> Optional[ProviderResponse]:
+        result = record["result"]
+        if result["type"] != "succeeded":
+            return None
+        message = result["message"]
+        response = self._to_response(
+            "".join(block["text"] for block in message["content"] if block["type"] == "text"),
+            Usage.model_validate(message["usage"]), latency_ms
+        )
+        response.cost *= 1 - self.BATCH_DISCOUNT
+        return response
+    
+    def _request_params(self, prompt: str, max_tokens: int) -> dict:
+        params = {
+            "model": self.model,
+            "max_tokens": max_tokens,
+            "messages": [{"role": "user", "content": prompt}]
+        }
+        if self.system_prompt:
+            block = {"type": "text", "text": self.system_prompt}
+            if self.cache_prompt:
+                block["cache_control"] = {"type": "ephemeral"}
+            params["system"] = [block]
+        return params
+    
+    def _to_response(self, content: str, usage, latency: float,
+                     timer: Optional[StreamTimer] = None,
+                     prompt: Optional[str] = None) -> ProviderResponse:
+        # input_tokens excludes cached reads/writes; fold them back into the total
+        cached = usage.cache_read_input_tokens or 0
+        written = usage.cache_creation_input_tokens or 0
+        input_tokens = usage.input_tokens + cached + written
+        if prompt is not None:
+            # Calibrate the local Claude token estimate (used for TPM and cost)
+            TOKEN_COUNTER.record_usage(self.model, prompt, input_tokens, self.system_prompt)
         return ProviderResponse(
-            content=response.content[0].text,  # Note: Anthropic uses content[0].text
+            content=content,
             model=self.model,
-            tokens_used=response.usage.input_tokens + response.usage.output_tokens,
-            cost=input_cost + output_cost,
-            latency_ms=latency
+            tokens_used=input_tokens + usage.output_tokens,
+            cost=self.calculate_cost(input_tokens, usage.output_tokens, cached, written),
+            latency_ms=latency,
+            ttft_ms=timer.ttft_ms if timer else None,
+            inter_token_latency_ms=timer.inter_token_latency_ms if timer else None,
+            input_tokens=input_tokens,
+            output_tokens=usage.output_tokens,
+            cached_tokens=cached,
+            cache_write_tokens=written
         )
     
     def classify_error(self, error: Exception) -> ProviderError:
@@ -44,7 +160,7 @@ class AnthropicProvider(LLMProvider):
         error_msg = str(error).lower()
         
         if "rate_limit" in error_msg or "429" in error_msg:
-            return ProviderError("rate_limit", str(error), 60)
+            return ProviderError("rate_limit", str(error), retry_after_header(error))
         elif "timeout" in error_msg:
             return ProviderError("timeout", str(error))
         elif "invalid" in error_msg:
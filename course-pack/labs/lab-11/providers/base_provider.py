@@ -1,6 +1,13 @@
+import asyncio
+import os
+import tempfile
+import time
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import Optional
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+from .batch import BatchJob, COMPLETED, TERMINAL_STATES, collect_results, combined_status, write_jsonl
+from .structured_output import PartialJSONValidator, parse_json, schema_instructions
+from .token_counter import TOKEN_COUNTER
 
 @dataclass
 class ProviderResponse:
@@ -9,6 +16,21 @@ class ProviderResponse:
     tokens_used: int
     cost: float
     latency_ms: float
+    # Streaming only: time to first token, and mean gap between later chunks
+    ttft_ms: Optional[float] = None
+    inter_token_latency_ms: Optional[float] = None
+    # Usage split as reported by the API; input_tokens includes cached tokens
+    input_tokens: Optional[int] = None
+    output_tokens: Optional[int] = None
+    # Prompt caching: input tokens read from / written to the vendor's prefix cache
+    cached_tokens: int = 0
+    cache_write_tokens: int = 0
+
+@dataclass
+class StreamChunk:
+    """One piece of a streamed completion; the last chunk carries the response"""
+    text: str
+    response: Optional[ProviderResponse] = None
 
 @dataclass
 class ProviderError:
@@ -16,15 +38,242 @@ class ProviderError:
     message: str
     retry_after: Optional[int] = None
 
+class AllProvidersFailed(Exception):
+    """Raised by the routers; `error` is the last provider failure (None if every provider was skipped)"""
+    
+    def __init__(self, error: Optional[ProviderError] = None):
+        detail = f" (last: {error.error_type}: {error.message})" if error else " (all skipped: breakers open)"
+        super().__init__("All providers failed" + detail)
+        self.error = error
+
+def retry_after_header(error: Exception) -> Optional[int]:
+    """Seconds from the Retry-After header of an SDK error's response, if the server sent one"""
+    response = getattr(error, "response", None)
+    value = getattr(response, "headers", {}).get("retry-after")
+    try:
+        return max(1, int(float(value))) if value is not None else None
+    except ValueError:
+        return None  # an HTTP date; fall back to the breaker's own cooldown
+
+class StreamTimer:
+    """Measures time-to-first-token and inter-token latency for a stream"""
+    
+    def __init__(self):
+        self.start = time.time()
+        self.first = None
+        self.last = None
+        self.chunks = 0
+    
+    def tick(self):
+        now = time.time()
+        if self.first is None:
+            self.first = now
+        self.last = now
+        self.chunks += 1
+    
+    @property
+    def latency_ms(self) -> float:
+        return (time.time() - self.start) * 1000
+    
+    @property
+    def ttft_ms(self) -> Optional[float]:
+        if self.first is None:
+            return None
+        return (self.first - self.start) * 1000
+    
+    @property
+    def inter_token_latency_ms(self) -> Optional[float]:
+        if self.chunks < 2:
+            return None
+        return (self.last - self.first) * 1000 / (self.chunks - 1)
+
 class LLMProvider(ABC):
-    def __init__(self, api_key: str, model: str):
+    # Pricing per 1M tokens, keyed by model (set by each provider)
+    PRICING: Dict[str, Dict[str, float]] = {}
+    # Requests/tokens per minute, keyed by model (used by RateLimiter)
+    RATE_LIMITS: Dict[str, Dict[str, int]] = {}
+    # Whether the "tpm" quota counts output tokens too, or only input
+    TPM_INCLUDES_OUTPUT = True
+    # Batch APIs: discount vs. live calls, and max requests per submitted batch
+    BATCH_DISCOUNT = 0.5
+    MAX_BATCH_REQUESTS = 50_000
+    
+    def __init__(self, api_key: str, model: str, system_prompt: Optional[str] = None):
         self.api_key = api_key
         self.model = model
+        # Static instructions sent ahead of every prompt; kept separate so the
+        # vendor's prompt cache can reuse it across requests
+        self.system_prompt = system_prompt
+        # Where submit_batch sends jobs (providers set their vendor backend)
+        self.batch_backend = None
     
     @abstractmethod
     def generate(self, prompt: str, max_tokens: int = 500) -> ProviderResponse:
         pass
     
+    async def agenerate(self, prompt: str, max_tokens: int = 500) -> ProviderResponse:
+        """Async version of generate.
+        
+        Providers override this with their async SDK client. The default
+        runs the blocking call in a worker thread.
+        """
+        return await asyncio.to_thread(self.generate, prompt, max_tokens)
+    
+    def generate_stream(self, prompt: str, max_tokens: int = 500) -> Iterator[StreamChunk]:
+        """Yield text as it arrives; the final chunk has text="" and the response.
+        
+        Providers override this with their streaming API. The default yields
+        the whole completion as one chunk.
+        """
+        response = self.generate(prompt, max_tokens)
+        response.ttft_ms = response.latency_ms
+        yield StreamChunk(response.content)
+        yield StreamChunk("", response)
+    
+    async def agenerate_stream(self, prompt: str, max_tokens: int = 500) -> AsyncIterator[StreamChunk]:
+        """Async version of generate_stream"""
+        response = await self.agenerate(prompt, max_tokens)
+        response.ttft_ms = response.latency_ms
+        yield StreamChunk(response.content)
+        yield StreamChunk("", response)
+    
+    def generate_structured(self, prompt: str, schema: Any,
+                            max_tokens: int = 500) -> Tuple[Any, ProviderResponse]:
+        """Ask for JSON matching `schema` and validate it straight from the text.
+        
+        `schema` is a Pydantic model or any type (e.g. List[SearchResult]).
+        Raises pydantic.ValidationError if the output doesn't match.
+        """
+        response = self.generate(prompt + schema_instructions(schema), max_tokens)
+        return parse_json(response.content, schema), response
+    
+    async def agenerate_structured(self, prompt: str, schema: Any,
+                                   max_tokens: int = 500) -> Tuple[Any, ProviderResponse]:
+        response = await self.agenerate(prompt + schema_instructions(schema), max_tokens)
+        return parse_json(response.content, schema), response
+    
+    def generate_structured_stream(self, prompt: str, schema: Any, max_tokens: int = 500
+                                   ) -> Iterator[Tuple[Any, Optional[ProviderResponse]]]:
+        """Yield (partial dict/list, None) as JSON streams in, then (validated object, response)"""
+        validator = PartialJSONValidator(schema)
+        for chunk in self.generate_stream(prompt + schema_instructions(schema), max_tokens):
+            if chunk.response:
+                yield validator.finish(), chunk.response
+            elif validator.feed(chunk.text) is not None:
+                yield validator.partial, None
+    
+    async def agenerate_batch(
+        self,
+        prompts: List[str],
+        max_tokens: int = 500,
+        concurrency: int = 100,
+        return_exceptions: bool = False
+    ) -> List[ProviderResponse]:
+        """Run many generations concurrently, at most `concurrency` in flight.
+        
+        Results come back in the same order as `prompts`.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def run(prompt: str) -> ProviderResponse:
+            async with semaphore:
+                return await self.agenerate(prompt, max_tokens)
+        
+        return await asyncio.gather(
+            *(run(prompt) for prompt in prompts),
+            return_exceptions=return_exceptions
+        )
+    
+    def batch_request(self, custom_id: str, prompt: str, max_tokens: int = 500) -> dict:
+        """One JSONL request line in this vendor's batch format"""
+        raise NotImplementedError(f"{type(self).__name__} does not support batch jobs")
+    
+    def parse_batch_result(self, record: dict, latency_ms: float) -> Optional[ProviderResponse]:
+        """Map one result record back to a response (None if that request failed)"""
+        raise NotImplementedError(f"{type(self).__name__} does not support batch jobs")
+    
+    def submit_batch(self, prompts: List[str], max_tokens: int = 500,
+                     directory: Optional[str] = None) -> BatchJob:
+        """Write the JSONL file(s) and submit them; returns immediately"""
+        backend = self._require_batch_backend()
+        directory = directory or tempfile.mkdtemp(prefix="batch_")
+        job = BatchJob(custom_ids=[f"request-{i}" for i in range(len(prompts))])
+        
+        for start in range(0, len(prompts), self.MAX_BATCH_REQUESTS):
+            path = os.path.join(directory, f"batch_{start // self.MAX_BATCH_REQUESTS}.jsonl")
+            write_jsonl(path, [
+                self.batch_request(job.custom_ids[i], prompts[i], max_tokens)
+                for i in range(start, min(start + self.MAX_BATCH_REQUESTS, len(prompts)))
+            ])
+            job.input_paths.append(path)
+            job.batch_ids.append(backend.submit(path))
+        return job
+    
+    def batch_status(self, job: BatchJob) -> str:
+        """"in_progress", "completed", or the terminal state that stopped it"""
+        backend = self._require_batch_backend()
+        return combined_status([backend.status(batch_id) for batch_id in job.batch_ids])
+    
+    def fetch_batch_results(self, job: BatchJob) -> List[Optional[ProviderResponse]]:
+        """Responses in prompt order; None for requests that failed"""
+        backend = self._require_batch_backend()
+        latency = (time.time() - job.submitted_at) * 1000
+        records = (record for batch_id in job.batch_ids for record in backend.results(batch_id))
+        return collect_results(records, job.custom_ids,
+                               lambda record: self.parse_batch_result(record, latency))
+    
+    def run_batch(self, prompts: List[str], max_tokens: int = 500,
+                  poll_interval: float = 60.0, timeout: float = 24 * 3600,
+                  directory: Optional[str] = None) -> List[Optional[ProviderResponse]]:
+        """Submit, wait for the job to finish, and return the responses"""
+        job = self.submit_batch(prompts, max_tokens, directory)
+        deadline = time.time() + timeout
+        status = self.batch_status(job)
+        while status not in TERMINAL_STATES:
+            if time.time() > deadline:
+                raise TimeoutError(f"Batch {job.batch_ids} still {status} after {timeout}s")
+            time.sleep(poll_interval)
+            status = self.batch_status(job)
+        if status != COMPLETED:
+            print(f"Batch ended as {status}; returning partial results")
+        return self.fetch_batch_results(job)
+    
+    def _require_batch_backend(self):
+        if self.batch_backend is None:
+            raise NotImplementedError(f"{type(self).__name__} has no batch backend")
+        return self.batch_backend
+    
+    def count_tokens(self, prompt: str) -> int:
+        """Input tokens this prompt will use, counted locally (see token_counter.py)"""
+        return TOKEN_COUNTER.count_prompt(prompt, self.model, self.system_prompt)
+    
+    def estimate_tokens(self, prompt: str, max_tokens: int = 500) -> int:
+        """Pre-call token estimate for rate limiting: input plus the output budget
+        (input only, for vendors whose TPM quota doesn't count output)"""
+        tokens = self.count_tokens(prompt)
+        return tokens + max_tokens if self.TPM_INCLUDES_OUTPUT else tokens
+    
+    def rate_limited_tokens(self, response: ProviderResponse) -> int:
+        """Tokens a finished call counted against the TPM quota (for RateLimiter.reconcile)"""
+        if self.TPM_INCLUDES_OUTPUT or response.input_tokens is None:
+            return response.tokens_used
+        return response.input_tokens - response.cached_tokens
+    
+    def predict_cost(self, prompt: str, max_tokens: int = 500) -> float:
+        """Worst-case cost before sending (assumes the full max_tokens is generated)"""
+        return self.calculate_cost(self.count_tokens(prompt), max_tokens)
+    
+    def calculate_cost(self, input_tokens: int, output_tokens: int,
+                       cached_tokens: int = 0, cache_write_tokens: int = 0) -> float:
+        """Cost in $; input_tokens is the total, including cached reads/writes"""
+        pricing = self.PRICING[self.model]
+        uncached = input_tokens - cached_tokens - cache_write_tokens
+        input_cost = (uncached / 1_000_000) * pricing["input"]
+        input_cost += (cached_tokens / 1_000_000) * pricing.get("cached_input", pricing["input"])
+        input_cost += (cache_write_tokens / 1_000_000) * pricing.get("cache_write", pricing["input"])
+        output_cost = (output_tokens / 1_000_000) * pricing["output"]
+        return input_cost + output_cost
+    
     @abstractmethod
     def classify_error(self, error: Exception) -> ProviderError:
         pass
@@ -0,0 +1,233 @@
+"""
+Offline batch jobs through the vendors' discounted batch APIs.
+
+Flow (see LLMProvider.run_batch):
+    1. write one JSONL request line per prompt (provider.batch_request)
+    2. submit the file(s) to a BatchBackend
+    3. poll until the job finishes (usually minutes, at most 24h)
+    4. download result records and map them back to ProviderResponse
+       (provider.parse_batch_result), in the original prompt order
+
+Backends:
+    OpenAIBatchBackend     -> Files API + /v1/batches
+    AnthropicBatchBackend  -> Message Batches API
+    LocalBatchBackend      -> a directory on disk; answers every request
+                              itself so the whole flow runs offline
+"""
+
+import json
+import os
+import random
+import tempfile
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional
+
+# Normalized job states
+IN_PROGRESS = "in_progress"
+COMPLETED = "completed"
+FAILED = "failed"
+TERMINAL_STATES = (COMPLETED, FAILED, "expired", "cancelled")
+
+@dataclass
+class BatchJob:
+    custom_ids: List[str]          # one per prompt, in prompt order
+    batch_ids: List[str] = field(default_factory=list)  # one per submitted file
+    input_paths: List[str] = field(default_factory=list)
+    submitted_at: float = field(default_factory=time.time)
+
+
+def write_jsonl(path: str, lines: List[dict]):
+    with open(path, "w", encoding="utf-8") as f:
+        for line in lines:
+            f.write(json.dumps(line, ensure_ascii=False) + "\n")
+
+
+def read_jsonl(path: str) -> Iterator[dict]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def combined_status(statuses: List[str]) -> str:
+    """One state for a job split across several batches"""
+    if all(status == COMPLETED for status in statuses):
+        return COMPLETED
+    if any(status not in TERMINAL_STATES for status in statuses):
+        return IN_PROGRESS
+    # Everything finished but something didn't complete; partial results may exist
+    return next(status for status in statuses if status != COMPLETED)
+
+
+class OpenAIBatchBackend:
+    STATUS_MAP = {"completed": COMPLETED, "failed": FAILED, "expired": "expired", "cancelled": "cancelled"}
+    
+    def __init__(self, client, endpoint: str = "/v1/chat/completions"):
+        self.client = client
+        self.endpoint = endpoint
+    
+    def submit(self, path: str) -> str:
+        with open(path, "rb") as f:
+            input_file = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=self.endpoint,
+            completion_window="24h"
+        )
+        return batch.id
+    
+    def status(self, batch_id: str) -> str:
+        batch = self.client.batches.retrieve(batch_id)
+        return self.STATUS_MAP.get(batch.status, IN_PROGRESS)
+    
+    def results(self, batch_id: str) -> Iterator[dict]:
+        batch = self.client.batches.retrieve(batch_id)
+        # Expired/cancelled batches can still have partial output
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                for line in self.client.files.content(file_id).text.splitlines():
+                    if line.strip():
+                        yield json.loads(line)
+
+
+class AnthropicBatchBackend:
+    def __init__(self, client):
+        self.client = client
+    
+    def submit(self, path: str) -> str:
+        batch = self.client.messages.batches.create(requests=list(read_jsonl(path)))
+        return batch.id
+    
+    def status(self, batch_id: str) -> str:
+        batch = self.client.messages.batches.retrieve(batch_id)
+        return COMPLETED if batch.processing_status == "ended" else IN_PROGRESS
+    
+    def results(self, batch_id: str) -> Iterator[dict]:
+        for result in self.client.messages.batches.results(batch_id):
+            yield result.model_dump()
+
+
+# ----------------------------------------------------------------------------
+# Local stand-in
+# ----------------------------------------------------------------------------
+
+def _last_user_message(messages: List[dict]) -> str:
+    return next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+
+
+def echo_responder(request: dict) -> dict:
+    """Answer one request line in the vendor's own result format.
+    
+    OpenAI lines have "body", Anthropic lines have "params". Token counts
+    use the ~4 characters per token rule of thumb.
+    """
+    if "body" in request:
+        body = request["body"]
+        content = f"Echo: {_last_user_message(body['messages'])}"[:body.get("max_tokens", 500) * 4]
+        prompt_tokens = sum(len(m["content"]) for m in body["messages"]) // 4
+        completion_tokens = len(content) // 4
+        return {
+            "id": f"batch_req_{uuid.uuid4().hex[:12]}",
+            "custom_id": request["custom_id"],
+            "response": {"status_code": 200, "body": {
+                "object": "chat.completion",
+                "model": body["model"],
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                             "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                          "total_tokens": prompt_tokens + completion_tokens}
+            }},
+            "error": None
+        }
+    
+    params = request["params"]
+    content = f"Echo: {_last_user_message(params['messages'])}"[:params["max_tokens"] * 4]
+    return {
+        "custom_id": request["custom_id"],
+        "result": {"type": "succeeded", "message": {
+            "type": "message",
+            "role": "assistant",
+            "model": params["model"],
+            "content": [{"type": "text", "text": content}],
+            "stop_reason": "end_turn",
+            "usage": {"input_tokens": sum(len(m["content"]) for m in params["messages"]) // 4,
+                      "output_tokens": len(content) // 4}
+        }}
+    }
+
+
+def error_record(request: dict, message: str) -> dict:
+    if "body" in request:
+        return {"custom_id": request["custom_id"], "response": None,
+                "error": {"code": "server_error", "message": message}}
+    return {"custom_id": request["custom_id"],
+            "result": {"type": "errored", "error": {"type": "api_error", "message": message}}}
+
+
+class LocalBatchBackend:
+    """File-based batch service for offline tests and demos.
+    
+    Jobs live in `directory` as <id>.input.jsonl / <id>.output.jsonl plus a
+    small meta file, so another process can poll the same job. A job
+    "finishes" `delay_s` after submission; the first status() call after that
+    runs every request through `responder` (echo by default).
+    """
+    
+    def __init__(self, directory: Optional[str] = None, delay_s: float = 0.0,
+                 responder: Callable[[dict], dict] = echo_responder,
+                 failure_rate: float = 0.0, seed: Optional[int] = None):
+        self.directory = directory or tempfile.mkdtemp(prefix="local_batches_")
+        os.makedirs(self.directory, exist_ok=True)
+        self.delay_s = delay_s
+        self.responder = responder
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+    
+    def _path(self, batch_id: str, kind: str) -> str:
+        return os.path.join(self.directory, f"{batch_id}.{kind}")
+    
+    def submit(self, path: str) -> str:
+        batch_id = f"local_batch_{uuid.uuid4().hex[:12]}"
+        with open(path, encoding="utf-8") as src, \
+                open(self._path(batch_id, "input.jsonl"), "w", encoding="utf-8") as dst:
+            dst.write(src.read())
+        with open(self._path(batch_id, "meta.json"), "w") as f:
+            json.dump({"submitted_at": time.time()}, f)
+        return batch_id
+    
+    def status(self, batch_id: str) -> str:
+        output_path = self._path(batch_id, "output.jsonl")
+        if os.path.exists(output_path):
+            return COMPLETED
+        with open(self._path(batch_id, "meta.json")) as f:
+            submitted_at = json.load(f)["submitted_at"]
+        if time.time() - submitted_at < self.delay_s:
+            return IN_PROGRESS
+        
+        records = []
+        for request in read_jsonl(self._path(batch_id, "input.jsonl")):
+            if self._random.random() < self.failure_rate:
+                records.append(error_record(request, "simulated failure"))
+            else:
+                records.append(self.responder(request))
+        # Write then rename, so pollers never see a half-written file
+        write_jsonl(output_path + ".tmp", records)
+        os.replace(output_path + ".tmp", output_path)
+        return COMPLETED
+    
+    def results(self, batch_id: str) -> Iterator[dict]:
+        return read_jsonl(self._path(batch_id, "output.jsonl"))
+
+
+def collect_results(records: Iterator[dict], custom_ids: List[str],
+                    parse: Callable[[dict], Optional[object]]) -> List[Optional[object]]:
+    """Put parsed results back in prompt order; None where a request failed"""
+    position: Dict[str, int] = {custom_id: i for i, custom_id in enumerate(custom_ids)}
+    results: List[Optional[object]] = [None] * len(custom_ids)
+    for record in records:
+        index = position.get(record.get("custom_id"))
+        if index is not None:
+            results[index] = parse(record)
+    return results
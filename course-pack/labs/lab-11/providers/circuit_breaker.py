@@ -0,0 +1,206 @@
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from .base_provider import LLMProvider, ProviderError
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitBreaker:
+    """Classic three-state breaker for one kind of failure.
+    
+    closed    -> requests flow; `failure_threshold` failures in a row open it
+    open      -> requests are skipped until the cooldown (or retry_after) ends
+    half_open -> up to `half_open_probes` requests go through as probes;
+                 a success closes the breaker, a failure re-opens it
+    """
+    
+    def __init__(self, failure_threshold: int = 3, cooldown_s: float = 30.0,
+                 half_open_probes: int = 1):
+        self.failure_threshold = failure_threshold
+        self.cooldown_s = cooldown_s
+        self.half_open_probes = half_open_probes
+        self.state = CLOSED
+        self.failures = 0
+        self.open_until = 0.0
+        self.probes_in_flight = 0
+    
+    def _refresh(self, now: float):
+        if self.state == OPEN and now >= self.open_until:
+            self.state = HALF_OPEN
+            self.probes_in_flight = 0
+    
+    def available(self, now: float) -> bool:
+        self._refresh(now)
+        if self.state == OPEN:
+            return False
+        if self.state == HALF_OPEN:
+            return self.probes_in_flight < self.half_open_probes
+        return True
+    
+    def begin(self, now: float) -> bool:
+        if not self.available(now):
+            return False
+        if self.state == HALF_OPEN:
+            self.probes_in_flight += 1
+        return True
+    
+    def end(self):
+        if self.state == HALF_OPEN and self.probes_in_flight > 0:
+            self.probes_in_flight -= 1
+    
+    def record_success(self):
+        self.end()
+        if self.state == OPEN:
+            # Opened by a concurrent failure (e.g. retry_after); keep honoring it
+            return
+        self.state = CLOSED
+        self.failures = 0
+    
+    def record_failure(self, now: float, open_for: Optional[float] = None):
+        self.end()
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold or open_for:
+            self.trip(now, open_for)
+    
+    def trip(self, now: float, open_for: Optional[float] = None):
+        self.state = OPEN
+        self.open_until = max(self.open_until, now + (open_for or self.cooldown_s))
+
+
+class ProviderHealth:
+    """Breakers plus EWMA latency/error-rate for one provider/model.
+    
+    rate_limit, timeout and api_error each get their own breaker, so a burst
+    of 429s (which clears after retry_after) isn't treated like an outage.
+    A 429 that carries retry_after opens the rate_limit breaker until then;
+    without one, it takes a few in a row and the pause is short.
+    invalid_request is the caller's fault and doesn't count against health.
+    """
+    
+    # error_type -> (failure_threshold, cooldown_s)
+    BREAKER_SETTINGS = {
+        "rate_limit": (3, 5.0),
+        "timeout": (3, 30.0),
+        "api_error": (5, 30.0),
+    }
+    
+    def __init__(self, alpha: float = 0.2, max_error_rate: float = 0.5,
+                 min_samples: int = 10):
+        self.alpha = alpha
+        self.max_error_rate = max_error_rate
+        self.min_samples = min_samples
+        self.breakers = {
+            error_type: CircuitBreaker(threshold, cooldown)
+            for error_type, (threshold, cooldown) in self.BREAKER_SETTINGS.items()
+        }
+        self.latency_ewma: Optional[float] = None
+        self.error_rate_ewma = 0.0
+        self.samples = 0
+        self._lock = threading.Lock()
+    
+    def available(self) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            return all(b.available(now) for b in self.breakers.values())
+    
+    def begin(self) -> bool:
+        """Reserve a slot for one request (a probe, if any breaker is half-open)"""
+        now = time.monotonic()
+        with self._lock:
+            if not all(b.available(now) for b in self.breakers.values()):
+                return False
+            for breaker in self.breakers.values():
+                breaker.begin(now)
+            return True
+    
+    def release(self):
+        """The request was cancelled before it finished; record nothing"""
+        with self._lock:
+            for breaker in self.breakers.values():
+                breaker.end()
+    
+    def record_success(self, latency_ms: float):
+        with self._lock:
+            self._update_ewma(latency_ms, 0.0)
+            for breaker in self.breakers.values():
+                breaker.record_success()
+    
+    def record_failure(self, error: ProviderError):
+        now = time.monotonic()
+        with self._lock:
+            if error.error_type not in self.breakers:
+                for breaker in self.breakers.values():
+                    breaker.end()
+                return
+            self._update_ewma(None, 1.0)
+            for error_type, breaker in self.breakers.items():
+                if error_type == error.error_type:
+                    breaker.record_failure(now, error.retry_after)
+                else:
+                    breaker.end()
+            # A high error rate trips the breaker even without a failure streak
+            if self.samples >= self.min_samples and self.error_rate_ewma > self.max_error_rate:
+                self.breakers[error.error_type].trip(now)
+    
+    def _update_ewma(self, latency_ms: Optional[float], error: float):
+        self.samples += 1
+        self.error_rate_ewma += self.alpha * (error - self.error_rate_ewma)
+        if latency_ms is not None:
+            if self.latency_ewma is None:
+                self.latency_ewma = latency_ms
+            else:
+                self.latency_ewma += self.alpha * (latency_ms - self.latency_ewma)
+    
+    def score(self, target_latency_ms: float = 1000.0) -> float:
+        """0 (dead) .. 1 (healthy): success rate, discounted when slower than target"""
+        if not self.available():
+            return 0.0
+        success = 1.0 - self.error_rate_ewma
+        if self.latency_ewma is None or self.latency_ewma <= target_latency_ms:
+            return success
+        return success * target_latency_ms / self.latency_ewma
+    
+    def summary(self) -> str:
+        states = ", ".join(f"{t}={b.state}" for t, b in self.breakers.items() if b.state != CLOSED)
+        return states or "healthy"
+
+
+class HealthRegistry:
+    """Health per provider/model, shared by every router in the process.
+    
+    Keyed by (provider class, model) so separate instances of the same
+    provider share breakers, and a retry_after seen by one call is honored
+    by all of them.
+    """
+    
+    def __init__(self):
+        self._health: Dict[Tuple[str, str], ProviderHealth] = {}
+        self._lock = threading.Lock()
+    
+    def get(self, provider: LLMProvider) -> ProviderHealth:
+        key = (type(provider).__name__, provider.model)
+        with self._lock:
+            if key not in self._health:
+                self._health[key] = ProviderHealth()
+            return self._health[key]
+    
+    def available(self, provider: LLMProvider) -> bool:
+        return self.get(provider).available()
+    
+    def begin(self, provider: LLMProvider) -> bool:
+        return self.get(provider).begin()
+    
+    def release(self, provider: LLMProvider):
+        self.get(provider).release()
+    
+    def record_success(self, provider: LLMProvider, latency_ms: float):
+        self.get(provider).record_success(latency_ms)
+    
+    def record_failure(self, provider: LLMProvider, error: ProviderError):
+        self.get(provider).record_failure(error)
+
+
+# Shared default so retry_after and open breakers apply process-wide
+GLOBAL_HEALTH = HealthRegistry()
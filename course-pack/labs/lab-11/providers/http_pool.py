@@ -0,0 +1,83 @@
+"""
+Shared HTTP connection pools for provider SDK clients.
+
+Every OpenAI/Anthropic client opens its own connection pool by default, so
+each provider instance pays for fresh TCP + TLS handshakes. Passing one of
+these shared clients as `http_client=` lets all providers for the same vendor
+reuse keep-alive connections (and HTTP/2 multiplexing when `h2` is installed).
+
+Each SDK ships its own httpx client class (`DefaultHttpxClient` /
+`DefaultAsyncHttpxClient`), so pools are keyed by that class.
+
+Async pools belong to one event loop. Blocking code that needs async calls
+(e.g. HedgedRouter.generate) should use run_sync(), which runs them on one
+long-lived background loop, rather than asyncio.run(), which would open new
+pools (and leak the old ones) on every call.
+"""
+
+import asyncio
+import threading
+import weakref
+
+try:
+    import h2  # noqa: F401  (only needed for HTTP/2 support)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+_lock = threading.Lock()
+_sync_clients = {}
+# Async pools are bound to the event loop that opened them
+_async_clients = weakref.WeakKeyDictionary()
+_background_loop = None
+
+
+def get_http_client(client_class):
+    """Process-wide sync client for one SDK (thread-safe)"""
+    with _lock:
+        client = _sync_clients.get(client_class)
+        if client is None or client.is_closed:
+            client = client_class(http2=HTTP2_AVAILABLE)
+            _sync_clients[client_class] = client
+        return client
+
+
+def get_async_http_client(client_class):
+    """Async client for one SDK, shared on the running event loop"""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _async_clients.setdefault(loop, {})
+        client = clients.get(client_class)
+        if client is None or client.is_closed:
+            client = client_class(http2=HTTP2_AVAILABLE)
+            clients[client_class] = client
+        return client
+
+
+async def aclose_async_http_clients():
+    """Close the running loop's pools (call before the loop shuts down)"""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _async_clients.pop(loop, {})
+    for client in clients.values():
+        await client.aclose()
+
+
+def _get_background_loop() -> asyncio.AbstractEventLoop:
+    global _background_loop
+    with _lock:
+        if _background_loop is None:
+            _background_loop = asyncio.new_event_loop()
+            threading.Thread(target=_background_loop.run_forever,
+                             name="http-pool-loop", daemon=True).start()
+        return _background_loop
+
+
+def run_sync(coroutine):
+    """Run a coroutine to completion from blocking code.
+    
+    Every call uses the same background event loop, so its async pools (and
+    the providers' async clients) are reused instead of rebuilt per call.
+    Don't call it from a coroutine running on that loop (it would deadlock).
+    """
+    return asyncio.run_coroutine_threadsafe(coroutine, _get_background_loop()).result()
@@ -0,0 +1,303 @@
+"""
+Open-loop load generator for providers, routers and anything with agenerate().
+
+Requests are scheduled by an arrival process and sent on time whether or not
+earlier ones have finished (a closed loop would slow down with the system and
+hide queueing). Latency is measured from the scheduled send time, so time
+spent waiting for a free concurrency slot counts against the system.
+
+    constant -> evenly spaced at --rps
+    poisson  -> exponential gaps, mean rate --rps
+    bursty   -> alternates bursts of --burst-factor x rps with quiet periods
+                (mean rate is still --rps)
+
+Examples:
+    python -m src.providers.load_test --rps 2000 --duration 30                   # echo replay
+    python -m src.providers.load_test --provider replay --recording rec.json.gz \\
+        --provider replay --router hedged --arrival bursty --output run.json
+    python -m src.providers.load_test --provider openai --rps 2 --duration 30    # live, costs money
+    python -m src.providers.load_test ... --compare baseline.json
+"""
+
+import asyncio
+import contextlib
+import io
+import json
+import random
+import subprocess
+import time
+from typing import Any, Dict, List, Optional
+from .base_provider import AllProvidersFailed
+from .metrics import LatencyHistogram
+
+ARRIVALS = ("constant", "poisson", "bursty")
+
+
+def arrival_times(arrival: str, rps: float, duration_s: float, seed: Optional[int] = None,
+                  burst_factor: float = 4.0, burst_fraction: float = 0.2,
+                  burst_period_s: float = 5.0) -> List[float]:
+    """Send offsets (seconds from the start) for one run"""
+    if arrival not in ARRIVALS:
+        raise ValueError(f"arrival must be one of {ARRIVALS}")
+    if arrival == "constant":
+        return [i / rps for i in range(int(rps * duration_s))]
+    
+    rng = random.Random(seed)
+    peak = rps
+    if arrival == "bursty":
+        if burst_factor * burst_fraction > 1:
+            raise ValueError("burst_factor * burst_fraction must be <= 1 to keep the mean at rps")
+        peak = rps * burst_factor
+        quiet = rps * (1 - burst_factor * burst_fraction) / (1 - burst_fraction)
+    
+    def rate(t: float) -> float:
+        if arrival == "poisson" or (t % burst_period_s) < burst_fraction * burst_period_s:
+            return peak
+        return quiet
+    
+    # Thinning: draw at the peak rate, keep each arrival with p = rate(t) / peak
+    times, t = [], rng.expovariate(peak)
+    while t < duration_s:
+        if rng.random() * peak < rate(t):
+            times.append(t)
+        t += rng.expovariate(peak)
+    return times
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+async def run_load_test(
+    target: Any,
+    prompts: List[str],
+    arrival: str = "poisson",
+    rps: float = 100,
+    duration_s: float = 10,
+    concurrency: int = 1000,
+    max_tokens: int = 100,
+    request_timeout_s: Optional[float] = None,
+    seed: Optional[int] = None,
+    quiet: bool = True,
+    **arrival_options
+) -> Dict[str, Any]:
+    """Drive `target` (provider or router) and return the report dict.
+    
+    `target` needs agenerate(prompt, max_tokens) or a blocking
+    generate(prompt, max_tokens), which runs in worker threads (at most the
+    default thread pool's size in flight). quiet=True hides the routers'
+    per-attempt prints during the run.
+    """
+    schedule = arrival_times(arrival, rps, duration_s, seed, **arrival_options)
+    semaphore = asyncio.Semaphore(concurrency)
+    latency = LatencyHistogram()   # scheduled send -> response (includes queueing)
+    service = LatencyHistogram()   # actual send -> response
+    ttft = LatencyHistogram()
+    errors: Dict[str, int] = {}
+    totals = {"completed": 0, "cost": 0.0, "tokens": 0, "cached_tokens": 0, "max_in_flight": 0}
+    in_flight = 0
+    
+    if hasattr(target, "agenerate"):
+        call = target.agenerate
+    else:
+        async def call(prompt, max_tokens):
+            return await asyncio.to_thread(target.generate, prompt, max_tokens)
+    
+    def error_type(error: Exception) -> str:
+        if isinstance(error, asyncio.TimeoutError):
+            return "timeout"
+        if hasattr(target, "classify_error"):
+            return target.classify_error(error).error_type
+        if isinstance(error, AllProvidersFailed):
+            # A router: count the failure that made it give up
+            return error.error.error_type if error.error else "breaker_open"
+        return f"{type(error).__name__}: {error}"[:80]
+    
+    async def one(index: int, scheduled: float):
+        nonlocal in_flight
+        async with semaphore:
+            in_flight += 1
+            totals["max_in_flight"] = max(totals["max_in_flight"], in_flight)
+            sent = time.perf_counter()
+            try:
+                response = await asyncio.wait_for(call(prompts[index % len(prompts)], max_tokens),
+                                                  request_timeout_s)
+            except Exception as e:
+                kind = error_type(e)
+                errors[kind] = errors.get(kind, 0) + 1
+                return
+            finally:
+                in_flight -= 1
+            done = time.perf_counter()
+        latency.record((done - scheduled) * 1000)
+        service.record((done - sent) * 1000)
+        if response.ttft_ms is not None:
+            ttft.record(response.ttft_ms)
+        totals["completed"] += 1
+        totals["cost"] += response.cost
+        totals["tokens"] += response.tokens_used
+        totals["cached_tokens"] += response.cached_tokens
+    
+    tasks = []
+    with contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext():
+        start = time.perf_counter()
+        for index, offset in enumerate(schedule):
+            delay = start + offset - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(one(index, start + offset)))
+        send_lag_ms = max(0.0, (time.perf_counter() - start - (schedule[-1] if schedule else 0)) * 1000)
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+    
+    sent = len(schedule)
+    failed = sum(errors.values())
+    return {
+        "commit": _git_commit(),
+        "config": {"target": getattr(target, "model", type(target).__name__), "arrival": arrival,
+                   "rps": rps, "duration_s": duration_s, "concurrency": concurrency,
+                   "max_tokens": max_tokens, "seed": seed, **arrival_options},
+        "requests": sent,
+        "completed": totals["completed"],
+        "failed": failed,
+        "error_rate": failed / sent if sent else 0.0,
+        "errors": errors,
+        "elapsed_s": elapsed,
+        "offered_rps": sent / duration_s if duration_s else 0.0,
+        "throughput_rps": totals["completed"] / elapsed if elapsed else 0.0,
+        "max_in_flight": totals["max_in_flight"],
+        "send_lag_ms": send_lag_ms,  # > a few ms means the generator itself fell behind
+        "latency_ms": latency.summary(),
+        "service_latency_ms": service.summary(),
+        "ttft_ms": ttft.summary(),
+        "cost": totals["cost"],
+        "cost_per_1k_requests": totals["cost"] / totals["completed"] * 1000 if totals["completed"] else 0.0,
+        "tokens": totals["tokens"],
+        "cached_tokens": totals["cached_tokens"],
+        "stats": dict(getattr(target, "stats", {})),
+    }
+
+
+def print_summary(report: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None):
+    config = report["config"]
+    print(f"\n{config['target']}  {config['arrival']} @ {config['rps']} rps for {config['duration_s']}s"
+          f"  (concurrency {config['concurrency']}, commit {report['commit']})")
+    print(f"  requests {report['requests']}  completed {report['completed']}  "
+          f"failed {report['failed']} ({report['error_rate']:.1%})")
+    if report["errors"]:
+        print("  errors   " + "  ".join(f"{k}={v}" for k, v in sorted(report["errors"].items())))
+    print(f"  throughput {report['throughput_rps']:.1f} rps   max in flight {report['max_in_flight']}"
+          f"   generator lag {report['send_lag_ms']:.1f} ms")
+    
+    columns = ("p50", "p90", "p95", "p99", "p99.9", "max")
+    rows = [("latency", "latency_ms"), ("service", "service_latency_ms"), ("ttft", "ttft_ms")]
+    print(f"  {'ms':10}" + "".join(f"{column:>10}" for column in columns))
+    for label, key in rows:
+        summary = report[key]
+        if summary.get("count"):
+            print(f"  {label:10}" + "".join(f"{summary[column]:10.1f}" for column in columns))
+    print(f"  cost ${report['cost']:.4f} (${report['cost_per_1k_requests']:.4f} / 1k requests)"
+          f"   tokens {report['tokens']} ({report['cached_tokens']} cached)")
+    if report["stats"]:
+        print(f"  router stats {report['stats']}")
+    
+    if baseline:
+        print(f"\n  vs {baseline.get('commit') or 'baseline'}:")
+        for label, get in [
+            ("throughput", lambda r: r["throughput_rps"]),
+            ("error rate", lambda r: r["error_rate"]),
+            ("p50", lambda r: r["latency_ms"].get("p50")),
+            ("p95", lambda r: r["latency_ms"].get("p95")),
+            ("p99", lambda r: r["latency_ms"].get("p99")),
+            ("cost/1k", lambda r: r["cost_per_1k_requests"]),
+        ]:
+            old, new = get(baseline), get(report)
+            if old and new is not None:
+                print(f"    {label:11} {old:12.4g} -> {new:12.4g}  ({(new - old) / old:+.1%})")
+
+
+def _build_target(args):
+    import os
+    from .replay_provider import ReplayProvider
+    
+    providers = []
+    recordings = list(args.recording or [])
+    for i, name in enumerate(args.provider or ["replay"]):
+        if name == "replay":
+            recording = recordings.pop(0) if recordings else None
+            error_rates = {k: v for k, v in (("rate_limit", args.rate_limit_rate),
+                                             ("timeout", args.timeout_rate)) if v}
+            if not error_rates and recording:
+                error_rates = None  # use the rates seen while recording
+            providers.append(ReplayProvider(
+                recording, model=f"replay-{i}", error_rates=error_rates,
+                latency_scale=args.latency_scale, seed=None if args.seed is None else args.seed + i
+            ))
+        elif name == "openai":
+            from .openai_provider import OpenAIProvider
+            providers.append(OpenAIProvider(api_key=os.getenv("OPENAI_API_KEY")))
+        elif name == "anthropic":
+            from .anthropic_provider import AnthropicProvider
+            providers.append(AnthropicProvider(api_key=os.getenv("ANTHROPIC_API_KEY")))
+    
+    if args.router == "none":
+        if len(providers) > 1:
+            raise SystemExit("Several --provider values need --router simple or hedged")
+        return providers[0]
+    from .router import HedgedRouter, SimpleRouter
+    return HedgedRouter(providers) if args.router == "hedged" else SimpleRouter(providers)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Open-loop load test for providers and routers")
+    parser.add_argument("--provider", action="append", choices=["replay", "openai", "anthropic"],
+                        help="repeat for several providers (default: one echo replay)")
+    parser.add_argument("--recording", action="append", help="replay file(s), in --provider order")
+    parser.add_argument("--router", choices=["none", "simple", "hedged"], default="none")
+    parser.add_argument("--arrival", choices=ARRIVALS, default="poisson")
+    parser.add_argument("--rps", type=float, default=100)
+    parser.add_argument("--duration", type=float, default=10, help="seconds of arrivals")
+    parser.add_argument("--concurrency", type=int, default=1000)
+    parser.add_argument("--max-tokens", type=int, default=100)
+    parser.add_argument("--request-timeout", type=float, help="seconds; counted as timeout errors")
+    parser.add_argument("--burst-factor", type=float, default=4.0)
+    parser.add_argument("--burst-fraction", type=float, default=0.2)
+    parser.add_argument("--prompts", help="file with one prompt per line (default: synthetic)")
+    parser.add_argument("--unique-prompts", type=int, default=1000, help="synthetic prompt pool size")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="replay only")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="replay only")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="replay only")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--compare", help="earlier JSON report to diff against")
+    args = parser.parse_args()
+    
+    if args.prompts:
+        with open(args.prompts, encoding="utf-8") as f:
+            prompts = [line.rstrip("\n") for line in f if line.strip()]
+    else:
+        prompts = [f"Load test question {i}: summarize our refund policy." for i in range(args.unique_prompts)]
+    
+    target = _build_target(args)
+    arrival_options = {}
+    if args.arrival == "bursty":
+        arrival_options = {"burst_factor": args.burst_factor, "burst_fraction": args.burst_fraction}
+    report = asyncio.run(run_load_test(
+        target, prompts, args.arrival, args.rps, args.duration, args.concurrency,
+        args.max_tokens, args.request_timeout, args.seed, **arrival_options
+    ))
+    
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_summary(report, baseline)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.output}")
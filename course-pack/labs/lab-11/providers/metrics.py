@@ -0,0 +1,99 @@
+import math
+import threading
+from collections import deque
+from typing import Optional
+
+class LatencyWindow:
+    """Rolling window of the most recent latencies (ms) for one provider"""
+    
+    def __init__(self, size: int = 200):
+        self.samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+    
+    def record(self, latency_ms: float):
+        with self._lock:
+            self.samples.append(latency_ms)
+    
+    def percentile(self, p: float) -> Optional[float]:
+        """Nearest-rank percentile (p in 0-100), None until we have data"""
+        with self._lock:
+            if not self.samples:
+                return None
+            ordered = sorted(self.samples)
+        rank = max(0, min(len(ordered) - 1, math.ceil(p / 100 * len(ordered)) - 1))
+        return ordered[rank]
+    
+    def __len__(self) -> int:
+        return len(self.samples)
+
+
+class LatencyHistogram:
+    """HDR-style histogram for load tests: every sample, fixed relative error.
+    
+    Values are bucketed by their top `significant_bits` bits, so any
+    percentile is within ~2^-(bits-1) (0.8% at 8 bits) of the true value,
+    memory stays small at millions of samples, and histograms can be merged.
+    """
+    
+    def __init__(self, significant_bits: int = 8, resolution_ms: float = 0.01):
+        self.bits = significant_bits
+        self.half = 1 << (significant_bits - 1)
+        self.resolution_ms = resolution_ms
+        self.counts = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+        self._lock = threading.Lock()
+    
+    def _index(self, value: int) -> int:
+        shift = max(0, value.bit_length() - self.bits)
+        return (value >> shift) + shift * self.half
+    
+    def _value(self, index: int) -> float:
+        """Midpoint of a bucket, in ms"""
+        if index < 2 * self.half:
+            return index * self.resolution_ms
+        shift = index // self.half - 1
+        low = (index - shift * self.half) << shift
+        return (low + (1 << shift) / 2) * self.resolution_ms
+    
+    def record(self, latency_ms: float):
+        index = self._index(int(max(latency_ms, 0) / self.resolution_ms))
+        with self._lock:
+            self.counts[index] = self.counts.get(index, 0) + 1
+            self.count += 1
+            self.total += latency_ms
+            self.min = min(self.min, latency_ms)
+            self.max = max(self.max, latency_ms)
+    
+    def merge(self, other: "LatencyHistogram"):
+        with self._lock:
+            for index, count in other.counts.items():
+                self.counts[index] = self.counts.get(index, 0) + count
+            self.count += other.count
+            self.total += other.total
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+    
+    def percentile(self, p: float) -> Optional[float]:
+        """Nearest-rank percentile (p in 0-100), None until we have data"""
+        with self._lock:
+            if not self.count:
+                return None
+            target = max(1, math.ceil(p / 100 * self.count))
+            seen = 0
+            for index in sorted(self.counts):
+                seen += self.counts[index]
+                if seen >= target:
+                    return min(max(self._value(index), self.min), self.max)
+        return self.max
+    
+    def summary(self, percentiles=(50, 90, 95, 99, 99.9)) -> dict:
+        if not self.count:
+            return {"count": 0}
+        result = {"count": self.count, "mean": self.total / self.count,
+                  "min": self.min, "max": self.max}
+        for p in percentiles:
+            result[f"p{p:g}"] = self.percentile(p)
+        return result
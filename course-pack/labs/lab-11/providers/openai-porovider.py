@@ -1,41 +1,164 @@
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient
+from openai.types import CompletionUsage
+import asyncio
 import time
-from .base_provider import LLMProvider, ProviderResponse, ProviderError
+from typing import AsyncIterator, Iterator, Optional
+from .base_provider import LLMProvider, ProviderResponse, ProviderError, StreamChunk, StreamTimer, retry_after_header
+from .batch import OpenAIBatchBackend
+from .http_pool import get_http_client, get_async_http_client
 
 class OpenAIProvider(LLMProvider):
     # Pricing per 1M tokens (December 2025)
+    # Cached input is prompt-prefix tokens the API served from its cache (50% off)
     PRICING = {
-        "gpt-4o": {"input": 2.50, "output": 10.00},
-        "gpt-4o-mini": {"input": 0.15, "output": 0.60},
+        "gpt-4o": {"input": 2.50, "output": 10.00, "cached_input": 1.25},
+        "gpt-4o-mini": {"input": 0.15, "output": 0.60, "cached_input": 0.075},
     }
+    # Tier 1 quotas; check your account's limits page
+    RATE_LIMITS = {
+        "gpt-4o": {"rpm": 500, "tpm": 30_000},
+        "gpt-4o-mini": {"rpm": 500, "tpm": 200_000},
+    }
+    
+    def __init__(self, api_key: str, model: str = "gpt-4o-mini",
+                 system_prompt: Optional[str] = None):
+        super().__init__(api_key, model, system_prompt)
+        self.client = OpenAI(api_key=api_key, http_client=get_http_client(DefaultHttpxClient))
+        self._async_client = None
+        self._async_loop = None
+        self.batch_backend = OpenAIBatchBackend(self.client)
     
-    def __init__(self, api_key: str, model: str = "gpt-4o-mini"):
-        super().__init__(api_key, model)
-        self.client = OpenAI(api_key=api_key)
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        # One async client per event loop, all sharing the loop's connection pool
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            self._async_client = AsyncOpenAI(
+                api_key=self.api_key,
+                http_client=get_async_http_client(DefaultAsyncHttpxClient)
+            )
+            self._async_loop = loop
+        return self._async_client
     
     def generate(self, prompt: str, max_tokens: int = 500) -> ProviderResponse:
         start = time.time()
         
         # TODO: Call OpenAI API
         response = self.client.chat.completions.create(
-            model=self.model,
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=max_tokens
+            **self._request_params(prompt, max_tokens)
         )
         
         latency = (time.time() - start) * 1000
         
         # TODO: Calculate cost
-        pricing = self.PRICING[self.model]
-        input_cost = (response.usage.prompt_tokens / 1_000_000) * pricing["input"]
-        output_cost = (response.usage.completion_tokens / 1_000_000) * pricing["output"]
+        return self._to_response(response.choices[0].message.content, response.usage, latency)
+    
+    async def agenerate(self, prompt: str, max_tokens: int = 500) -> ProviderResponse:
+        start = time.time()
+        
+        response = await self.async_client.chat.completions.create(
+            **self._request_params(prompt, max_tokens)
+        )
         
+        latency = (time.time() - start) * 1000
+        return self._to_response(response.choices[0].message.content, response.usage, latency)
+    
+    def generate_stream(self, prompt: str, max_tokens: int = 500) -> Iterator[StreamChunk]:
+        timer = StreamTimer()
+        stream = self.client.chat.completions.create(
+            **self._request_params(prompt, max_tokens),
+            stream=True,
+            stream_options={"include_usage": True}  # usage arrives in the last chunk
+        )
+        parts, usage = [], None
+        try:
+            for chunk in stream:
+                if chunk.usage:
+                    usage = chunk.usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    timer.tick()
+                    parts.append(chunk.choices[0].delta.content)
+                    yield StreamChunk(parts[-1])
+        finally:
+            stream.close()
+        yield StreamChunk("", self._to_response("".join(parts), usage, timer.latency_ms, timer, prompt))
+    
+    async def agenerate_stream(self, prompt: str, max_tokens: int = 500) -> AsyncIterator[StreamChunk]:
+        timer = StreamTimer()
+        stream = await self.async_client.chat.completions.create(
+            **self._request_params(prompt, max_tokens),
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        parts, usage = [], None
+        try:
+            async for chunk in stream:
+                if chunk.usage:
+                    usage = chunk.usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    timer.tick()
+                    parts.append(chunk.choices[0].delta.content)
+                    yield StreamChunk(parts[-1])
+        finally:
+            await stream.close()
+        yield StreamChunk("", self._to_response("".join(parts), usage, timer.latency_ms, timer, prompt))
+    
+    def batch_request(self, custom_id: str, prompt: str, max_tokens: int = 500) -> dict:
+        return {
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": self._request_params(prompt, max_tokens)
+        }
+    
+    def parse_batch_result(self, record: dict, latency_ms: float) -> Optional[ProviderResponse]:
+        response = record.get("response")
+        if record.get("error") or not response or response["status_code"] != 200:
+            return None
+        body = response["body"]
+        result = self._to_response(body["choices"][0]["message"]["content"],
+                                   CompletionUsage.model_validate(body["usage"]), latency_ms)
+        result.cost *= 1 - self.BATCH_DISCOUNT
+        return result
+    
+    def _request_params(self, prompt: str, max_tokens: int) -> dict:
+        # Caching is automatic for prompt prefixes of 1024+ tokens, so the static
+        # system prompt goes first and the per-request text last
+        messages = [{"role": "user", "content": prompt}]
+        if self.system_prompt:
+            messages.insert(0, {"role": "system", "content": self.system_prompt})
+        return {"model": self.model, "messages": messages, "max_tokens": max_tokens}
+    
+    def _to_response(self, content: str, usage, latency: float,
+                     timer: Optional[StreamTimer] = None,
+                     prompt: Optional[str] = None) -> ProviderResponse:
+        if usage is None:
+            # Stream ended without its usage chunk: count the input locally and
+            # leave output unknown (so cost and tokens_used cover the input only)
+            input_tokens = self.count_tokens(prompt)
+            return ProviderResponse(
+                content=content,
+                model=self.model,
+                tokens_used=input_tokens,
+                cost=self.calculate_cost(input_tokens, 0),
+                latency_ms=latency,
+                ttft_ms=timer.ttft_ms if timer else None,
+                inter_token_latency_ms=timer.inter_token_latency_ms if timer else None,
+                input_tokens=input_tokens
+            )
+        details = usage.prompt_tokens_details
+        cached = (details.cached_tokens or 0) if details else 0
         return ProviderResponse(
-            content=response.choices[0].message.content,
+            content=content,
             model=self.model,
-            tokens_used=response.usage.total_tokens,
-            cost=input_cost + output_cost,
-            latency_ms=latency
+            tokens_used=usage.total_tokens,
+            cost=self.calculate_cost(usage.prompt_tokens, usage.completion_tokens, cached),
+            latency_ms=latency,
+            ttft_ms=timer.ttft_ms if timer else None,
+            inter_token_latency_ms=timer.inter_token_latency_ms if timer else None,
+            input_tokens=usage.prompt_tokens,
+            output_tokens=usage.completion_tokens,
+            cached_tokens=cached
         )
     
     def classify_error(self, error: Exception) -> ProviderError:
@@ -43,7 +166,7 @@ class OpenAIProvider(LLMProvider):
         
         # TODO: Classify error types
         if "rate_limit" in error_msg or "429" in error_msg:
-            return ProviderError("rate_limit", str(error), 60)
+            return ProviderError("rate_limit", str(error), retry_after_header(error))
         elif "timeout" in error_msg:
             return ProviderError("timeout", str(error))
         elif "invalid" in error_msg or "400" in error_msg:
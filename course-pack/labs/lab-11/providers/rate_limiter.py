@@ -0,0 +1,289 @@
+"""
+Client-side rate limiting against provider RPM/TPM quotas.
+
+Instead of finding out about limits from a 429, every call first takes one
+request and its estimated tokens from a token bucket for its provider/model.
+Buckets refill continuously at rpm/60 and tpm/60 per second. After the call,
+`reconcile` corrects the token bucket with the real `tokens_used`.
+
+Waiters are served first-come-first-served (threads and asyncio tasks share
+one queue per bucket). Buckets live in a store: `MemoryStore` for one
+process, `SQLiteStore` to share quotas between processes on one machine.
+Store calls never run under the limiter's lock, and aacquire runs blocking
+(SQLite) ones in a worker thread, off the event loop.
+"""
+
+import asyncio
+import itertools
+import sqlite3
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+from .base_provider import LLMProvider
+
+@dataclass
+class RateLimit:
+    rpm: int   # requests per minute
+    tpm: int   # tokens per minute (input + output, or input only: see TPM_INCLUDES_OUTPUT)
+
+@dataclass
+class Reservation:
+    key: Tuple[str, str]
+    limit: RateLimit
+    tokens: int
+
+
+def _refill(state: Tuple[float, float, float], limit: RateLimit, now: float):
+    requests, tokens, updated = state
+    elapsed = max(0.0, now - updated)
+    requests = min(limit.rpm, requests + elapsed * limit.rpm / 60)
+    tokens = min(limit.tpm, tokens + elapsed * limit.tpm / 60)
+    return requests, tokens
+
+
+def _take(state, limit: RateLimit, tokens_needed: int, now: float):
+    """Returns (new_state, wait_seconds); wait 0 means granted"""
+    requests, tokens = _refill(state, limit, now)
+    if requests >= 1 and tokens >= tokens_needed:
+        return (requests - 1, tokens - tokens_needed, now), 0.0
+    wait_requests = max(0.0, (1 - requests) * 60 / limit.rpm)
+    wait_tokens = max(0.0, (tokens_needed - tokens) * 60 / limit.tpm)
+    return (requests, tokens, now), max(wait_requests, wait_tokens)
+
+
+class MemoryStore:
+    """Bucket state for a single process"""
+    
+    def __init__(self):
+        self._state: Dict[Tuple[str, str], Tuple[float, float, float]] = {}
+        self._lock = threading.Lock()
+    
+    def take(self, key, limit: RateLimit, tokens: int, now: float) -> float:
+        with self._lock:
+            state = self._state.get(key, (limit.rpm, limit.tpm, now))
+            self._state[key], wait = _take(state, limit, tokens, now)
+            return wait
+    
+    def adjust(self, key, limit: RateLimit, token_delta: int, now: float):
+        """Charge (or refund, if negative) tokens after the fact"""
+        with self._lock:
+            state = self._state.get(key, (limit.rpm, limit.tpm, now))
+            requests, tokens = _refill(state, limit, now)
+            self._state[key] = (requests, min(limit.tpm, tokens - token_delta), now)
+
+
+class SQLiteStore:
+    """Bucket state in a local SQLite file, shared by every process using it.
+    
+    Each take/adjust is one short IMMEDIATE transaction, so concurrent
+    processes never double-spend a bucket. Uses wall-clock time, since
+    monotonic clocks aren't comparable across processes.
+    """
+    
+    wall_clock = True
+    blocking = True  # may wait up to `timeout` for another process's transaction
+    
+    def __init__(self, path: str = "rate_limits.db"):
+        self.path = path
+        self._local = threading.local()
+        self._execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            "key TEXT PRIMARY KEY, requests REAL, tokens REAL, updated REAL)"
+        )
+    
+    def _conn(self) -> sqlite3.Connection:
+        if not hasattr(self._local, "conn"):
+            self._local.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        return self._local.conn
+    
+    def _execute(self, sql: str, params=()):
+        return self._conn().execute(sql, params)
+    
+    def _update(self, key, limit: RateLimit, now: float, change):
+        conn = self._conn()
+        db_key = "/".join(key)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT requests, tokens, updated FROM buckets WHERE key = ?", (db_key,)
+            ).fetchone()
+            state = row or (limit.rpm, limit.tpm, now)
+            new_state, result = change(state)
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets VALUES (?, ?, ?, ?)", (db_key, *new_state)
+            )
+            conn.execute("COMMIT")
+            return result
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    
+    def take(self, key, limit: RateLimit, tokens: int, now: float) -> float:
+        return self._update(key, limit, now, lambda state: _take(state, limit, tokens, now))
+    
+    def adjust(self, key, limit: RateLimit, token_delta: int, now: float):
+        def change(state):
+            requests, tokens = _refill(state, limit, now)
+            return (requests, min(limit.tpm, tokens - token_delta), now), None
+        self._update(key, limit, now, change)
+
+
+def _wake(waiter: asyncio.Future):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class RateLimiter:
+    """Shared RPM/TPM limiter, one bucket per (provider class, model).
+    
+    Limits come from `configure()` or the provider's RATE_LIMITS table.
+    
+        reservation = limiter.acquire(provider, provider.estimate_tokens(prompt, 500))
+        response = provider.generate(prompt, 500)
+        limiter.reconcile(reservation, provider.rate_limited_tokens(response))
+    """
+    
+    POLL_INTERVAL = 0.05  # max seconds between checks while queued
+    
+    def __init__(self, store=None):
+        self.store = store or MemoryStore()
+        self.limits: Dict[Tuple[str, str], RateLimit] = {}
+        self._clock = time.time if getattr(self.store, "wall_clock", False) else time.monotonic
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._queues: Dict[Tuple[str, str], deque] = {}
+        self._tickets = itertools.count()
+        # Queued asyncio tasks: (loop, future) woken like the condition's threads
+        self._async_waiters = []
+    
+    def configure(self, provider_name: str, model: str, limit: RateLimit):
+        self.limits[(provider_name, model)] = limit
+    
+    def limit_for(self, provider: LLMProvider) -> Optional[RateLimit]:
+        key = (type(provider).__name__, provider.model)
+        if key in self.limits:
+            return self.limits[key]
+        quota = getattr(provider, "RATE_LIMITS", {}).get(provider.model)
+        return RateLimit(**quota) if quota else None
+    
+    def _notify(self):
+        """Called with the lock held: the front of some queue moved."""
+        self._cond.notify_all()
+        for loop, waiter in self._async_waiters:
+            loop.call_soon_threadsafe(_wake, waiter)
+        self._async_waiters.clear()
+    
+    def _at_head(self, key, ticket: int) -> bool:
+        """Called with the lock held. Only the head of the queue may take."""
+        return self._queues[key][0] == ticket
+    
+    def _take(self, reservation: Reservation, ticket: int) -> float:
+        """Called by the head of the queue without the lock: the store call
+        can block (SQLite), and nobody else takes from this bucket meanwhile."""
+        wait = self.store.take(reservation.key, reservation.limit, reservation.tokens, self._clock())
+        if wait == 0:
+            with self._lock:
+                queue = self._queues[reservation.key]
+                granted = ticket in queue  # else the waiter was cancelled during the take
+                if granted:
+                    queue.remove(ticket)
+                    self._notify()
+            if not granted:
+                self.reconcile(reservation, 0)
+        return wait
+    
+    def _enqueue(self, provider: LLMProvider, estimated_tokens: int):
+        key = (type(provider).__name__, provider.model)
+        limit = self.limit_for(provider)
+        if limit is None:
+            return None
+        # A single request can never need more than a full bucket
+        tokens = min(estimated_tokens, limit.tpm)
+        ticket = next(self._tickets)
+        self._queues.setdefault(key, deque()).append(ticket)
+        return Reservation(key, limit, tokens), ticket
+    
+    def _leave(self, reservation: Reservation, ticket: int):
+        with self._lock:
+            queue = self._queues[reservation.key]
+            if ticket in queue:
+                queue.remove(ticket)
+                self._notify()
+                return
+        # Already granted (cancelled while a worker thread's take went through): give the tokens back
+        self.reconcile(reservation, 0)
+    
+    def acquire(self, provider: LLMProvider, estimated_tokens: int,
+                timeout: Optional[float] = None) -> Optional[Reservation]:
+        """Block until the call fits in the quota (FIFO). None if unlimited."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            queued = self._enqueue(provider, estimated_tokens)
+        if queued is None:
+            return None
+        reservation, ticket = queued
+        try:
+            while True:
+                with self._lock:
+                    if not self._at_head(reservation.key, ticket):
+                        if deadline is not None and time.monotonic() + self.POLL_INTERVAL > deadline:
+                            raise TimeoutError(f"Rate limit wait for {provider.model} exceeds timeout")
+                        self._cond.wait(self.POLL_INTERVAL)
+                        continue
+                wait = self._take(reservation, ticket)
+                if wait == 0:
+                    return reservation
+                if deadline is not None and time.monotonic() + wait > deadline:
+                    raise TimeoutError(f"Rate limit wait for {provider.model} exceeds timeout")
+                time.sleep(min(wait, self.POLL_INTERVAL))
+        except BaseException:
+            self._leave(reservation, ticket)
+            raise
+    
+    async def aacquire(self, provider: LLMProvider, estimated_tokens: int,
+                       timeout: Optional[float] = None) -> Optional[Reservation]:
+        """Async version of acquire; waits without blocking the event loop"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            queued = self._enqueue(provider, estimated_tokens)
+        if queued is None:
+            return None
+        reservation, ticket = queued
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                with self._lock:
+                    at_head = self._at_head(reservation.key, ticket)
+                    if not at_head:
+                        waiter = loop.create_future()
+                        self._async_waiters.append((loop, waiter))
+                if not at_head:
+                    if deadline is not None and time.monotonic() + self.POLL_INTERVAL > deadline:
+                        raise TimeoutError(f"Rate limit wait for {provider.model} exceeds timeout")
+                    await asyncio.wait([waiter], timeout=self.POLL_INTERVAL)
+                    with self._lock:
+                        if (loop, waiter) in self._async_waiters:  # timed out, not woken
+                            self._async_waiters.remove((loop, waiter))
+                    continue
+                if getattr(self.store, "blocking", False):
+                    wait = await asyncio.to_thread(self._take, reservation, ticket)
+                else:
+                    wait = self._take(reservation, ticket)
+                if wait == 0:
+                    return reservation
+                if deadline is not None and time.monotonic() + wait > deadline:
+                    raise TimeoutError(f"Rate limit wait for {provider.model} exceeds timeout")
+                await asyncio.sleep(min(wait, self.POLL_INTERVAL))
+        except BaseException:
+            self._leave(reservation, ticket)
+            raise
+    
+    def reconcile(self, reservation: Optional[Reservation], actual_tokens: int):
+        """Correct the bucket with the tokens the provider actually reported"""
+        if reservation is None:
+            return
+        delta = actual_tokens - reservation.tokens
+        if delta:
+            self.store.adjust(reservation.key, reservation.limit, delta, self._clock())
@@ -0,0 +1,216 @@
+"""
+Offline provider that replays recorded responses, for tests and load tests.
+
+    # 1. Record real traffic once (wraps any provider, works inside routers)
+    recorder = RecordingProvider(OpenAIProvider(api_key=...))
+    for prompt in prompts:
+        recorder.generate(prompt)
+    recorder.save("recordings/gpt-4o-mini.json.gz")
+
+    # 2. Replay it: same answers, latency and TTFT sampled from recorded calls
+    replay = ReplayProvider("recordings/gpt-4o-mini.json.gz",
+                            error_rates={"rate_limit": 0.02, "timeout": 0.01})
+
+Without a recording, ReplayProvider echoes the prompt with log-normally
+distributed latency. Responses are looked up by prompt hash (unknown prompts
+get a recorded response picked by hash, so runs are deterministic), and
+agenerate only awaits asyncio.sleep, so one event loop can drive 10k+ RPS.
+"""
+
+import asyncio
+import gzip
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from .base_provider import LLMProvider, ProviderResponse, ProviderError
+
+ERROR_TYPES = ("rate_limit", "timeout", "api_error", "invalid_request")
+
+
+def prompt_key(prompt: str) -> str:
+    return hashlib.blake2b(prompt.encode(), digest_size=8).hexdigest()
+
+
+class ReplayError(Exception):
+    """Injected failure; classify_error returns the ProviderError it carries"""
+    
+    def __init__(self, error: ProviderError):
+        super().__init__(error.message)
+        self.error = error
+
+
+class RecordingProvider(LLMProvider):
+    """Passes calls through to a real provider and keeps what came back"""
+    
+    def __init__(self, provider: LLMProvider):
+        super().__init__(provider.api_key, provider.model, provider.system_prompt)
+        self.provider = provider
+        self.PRICING = provider.PRICING
+        self.RATE_LIMITS = provider.RATE_LIMITS
+        self.records: List[list] = []
+        self.errors: Dict[str, int] = {}
+        self._lock = threading.Lock()
+    
+    def _keep(self, prompt: str, response: ProviderResponse):
+        with self._lock:
+            # Positional rows keep the file small: key, content, in, out, cost, latency, ttft
+            self.records.append([
+                prompt_key(prompt), response.content, response.input_tokens or 0,
+                response.output_tokens or 0, response.cost, round(response.latency_ms, 1),
+                None if response.ttft_ms is None else round(response.ttft_ms, 1)
+            ])
+    
+    def _count_error(self, error: Exception):
+        error_type = self.provider.classify_error(error).error_type
+        with self._lock:
+            self.errors[error_type] = self.errors.get(error_type, 0) + 1
+    
+    def generate(self, prompt: str, max_tokens: int = 500) -> ProviderResponse:
+        try:
+            response = self.provider.generate(prompt, max_tokens)
+        except Exception as e:
+            self._count_error(e)
+            raise
+        self._keep(prompt, response)
+        return response
+    
+    async def agenerate(self, prompt: str, max_tokens: int = 500) -> ProviderResponse:
+        try:
+            response = await self.provider.agenerate(prompt, max_tokens)
+        except Exception as e:
+            self._count_error(e)
+            raise
+        self._keep(prompt, response)
+        return response
+    
+    def save(self, path: str):
+        """Write the recording as gzipped JSON (error counts become replay error rates)"""
+        with self._lock:
+            total = len(self.records) + sum(self.errors.values())
+            data = {
+                "model": self.model,
+                "fields": ["key", "content", "input_tokens", "output_tokens", "cost", "latency_ms", "ttft_ms"],
+                "records": list(self.records),
+                "error_rates": {k: v / total for k, v in self.errors.items()} if total else {}
+            }
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+    
+    def classify_error(self, error: Exception) -> ProviderError:
+        return self.provider.classify_error(error)
+
+
+class ReplayProvider(LLMProvider):
+    def __init__(
+        self,
+        recording: Optional[str] = None,
+        model: Optional[str] = None,
+        error_rates: Optional[Dict[str, float]] = None,
+        latency_scale: float = 1.0,
+        median_latency_ms: float = 500,
+        latency_sigma: float = 0.5,
+        timeout_ms: float = 30_000,
+        retry_after: Optional[int] = None,
+        seed: Optional[int] = None
+    ):
+        """
+        recording:          file from RecordingProvider.save (None = synthetic echo)
+        model:              name to report (defaults to the recorded model); give
+                            each replay its own name to use several in one router
+        error_rates:        e.g. {"rate_limit": 0.02, "timeout": 0.01}; defaults
+                            to the rates seen while recording
+        latency_scale:      multiply every delay (0 = no sleeping at all)
+        median_latency_ms / latency_sigma: log-normal latency without a recording
+        timeout_ms:         how long an injected timeout blocks before failing
+        retry_after:        seconds reported with injected rate limits
+        """
+        data = {"model": "replay", "records": [], "error_rates": {}}
+        if recording:
+            with gzip.open(recording, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+        super().__init__(api_key="", model=model or data["model"])
+        
+        self.records = data["records"]
+        self.by_key = {record[0]: record for record in self.records}
+        # (latency_ms, ttft_ms) pairs; recordings made before ttft was kept have none
+        self.timings = [(record[5], record[6] if len(record) > 6 else None) for record in self.records]
+        self.error_rates = data["error_rates"] if error_rates is None else error_rates
+        unknown = set(self.error_rates) - set(ERROR_TYPES)
+        if unknown:
+            raise ValueError(f"Unknown error types {unknown}; expected {ERROR_TYPES}")
+        self.latency_scale = latency_scale
+        self.median_latency_ms = median_latency_ms
+        self.latency_sigma = latency_sigma
+        self.timeout_ms = timeout_ms
+        self.retry_after = retry_after
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+    
+    def _plan(self, prompt: str, max_tokens: int):
+        """Decide this call's outcome up front: (delay in seconds, response or error)"""
+        # Threads and event loops share the counter and the seeded RNG
+        with self._lock:
+            self.calls += 1
+            roll = self._random.random()
+            latency, ttft = self._sample_latency()
+        for error_type, rate in self.error_rates.items():
+            if roll < rate:
+                delay = self.timeout_ms if error_type == "timeout" else latency / 10
+                error = ProviderError(error_type, f"Injected {error_type} (replay)",
+                                      self.retry_after if error_type == "rate_limit" else None)
+                return delay * self.latency_scale / 1000, ReplayError(error)
+            roll -= rate
+        
+        if self.records:
+            key = prompt_key(prompt)
+            record = self.by_key.get(key) or self.records[int(key, 16) % len(self.records)]
+            _, content, input_tokens, output_tokens, cost = record[:5]
+        else:
+            content = f"Echo: {prompt[:max_tokens * 4]}"
+            input_tokens, output_tokens, cost = len(prompt) // 4, len(content) // 4, 0.0
+        response = ProviderResponse(
+            content=content,
+            model=self.model,
+            tokens_used=input_tokens + output_tokens,
+            cost=cost,
+            latency_ms=latency * self.latency_scale,
+            ttft_ms=None if ttft is None else ttft * self.latency_scale,
+            input_tokens=input_tokens,
+            output_tokens=output_tokens
+        )
+        return response.latency_ms / 1000, response
+    
+    def _sample_latency(self) -> Tuple[float, Optional[float]]:
+        """(latency_ms, ttft_ms) from one recorded call; synthetic latency has no ttft"""
+        if self.timings:
+            return self._random.choice(self.timings)
+        return self.median_latency_ms * math.exp(self._random.gauss(0, self.latency_sigma)), None
+    
+    def generate(self, prompt: str, max_tokens: int = 500) -> ProviderResponse:
+        delay, outcome = self._plan(prompt, max_tokens)
+        if delay > 0:
+            time.sleep(delay)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+    
+    async def agenerate(self, prompt: str, max_tokens: int = 500) -> ProviderResponse:
+        delay, outcome = self._plan(prompt, max_tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+    
+    def estimate_tokens(self, prompt: str, max_tokens: int = 500) -> int:
+        return len(prompt) // 4 + max_tokens  # skip real tokenization at replay speeds
+    
+    def classify_error(self, error: Exception) -> ProviderError:
+        if isinstance(error, ReplayError):
+            return error.error
+        return ProviderError("api_error", str(error))
@@ -0,0 +1,173 @@
+"""
+Latency- and cost-aware provider selection.
+
+The routers normally try providers in the order they were given. With a
+RoutingPolicy they re-order that list per request instead:
+
+    "min_cost"  -> cheapest first, at list price (PRICING) for the recent
+                   input/output token mix (or for this prompt's input plus
+                   the expected output, when rank() gets it)
+    "min_p95"   -> lowest rolling p95 latency first
+    "weighted"  -> blend of both, each relative to the best candidate
+
+Providers without PRICING for their model rank after priced ones under
+"min_cost", and get the average cost score of the priced ones under "weighted".
+
+The rest of the list is still used as the fallback chain. Sticky sessions
+keep a conversation on the provider that served it last, and a small share
+of exploration traffic keeps stats fresh for providers that aren't winning.
+"""
+
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Tuple
+from .base_provider import LLMProvider, ProviderResponse
+from .metrics import LatencyWindow
+
+OBJECTIVES = ("min_cost", "min_p95", "weighted")
+
+class ProviderStats:
+    """Rolling latency percentiles for one provider/model"""
+    
+    def __init__(self, window: int = 500):
+        self.latencies = LatencyWindow(window)
+    
+    def record(self, response: ProviderResponse):
+        self.latencies.record(response.latency_ms)
+
+
+class RoutingPolicy:
+    def __init__(
+        self,
+        objective: str = "weighted",
+        cost_weight: float = 0.5,
+        latency_weight: float = 0.5,
+        exploration: float = 0.05,
+        sticky_ttl_s: float = 1800,
+        max_sessions: int = 10_000,
+        default_latency_ms: float = 1000,
+        seed: Optional[int] = None
+    ):
+        if objective not in OBJECTIVES:
+            raise ValueError(f"objective must be one of {OBJECTIVES}")
+        self.objective = objective
+        self.cost_weight = cost_weight
+        self.latency_weight = latency_weight
+        self.exploration = exploration
+        self.sticky_ttl_s = sticky_ttl_s
+        self.max_sessions = max_sessions
+        self.default_latency_ms = default_latency_ms
+        self.stats: Dict[Tuple[str, str], ProviderStats] = {}
+        self.sessions: "OrderedDict[str, Tuple[Tuple[str, str], float]]" = OrderedDict()
+        # (input, output) tokens of recent responses from every provider: one
+        # token split to price them all on, so costs stay comparable
+        self.usage: "deque[Tuple[int, int]]" = deque(maxlen=500)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _key(provider: LLMProvider) -> Tuple[str, str]:
+        return (type(provider).__name__, provider.model)
+    
+    def _stats(self, provider: LLMProvider) -> ProviderStats:
+        key = self._key(provider)
+        if key not in self.stats:
+            self.stats[key] = ProviderStats()
+        return self.stats[key]
+    
+    def p95_ms(self, provider: LLMProvider) -> float:
+        p95 = self._stats(provider).latencies.percentile(95)
+        return self.default_latency_ms if p95 is None else p95
+    
+    def expected_output_tokens(self, max_tokens: int = 500) -> float:
+        """Mean output of recent responses, capped at max_tokens (max_tokens before any)"""
+        if not self.usage:
+            return max_tokens
+        return min(max_tokens, sum(output for _, output in self.usage) / len(self.usage))
+    
+    def cost_per_token(self, provider: LLMProvider) -> Optional[float]:
+        """PRICING list price in $/token, at the recent input/output split (1:1 before
+        any traffic); None if the model has no PRICING"""
+        pricing = provider.PRICING.get(provider.model)
+        if not pricing:
+            return None
+        inputs = sum(tokens for tokens, _ in self.usage)
+        outputs = sum(tokens for _, tokens in self.usage)
+        output_share = outputs / (inputs + outputs) if inputs + outputs else 0.5
+        return (pricing["input"] * (1 - output_share) + pricing["output"] * output_share) / 1_000_000
+    
+    def predicted_cost(self, provider: LLMProvider, prompt: str,
+                       max_tokens: int = 500) -> Optional[float]:
+        """List price of this prompt's input tokens (in the provider's own
+        tokenizer) plus the expected output tokens; None if the model has no PRICING"""
+        if not provider.PRICING.get(provider.model):
+            return None
+        input_tokens = provider.estimate_tokens(prompt, 0)  # no output budget: input only
+        return provider.calculate_cost(input_tokens, self.expected_output_tokens(max_tokens))
+    
+    def record(self, provider: LLMProvider, response: ProviderResponse,
+               session_id: Optional[str] = None):
+        with self._lock:
+            self._stats(provider).record(response)
+            if response.input_tokens is not None and response.output_tokens is not None:
+                self.usage.append((response.input_tokens, response.output_tokens))
+            if session_id is not None:
+                self.sessions[session_id] = (self._key(provider), time.monotonic() + self.sticky_ttl_s)
+                self.sessions.move_to_end(session_id)
+                while len(self.sessions) > self.max_sessions:
+                    self.sessions.popitem(last=False)
+    
+    def rank(self, providers: List[LLMProvider], session_id: Optional[str] = None,
+             prompt: Optional[str] = None, max_tokens: int = 500) -> List[LLMProvider]:
+        """Providers in the order to try them for this request"""
+        with self._lock:
+            ranked = sorted(providers, key=self._score_fn(providers, prompt, max_tokens))
+            
+            sticky = self._sticky_provider(ranked, session_id)
+            if sticky is not None:
+                ranked.remove(sticky)
+                return [sticky] + ranked
+            
+            if len(ranked) > 1 and self._random.random() < self.exploration:
+                explore = self._random.choice(ranked[1:])
+                ranked.remove(explore)
+                ranked.insert(0, explore)
+            return ranked
+    
+    def _score_fn(self, providers: List[LLMProvider], prompt: Optional[str], max_tokens: int):
+        if prompt is None:
+            costs = {id(p): self.cost_per_token(p) for p in providers}
+        else:
+            costs = {id(p): self.predicted_cost(p, prompt, max_tokens) for p in providers}
+        latencies = {id(p): self.p95_ms(p) for p in providers}
+        if self.objective == "min_cost":
+            return lambda p: (costs[id(p)] is None, costs[id(p)] or 0.0)
+        if self.objective == "min_p95":
+            return lambda p: latencies[id(p)]
+        
+        # Cost relative to the cheapest priced provider; unpriced ones can't be
+        # compared, so they score the priced average (1.0 if none are priced)
+        priced = [cost for cost in costs.values() if cost is not None]
+        best_cost = min(priced, default=0.0) or 1e-12
+        scores = {key: cost / best_cost for key, cost in costs.items() if cost is not None}
+        neutral = sum(scores.values()) / len(scores) if scores else 1.0
+        best_latency = min(latencies.values()) or 1e-6
+        return lambda p: (
+            self.cost_weight * scores.get(id(p), neutral)
+            + self.latency_weight * latencies[id(p)] / best_latency
+        )
+    
+    def _sticky_provider(self, providers: List[LLMProvider],
+                         session_id: Optional[str]) -> Optional[LLMProvider]:
+        if session_id is None or session_id not in self.sessions:
+            return None
+        key, expires = self.sessions[session_id]
+        if time.monotonic() > expires:
+            del self.sessions[session_id]
+            return None
+        for provider in providers:
+            if self._key(provider) == key:
+                return provider
+        return None
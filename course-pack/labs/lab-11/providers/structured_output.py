@@ -0,0 +1,258 @@
+"""
+Structured output: parse LLM text straight into Pydantic models.
+
+The usual pattern, `Model(**json.loads(text))`, builds an intermediate dict
+and then validates it. Pydantic v2 can validate directly from the JSON text
+(`model_validate_json` / `TypeAdapter.validate_json`) in one pass in Rust.
+TypeAdapters are expensive to build, so they're compiled once per schema and
+cached here.
+
+    order, response = provider.generate_structured(prompt, OrderDetails)
+    items, response = provider.generate_structured(prompt, List[SearchResult])
+
+Streaming: PartialJSONValidator turns a growing JSON buffer into the best
+partial object so far, and validates the complete document at the end. Each
+chunk is scanned once and completed top-level members are parsed once, so a
+chunk only reparses the member still streaming, not the whole buffer.
+
+Benchmark (json.loads + Model(**data) vs validate_json):
+    python -m src.providers.structured_output [--models-file path/to/pydantic-models-example.py]
+"""
+
+import json
+import re
+from functools import lru_cache
+from typing import Any, Optional, Union
+
+from pydantic import BaseModel, TypeAdapter
+from pydantic_core import from_json
+
+JSONInput = Union[str, bytes]
+
+# Characters that matter for finding where a JSON value ends; lastindex says which
+_STRUCTURE = re.compile(r'(\\)|(")|([{\[])|([}\]])|(,)')
+_STRUCTURE_BYTES = re.compile(rb'(\\)|(")|([{\[])|([}\]])|(,)')
+ESCAPE, QUOTE, OPEN, CLOSE, COMMA = 1, 2, 3, 4, 5
+
+
+@lru_cache(maxsize=256)
+def get_adapter(schema: Any) -> TypeAdapter:
+    """Compiled validator for any type (model, List[Model], Dict[str, int], ...)"""
+    return TypeAdapter(schema)
+
+
+@lru_cache(maxsize=256)
+def schema_instructions(schema: Any) -> str:
+    """Prompt suffix asking for JSON that matches the schema"""
+    json_schema = json.dumps(get_adapter(schema).json_schema(), separators=(",", ":"))
+    return (
+        "\n\nRespond with only a JSON value (no prose, no code fences) "
+        f"matching this JSON schema:\n{json_schema}"
+    )
+
+
+class _Scanner:
+    """Tracks JSON structure outside strings; resumable, so a stream is scanned once"""
+    
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.skip_to = 0  # just past an escaped character
+    
+    def scan(self, text: JSONInput, start: int):
+        """Yield (kind, end) for quotes, and for brackets and commas outside strings"""
+        pattern = _STRUCTURE_BYTES if isinstance(text, bytes) else _STRUCTURE
+        for match in pattern.finditer(text, start):
+            if match.start() < self.skip_to:
+                continue
+            kind = match.lastindex
+            if kind == ESCAPE:
+                self.skip_to = match.start() + 2
+            elif kind == QUOTE:
+                self.in_string = not self.in_string
+                yield kind, match.end()
+            elif not self.in_string:
+                self.depth += 1 if kind == OPEN else -1 if kind == CLOSE else 0
+                yield kind, match.end()
+
+
+def _json_start(text: JSONInput, start: int = 0) -> int:
+    brackets = (b"{", b"[") if isinstance(text, bytes) else ("{", "[")
+    return min((i for i in (text.find(b, start) for b in brackets) if i != -1), default=-1)
+
+
+def _json_end(text: JSONInput, start: int) -> int:
+    """Index just past the bracket closing the one at `start` (len(text) if unclosed)"""
+    scanner = _Scanner()
+    for kind, end in scanner.scan(text, start):
+        if kind == CLOSE and scanner.depth == 0:
+            return end
+    return len(text)
+
+
+def extract_json(text: JSONInput) -> JSONInput:
+    """Cut the JSON value out of any prose or ```json fences the model added"""
+    stripped = text.strip()
+    start = _json_start(stripped)
+    if start == -1:
+        return stripped
+    return stripped[start:_json_end(stripped, start)]
+
+
+def parse_json(text: JSONInput, schema: Any):
+    """Validate JSON text straight into `schema` (no json.loads round trip)"""
+    data = extract_json(text)
+    if isinstance(schema, type) and issubclass(schema, BaseModel):
+        return schema.model_validate_json(data)
+    return get_adapter(schema).validate_json(data)
+
+
+class PartialJSONValidator:
+    """Incrementally parse a streamed JSON document.
+    
+        validator = PartialJSONValidator(OrderDetails)
+        for chunk in provider.generate_stream(prompt):
+            partial = validator.feed(chunk.text)   # dict/list so far, or None
+        order = validator.finish()                 # fully validated model
+    """
+    
+    def __init__(self, schema: Any):
+        self.schema = schema
+        self.buffer = ""
+        self.partial: Optional[Any] = None
+        self._scanner = _Scanner()
+        self._scanned = 0   # buffer offset scanned so far
+        self._start = -1    # the document's opening bracket
+        self._member = -1   # start of the top-level member still streaming
+        self._done: Any = None  # completed top-level members, parsed once
+        self._end: Optional[int] = None
+    
+    def feed(self, text: str) -> Optional[Any]:
+        self.buffer += text
+        if not text or self._end is not None:
+            return self.partial
+        if self._start == -1:
+            self._start = _json_start(self.buffer, self._scanned)
+            if self._start == -1:
+                self._scanned = len(self.buffer)
+                return self.partial
+            self._scanned = self._member = self._start + 1
+            self._scanner.depth = 1
+            self._done = [] if self.buffer[self._start] == "[" else {}
+        
+        # Each member is parsed once it's complete; only the one still streaming
+        # is reparsed per chunk, so a long document isn't reparsed from the start
+        for kind, end in self._scanner.scan(self.buffer, self._scanned):
+            if kind == COMMA and self._scanner.depth == 1:
+                self._merge(self._done, end - 1)
+                self._member = end
+            elif self._scanner.depth == 0:
+                self._end = end  # ignore any prose after the document
+                break
+        self._scanned = len(self.buffer)
+        partial = type(self._done)(self._done)
+        if self._merge(partial, self._end or len(self.buffer)):
+            self.partial = partial
+        return self.partial
+    
+    def _merge(self, into: Any, end: int) -> bool:
+        """Parse the members from the current one up to `end` into the list/dict `into`"""
+        text = self.buffer[self._start] + self.buffer[self._member:end]
+        try:
+            # Incomplete values at the end are dropped; a half-streamed string is kept
+            members = from_json(text, allow_partial="trailing-strings")
+        except ValueError:
+            return False  # not parseable yet (e.g. a dangling escape); keep the last good value
+        if isinstance(into, list):
+            into.extend(members)
+        else:
+            into.update(members)
+        return True
+    
+    def finish(self):
+        return parse_json(self.buffer, self.schema)
+
+
+# ============================================================================
+# BENCHMARK
+# ============================================================================
+
+def _load_models(path: str):
+    import importlib.util
+    spec = importlib.util.spec_from_file_location("pydantic_models_example", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def benchmark(iterations: int = 20_000, models_file: Optional[str] = None):
+    import timeit
+    from datetime import datetime
+    from typing import List, Literal
+    
+    if models_file:
+        models = _load_models(models_file)
+        OrderDetails = models.OrderDetails
+        FunctionCallRequest = models.FunctionCallRequest
+    else:
+        # Same shape as Lab 5's OrderDetails/FunctionCallRequest (minus EmailStr,
+        # which needs the email-validator package)
+        class OrderDetails(BaseModel):
+            order_id: str
+            status: Literal["pending", "processing", "shipped", "delivered", "cancelled", "refunded"]
+            customer_email: str
+            items: List[str]
+            total: float
+            created_at: datetime
+            estimated_delivery: Optional[datetime] = None
+            tracking_number: Optional[str] = None
+        
+        class FunctionCallRequest(BaseModel):
+            function_name: str
+            arguments: dict = {}
+    
+    order_json = json.dumps({
+        "order_id": "ABC12345",
+        "status": "shipped",
+        "customer_email": "customer@example.com",
+        "items": ["Item 1", "Item 2", "Item 3"],
+        "total": 99.99,
+        "created_at": "2025-10-25T10:00:00Z",
+        "estimated_delivery": "2025-11-02T17:00:00Z",
+        "tracking_number": "1Z999AA1"
+    })
+    call_json = json.dumps({"function_name": "check_order_status",
+                            "arguments": {"order_id": "ABC12345", "include_history": False}})
+    calls_json = json.dumps([json.loads(call_json)] * 20)
+    
+    cases = [
+        ("OrderDetails", OrderDetails, order_json,
+         lambda: OrderDetails(**json.loads(order_json))),
+        ("FunctionCallRequest", FunctionCallRequest, call_json,
+         lambda: FunctionCallRequest(**json.loads(call_json))),
+        ("List[FunctionCallRequest] x20", List[FunctionCallRequest], calls_json,
+         lambda: [FunctionCallRequest(**item) for item in json.loads(calls_json)]),
+    ]
+    
+    print(f"{'schema':32} {'Model(**json.loads)':>20} {'parse_json':>12} {'speedup':>8}")
+    for name, schema, raw, baseline in cases:
+        parse_json(raw, schema)  # warm the adapter cache
+        old = timeit.timeit(baseline, number=iterations) / iterations * 1e6
+        new = timeit.timeit(lambda: parse_json(raw, schema), number=iterations) / iterations * 1e6
+        print(f"{name:32} {old:17.2f} us {new:9.2f} us {old / new:7.2f}x")
+    
+    # What the cache saves: building a TypeAdapter per call
+    uncached = timeit.timeit(lambda: TypeAdapter(List[FunctionCallRequest]).validate_json(calls_json),
+                             number=iterations // 10) / (iterations // 10) * 1e6
+    cached = timeit.timeit(lambda: get_adapter(List[FunctionCallRequest]).validate_json(calls_json),
+                           number=iterations // 10) / (iterations // 10) * 1e6
+    print(f"\nTypeAdapter per call: {uncached:.2f} us, cached: {cached:.2f} us")
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Benchmark structured output parsing")
+    parser.add_argument("--iterations", type=int, default=20_000)
+    parser.add_argument("--models-file", help="e.g. 'Lab 5/templates/pydantic-models-example.py'")
+    args = parser.parse_args()
+    benchmark(args.iterations, args.models_file)
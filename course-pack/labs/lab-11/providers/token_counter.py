@@ -0,0 +1,223 @@
+"""
+Local token counting, so cost and TPM can be predicted before a call.
+
+    OpenAI models  -> exact BPE counts with tiktoken (o200k/cl100k)
+    Claude models  -> no public tokenizer; cl100k count x a ratio that is
+                      calibrated from each response's reported usage
+                      (AnthropicProvider calls record_usage)
+    no tiktoken    -> ~4 characters per token (also if the BPE file can't be
+                      downloaded on first use)
+
+RAG and chat prompts repeat long prefixes (system preamble, the same context
+chunks), so text is split at blank lines and each paragraph's count is
+memoized; only new paragraphs are tokenized. The BPE pre-tokenizer already
+splits at newline runs, so the sum matches a full encode for normal text.
+
+Benchmark (speed, cache effect, and accuracy against reported usage):
+    python -m src.providers.token_counter [--live openai|anthropic]
+"""
+
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Chat format overhead: role markers around each message, plus the reply primer
+PER_MESSAGE_TOKENS = {"openai": 4, "anthropic": 4}
+REPLY_PRIMER_TOKENS = {"openai": 3, "anthropic": 3}
+# Claude tokens per cl100k token (starting point; calibrated by record_usage)
+DEFAULT_ANTHROPIC_RATIO = 1.15
+
+_PARAGRAPH_END = re.compile(r"\n\n+")
+
+
+def provider_family(model: str) -> str:
+    return "anthropic" if model.startswith("claude") else "openai"
+
+
+def message_overhead(model: str, messages: int) -> int:
+    family = provider_family(model)
+    return PER_MESSAGE_TOKENS[family] * messages + REPLY_PRIMER_TOKENS[family]
+
+
+def split_segments(text: str) -> List[str]:
+    """Split after each blank-line run, keeping the separators"""
+    segments, start = [], 0
+    for match in _PARAGRAPH_END.finditer(text):
+        segments.append(text[start:match.end()])
+        start = match.end()
+    if start < len(text):
+        segments.append(text[start:])
+    return segments
+
+
+class TokenCounter:
+    def __init__(self, cache_size: int = 50_000):
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[tuple, int]" = OrderedDict()
+        self._encodings: Dict[str, object] = {}
+        self._lock = threading.Lock()
+        self.anthropic_ratio = DEFAULT_ANTHROPIC_RATIO
+        self.hits = 0
+        self.misses = 0
+    
+    def encoding_for(self, model: str):
+        """tiktoken encoding used to count for this model (None without tiktoken)"""
+        if tiktoken is None:
+            return None
+        name = "cl100k_base"
+        if provider_family(model) == "openai":
+            try:
+                name = tiktoken.model.encoding_name_for_model(model)
+            except KeyError:
+                name = "o200k_base"
+        if name not in self._encodings:
+            try:
+                self._encodings[name] = tiktoken.get_encoding(name)
+            except Exception as e:
+                # The BPE file is downloaded on first use; offline, fall back to chars/4
+                print(f"⚠ tiktoken {name} unavailable ({type(e).__name__}); estimating ~4 chars/token")
+                self._encodings[name] = None
+        return self._encodings[name]
+    
+    def _raw_counts(self, segments: List[str], encoding) -> List[int]:
+        if encoding is None:
+            return [max(1, len(segment) // 4) for segment in segments]
+        if len(segments) == 1:
+            return [len(encoding.encode_ordinary(segments[0]))]
+        return [len(tokens) for tokens in encoding.encode_ordinary_batch(segments)]
+    
+    def _segment_counts(self, texts: List[str], encoding) -> List[int]:
+        """Sum of memoized paragraph counts; uncached paragraphs are encoded in one batch"""
+        encoding_name = encoding.name if encoding is not None else "chars/4"
+        keyed = [
+            [((encoding_name, hashlib.blake2b(s.encode(), digest_size=16).digest()), s)
+             for s in split_segments(text)]
+            for text in texts
+        ]
+        
+        known: Dict[tuple, int] = {}
+        missing: Dict[tuple, str] = {}
+        with self._lock:
+            for segments in keyed:
+                for key, segment in segments:
+                    if key in self._cache:
+                        self._cache.move_to_end(key)
+                        known[key] = self._cache[key]
+                        self.hits += 1
+                    elif key not in missing:
+                        missing[key] = segment
+                        self.misses += 1
+        
+        if missing:
+            counts = self._raw_counts(list(missing.values()), encoding)
+            known.update(zip(missing, counts))
+            with self._lock:
+                self._cache.update(zip(missing, counts))
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        
+        return [sum(known[key] for key, _ in segments) for segments in keyed]
+    
+    def count_batch(self, texts: List[str], model: str) -> List[int]:
+        counts = self._segment_counts(texts, self.encoding_for(model))
+        if provider_family(model) == "anthropic":
+            return [round(count * self.anthropic_ratio) for count in counts]
+        return counts
+    
+    def count(self, text: str, model: str) -> int:
+        return self.count_batch([text], model)[0]
+    
+    def count_prompt(self, prompt: str, model: str, system_prompt: Optional[str] = None) -> int:
+        """Input tokens for a user message plus optional system prompt (what providers send)"""
+        texts = [system_prompt, prompt] if system_prompt else [prompt]
+        return sum(self.count_batch(texts, model)) + message_overhead(model, len(texts))
+    
+    def record_usage(self, model: str, prompt: str, reported_input_tokens: int,
+                     system_prompt: Optional[str] = None, alpha: float = 0.1):
+        """Calibrate the Claude approximation against what the API reported"""
+        if provider_family(model) != "anthropic" or not reported_input_tokens:
+            return
+        texts = [system_prompt, prompt] if system_prompt else [prompt]
+        base = sum(self._segment_counts(texts, self.encoding_for(model))) or 1
+        observed = (reported_input_tokens - message_overhead(model, len(texts))) / base
+        if observed > 0:
+            with self._lock:
+                self.anthropic_ratio += alpha * (observed - self.anthropic_ratio)
+
+
+# Shared counter used by LLMProvider.estimate_tokens / predict_cost
+TOKEN_COUNTER = TokenCounter()
+
+
+# ============================================================================
+# BENCHMARK
+# ============================================================================
+
+def benchmark(live_provider=None, prompts: Optional[List[str]] = None):
+    import time
+    
+    system = "You are a helpful assistant. Answer based on the context. Cite sources.\n\n"
+    chunks = [f"[{i}] Chunk {i} of the handbook explains policy number {i * 7} in detail. " * 8
+              for i in range(50)]
+    prompts = prompts or [
+        system + "\n\n".join(chunks[i:i + 5]) + f"\n\nQuestion: what does policy {i} say?"
+        for i in range(200)
+    ]
+    total_chars = sum(len(p) for p in prompts)
+    
+    for model in ("gpt-4o-mini", "claude-haiku-3-5-20241022"):
+        counter = TokenCounter()
+        start = time.perf_counter()
+        counter.count_batch(prompts, model)
+        cold = time.perf_counter() - start
+        start = time.perf_counter()
+        counter.count_batch(prompts, model)
+        warm = time.perf_counter() - start
+        print(f"{model:28} cold {total_chars / cold / 1e6:7.1f} MB/s   "
+              f"warm {total_chars / warm / 1e6:7.1f} MB/s   "
+              f"segment cache hits {counter.hits}/{counter.hits + counter.misses}")
+    
+    encoding = TokenCounter().encoding_for("gpt-4o-mini")
+    if encoding is not None:
+        exact = [len(encoding.encode_ordinary(p)) for p in prompts]
+        segmented = TokenCounter().count_batch(prompts, "gpt-4o-mini")
+        print(f"segmented == full encode: {segmented == exact} ({sum(exact)} tokens); "
+              f"chars/4 estimate: {total_chars // 4}")
+    
+    if live_provider is not None:
+        counter = TokenCounter()
+        errors = []
+        for prompt in prompts[:20]:
+            predicted = counter.count_prompt(prompt, live_provider.model, live_provider.system_prompt)
+            response = live_provider.generate(prompt, max_tokens=1)
+            counter.record_usage(live_provider.model, prompt, response.input_tokens,
+                                 live_provider.system_prompt)
+            errors.append((predicted - response.input_tokens) / response.input_tokens)
+        mean_error = sum(abs(e) for e in errors) / len(errors)
+        print(f"{live_provider.model}: mean abs error vs reported input tokens {mean_error:.1%}"
+              f" (ratio now {counter.anthropic_ratio:.3f})")
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+    parser = argparse.ArgumentParser(description="Benchmark local token counting")
+    parser.add_argument("--live", choices=["openai", "anthropic"],
+                        help="also compare against usage reported by the API (costs a few cents)")
+    args = parser.parse_args()
+    
+    provider = None
+    if args.live == "openai":
+        from .openai_provider import OpenAIProvider
+        provider = OpenAIProvider(api_key=os.getenv("OPENAI_API_KEY"))
+    elif args.live == "anthropic":
+        from .anthropic_provider import AnthropicProvider
+        provider = AnthropicProvider(api_key=os.getenv("ANTHROPIC_API_KEY"))
+    benchmark(provider)
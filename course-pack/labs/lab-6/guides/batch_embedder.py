@@ -0,0 +1,225 @@
+"""
+Batched, concurrent embedding for RAG ingestion (used by rag-pipeline-examples.py).
+
+One embeddings request can carry up to 2048 inputs (and 300k tokens), so
+sending chunks one at a time wastes ~99% of the round trips. BatchEmbedder:
+
+    - packs texts into requests by input count AND token budget
+    - runs several requests at once, under RPM/TPM limits
+    - retries failed requests with exponential backoff
+    - returns/yields results in the original order
+    - optionally skips texts already in an EmbeddingCache
+    
+    embedder = BatchEmbedder(client)
+    vectors = embedder.embed(["text one", "text two"])             # (n, dim) float32
+    for batch in embedder.embed_chunks(chunks):                    # streams, in order
+        db.add_documents(batch)
+"""
+
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional
+import numpy as np
+from embedding_cache import EmbeddingCache
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Errors that won't succeed on retry (bad input, auth, unknown model)
+NON_RETRYABLE_STATUS = (400, 401, 403, 404, 422)
+
+class TokenBucketLimiter:
+    """Requests-per-minute and tokens-per-minute limits shared by worker threads."""
+    
+    def __init__(self, rpm: int, tpm: int):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.requests = float(rpm)
+        self.tokens = float(tpm)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self, tokens: int):
+        tokens = min(tokens, self.tpm)  # a single oversized request must still pass
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                elapsed = now - self.updated
+                self.updated = now
+                self.requests = min(self.rpm, self.requests + elapsed * self.rpm / 60)
+                self.tokens = min(self.tpm, self.tokens + elapsed * self.tpm / 60)
+                if self.requests >= 1 and self.tokens >= tokens:
+                    self.requests -= 1
+                    self.tokens -= tokens
+                    return
+                wait = max((1 - self.requests) * 60 / self.rpm, (tokens - self.tokens) * 60 / self.tpm)
+            time.sleep(max(wait, 0.01))
+
+class BatchEmbedder:
+    def __init__(
+        self,
+        client,
+        model: str = "text-embedding-3-small",
+        max_inputs: int = 2048,
+        max_tokens_per_request: int = 300_000,
+        max_tokens_per_input: int = 8191,
+        concurrency: int = 8,
+        rpm: int = 3000,
+        tpm: int = 1_000_000,
+        max_retries: int = 5,
+        cache: Optional[EmbeddingCache] = None
+    ):
+        """rpm/tpm default to OpenAI Tier 1 limits for text-embedding-3-small.
+        
+        With a cache, texts embedded before (by this model) aren't sent again.
+        """
+        self.client = client
+        self.cache = cache
+        self.model = model
+        self.max_inputs = max_inputs
+        self.max_tokens_per_request = max_tokens_per_request
+        self.max_tokens_per_input = max_tokens_per_input
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.limiter = TokenBucketLimiter(rpm, tpm)
+        self.encoding = None
+        if tiktoken is not None:
+            try:
+                self.encoding = tiktoken.get_encoding("cl100k_base")  # used by all OpenAI embedding models
+            except Exception:
+                pass  # BPE file can't be downloaded; estimate ~4 chars/token
+        self.stats = {"requests": 0, "retries": 0, "inputs": 0, "tokens": 0}
+        self._stats_lock = threading.Lock()
+    
+    def _fit(self, text: str):
+        """(text trimmed to the per-input limit, its token count)."""
+        text = text or " "  # the API rejects empty strings
+        if self.encoding is None:
+            text = text[:self.max_tokens_per_input * 4]
+            return text, max(1, len(text) // 4)
+        tokens = self.encoding.encode_ordinary(text)
+        if len(tokens) > self.max_tokens_per_input:
+            tokens = tokens[:self.max_tokens_per_input]
+            text = self.encoding.decode(tokens)
+        return text, len(tokens)
+    
+    def plan_batches(self, texts: List[str]) -> List[tuple]:
+        """Group texts into requests: [(texts, token_count), ...] in order."""
+        batches, current, current_tokens = [], [], 0
+        for text in texts:
+            text, tokens = self._fit(text)
+            if current and (len(current) == self.max_inputs
+                            or current_tokens + tokens > self.max_tokens_per_request):
+                batches.append((current, current_tokens))
+                current, current_tokens = [], 0
+            current.append(text)
+            current_tokens += tokens
+        if current:
+            batches.append((current, current_tokens))
+        return batches
+    
+    def _embed_request(self, texts: List[str], tokens: int) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype="float32")
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire(tokens)
+            try:
+                response = self.client.embeddings.create(model=self.model, input=texts)
+                break
+            except Exception as e:
+                if getattr(e, "status_code", None) in NON_RETRYABLE_STATUS or attempt == self.max_retries:
+                    raise
+                with self._stats_lock:
+                    self.stats["retries"] += 1
+                time.sleep(min(60, 2 ** attempt) * (0.5 + random.random()))  # backoff + jitter
+        
+        with self._stats_lock:
+            self.stats["requests"] += 1
+            self.stats["inputs"] += len(texts)
+            self.stats["tokens"] += tokens
+        data = sorted(response.data, key=lambda item: item.index)
+        return np.array([item.embedding for item in data], dtype="float32")
+    
+    def _embed_batches(self, batches: Iterable[tuple]) -> Iterator[np.ndarray]:
+        """Run requests concurrently; yield results in submission order."""
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            pending = deque()
+            for texts, tokens in batches:
+                pending.append(pool.submit(self._embed_request, texts, tokens))
+                # Keep a bounded window in flight so huge inputs stream instead of queueing
+                if len(pending) >= 2 * self.concurrency:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+    
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Embeddings for all texts, as an (n, dim) float32 array in input order."""
+        if not texts:
+            return np.zeros((0, 0), dtype="float32")
+        if self.cache is None:
+            return np.vstack(list(self._embed_batches(self.plan_batches(texts))))
+        
+        rows = self.cache.lookup(texts)
+        missing = np.flatnonzero(rows < 0)
+        if len(missing):
+            new_texts = [texts[i] for i in missing]
+            new = np.vstack(list(self._embed_batches(self.plan_batches(new_texts))))
+            self.cache.put_many(new_texts, new)
+            if len(missing) == len(texts):
+                return new
+        result = np.empty((len(texts), self.cache.dimension), dtype="float32")
+        found = np.flatnonzero(rows >= 0)
+        result[found] = self.cache.vectors(rows[found])
+        if len(missing):
+            result[missing] = new
+        return result
+    
+    def embed_chunks(self, chunks: Iterable[Dict], batch_size: int = 2048) -> Iterator[List[Dict]]:
+        """Add "embedding" to each chunk; yields lists of chunks in order as they finish.
+        
+        `chunks` can be any iterable (e.g. a generator over a large corpus); it
+        is consumed `batch_size` chunks at a time. With a cache, only chunks
+        whose text isn't cached are sent.
+        """
+        def groups():
+            group = []
+            for chunk in chunks:
+                group.append(chunk)
+                if len(group) == batch_size:
+                    yield group
+                    group = []
+            if group:
+                yield group
+        
+        # Each request is tagged with its chunks, and with its whole group if it's
+        # the group's last request (a fully cached group sends one empty request)
+        in_flight = deque()
+        def requests():
+            for group in groups():
+                todo = group
+                if self.cache is not None:
+                    rows = self.cache.lookup([chunk["text"] for chunk in group])
+                    if (rows >= 0).any():
+                        vectors = self.cache.vectors(rows[rows >= 0])
+                        for chunk, vector in zip((c for c, r in zip(group, rows) if r >= 0), vectors):
+                            chunk["embedding"] = vector
+                    todo = [chunk for chunk, row in zip(group, rows) if row < 0]
+                batches = self.plan_batches([chunk["text"] for chunk in todo]) or [([], 0)]
+                for n, (texts, tokens) in enumerate(batches):
+                    in_flight.append((todo[:len(texts)], group if n == len(batches) - 1 else None))
+                    todo = todo[len(texts):]
+                    yield texts, tokens
+        
+        for vectors in self._embed_batches(requests()):
+            batch, group = in_flight.popleft()
+            for chunk, vector in zip(batch, vectors):
+                chunk["embedding"] = vector
+            if self.cache is not None and batch:
+                self.cache.put_many([chunk["text"] for chunk in batch], vectors)
+            if group is not None:
+                yield group
@@ -0,0 +1,297 @@
+"""
+Compact, columnar chunk metadata (used by FAISSVectorDB).
+
+A list of chunk dicts costs hundreds of bytes of Python objects per chunk
+before the text itself (and ~50KB if the 1536-float embedding list is kept).
+ChunkStore keeps one column per field instead:
+
+    str fields      one UTF-8 buffer + int64 offsets   (len(text) + 8 bytes)
+    int/float       array("q") / array("d")            (8 bytes)
+    "embedding"     dropped; the FAISS index already holds the vectors
+
+so 10M chunks of ~500 characters need ~5GB rather than ~25GB+ of objects.
+store[i] builds the dict for one chunk on demand (search only does that for
+its top_k hits).
+
+Chunks don't all need the same fields. A field that first appears in a
+later chunk (e.g. doc_id added by upsert_document) becomes a new column, and
+rows without a field (earlier ones, or later chunks that leave it out) are
+recorded as runs of absent rows: store[i] leaves it out and values() gives
+None. A value of the wrong type rejects the batch before anything is written.
+
+On disk (save() / write_chunks()), each column is one file:
+
+    <dir>/chunks.json            {"count": n, "columns": {"text": "str", "id": "int64", ...},
+                                  "absent": {"doc_id": [[0, 120]]}}  (row runs without a field)
+    <dir>/<field>.npy            int64 / float64 columns
+    <dir>/<field>.bin            str columns: every value in one UTF-8 buffer...
+    <dir>/<field>.offsets.npy    ...and n+1 byte offsets into it
+
+ChunkStore(directory) maps those files (np.load(mmap_mode="r") / np.memmap),
+so it opens in the same time for 1k or 10M chunks, only the rows a query
+touches get read, and every process opening the same directory shares the
+OS page cache. Chunks added after that are kept in memory until the next save.
+"""
+
+import bisect
+import json
+import math
+import os
+from array import array
+from collections.abc import Sequence
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+
+MANIFEST = "chunks.json"
+TYPECODES = {"int64": "q", "float64": "d"}
+
+def _column_kind(name: str, value) -> str:
+    if isinstance(value, str):
+        return "str"
+    if isinstance(value, (bool, int, np.integer)):
+        return "int64"
+    if isinstance(value, (float, np.floating)):
+        return "float64"
+    raise TypeError(f"Can't store chunk field {name!r} of type {type(value).__name__}")
+
+def _fits(kind: str, value) -> bool:
+    try:
+        actual = _column_kind("", value)
+    except TypeError:
+        return False
+    return actual == kind or (kind == "float64" and actual == "int64")
+
+def _in_runs(runs: List[List[int]], row: int) -> bool:
+    """Whether `row` falls in one of the sorted [start, end) runs."""
+    k = bisect.bisect_right(runs, [row, math.inf]) - 1
+    return k >= 0 and row < runs[k][1]
+
+def replace_file(path: str, write):
+    """Write to a temp file, then rename over `path`.
+    
+    Readers that still map the old file keep its inode alive, so rewriting a
+    store that is loaded elsewhere never crashes them.
+    """
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        write(f)
+    os.replace(tmp, path)
+
+class ChunkStore(Sequence):
+    """Chunk fields stored by column; fields come from the first chunk added."""
+    
+    def __init__(self, directory: Optional[str] = None, skip=("embedding",)):
+        self.skip = skip
+        self.kinds: Dict[str, str] = {}
+        # Rows without a field: name -> sorted [start, end) runs
+        self.absent: Dict[str, List[List[int]]] = {}
+        # Rows [0, mapped_count) come from mapped files, the rest from in-memory arrays
+        self.mapped = {}
+        self.mapped_count = 0
+        self.appended = {}
+        self.appended_count = 0
+        if directory is not None:
+            self._map(directory)
+    
+    def _map(self, directory: str):
+        with open(os.path.join(directory, MANIFEST)) as f:
+            manifest = json.load(f)
+        self.mapped_count = manifest["count"]
+        for name, kind in manifest["columns"].items():
+            base = os.path.join(directory, name)
+            if kind == "str":
+                offsets = np.load(base + ".offsets.npy", mmap_mode="r")
+                if os.path.getsize(base + ".bin"):
+                    data = np.memmap(base + ".bin", dtype="uint8", mode="r")
+                else:
+                    data = np.zeros(0, dtype="uint8")  # can't map an empty file
+                self.mapped[name] = (data, offsets)
+            else:
+                self.mapped[name] = np.load(base + ".npy", mmap_mode="r")
+        self._set_kinds(manifest["columns"])
+        self.absent = manifest.get("absent") or {
+            name: [[0, first_row]] for name, first_row in manifest.get("first_rows", {}).items()}
+    
+    def _set_kinds(self, kinds: Dict[str, str]):
+        self.kinds = kinds
+        for name, kind in kinds.items():
+            if kind == "str":
+                self.appended[name] = (bytearray(), array("q", [0]))
+            else:
+                self.appended[name] = array(TYPECODES[kind])
+    
+    def __len__(self) -> int:
+        return self.mapped_count + self.appended_count
+    
+    def check(self, chunks: List[Dict]) -> Dict[str, str]:
+        """New columns as name -> kind. Raises TypeError if a value doesn't
+        fit its column; changes nothing."""
+        kinds = dict(self.kinds)
+        new = {}
+        for chunk in chunks:
+            for name, value in chunk.items():
+                if name in self.skip:
+                    continue
+                if name not in kinds:
+                    kinds[name] = new[name] = _column_kind(name, value)
+                elif not _fits(kinds[name], value):
+                    raise TypeError(f"Chunk field {name!r} holds {kinds[name]}, got {type(value).__name__}")
+        return new
+    
+    def _mark_absent(self, name: str, start: int, end: int):
+        runs = self.absent.setdefault(name, [])
+        if runs and runs[-1][1] == start:
+            runs[-1][1] = end
+        else:
+            runs.append([start, end])
+    
+    def _add_column(self, name: str, kind: str):
+        """New column; rows stored before it hold placeholders ("" / 0)."""
+        self.kinds[name] = kind
+        if len(self):
+            self.absent[name] = [[0, len(self)]]
+        if kind == "str":
+            if self.mapped_count:
+                self.mapped[name] = (np.zeros(0, dtype="uint8"), np.zeros(self.mapped_count + 1, dtype="int64"))
+            self.appended[name] = (bytearray(), array("q", [0] * (self.appended_count + 1)))
+        else:
+            if self.mapped_count:
+                self.mapped[name] = np.zeros(self.mapped_count, dtype=kind)
+            self.appended[name] = array(TYPECODES[kind], [0] * self.appended_count)
+    
+    def extend(self, chunks: Iterable[Dict]):
+        # Check the whole batch first, so a bad chunk can't leave columns misaligned
+        chunks = chunks if isinstance(chunks, list) else list(chunks)
+        for name, kind in self.check(chunks).items():
+            self._add_column(name, kind)
+        for chunk in chunks:
+            for name, kind in self.kinds.items():
+                if name not in chunk:
+                    self._mark_absent(name, len(self), len(self) + 1)
+                if kind == "str":
+                    data, offsets = self.appended[name]
+                    data += chunk.get(name, "").encode("utf-8")
+                    offsets.append(len(data))
+                else:
+                    self.appended[name].append(chunk.get(name, 0))
+            self.appended_count += 1
+    
+    def append(self, chunk: Dict):
+        self.extend([chunk])
+    
+    def __getitem__(self, i: int) -> Dict:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("chunk index out of range")
+        
+        row = {}
+        absent = {name for name, runs in self.absent.items() if _in_runs(runs, i)}
+        if i < self.mapped_count:
+            for name, kind in self.kinds.items():
+                if name in absent:
+                    continue
+                if kind == "str":
+                    data, offsets = self.mapped[name]
+                    row[name] = data[offsets[i]:offsets[i + 1]].tobytes().decode("utf-8")
+                else:
+                    row[name] = self.mapped[name][i].item()
+            return row
+        
+        i -= self.mapped_count
+        for name, kind in self.kinds.items():
+            if name in absent:
+                continue
+            if kind == "str":
+                data, offsets = self.appended[name]
+                row[name] = data[offsets[i]:offsets[i + 1]].decode("utf-8")
+            else:
+                row[name] = self.appended[name][i]
+        return row
+    
+    def column(self, name: str) -> np.ndarray:
+        """All values of a numeric field as one (copied) array."""
+        kind = self.kinds[name]
+        if kind == "str":
+            raise TypeError(f"{name!r} is a str column")
+        # Copy: a live view would stop the in-memory array from growing
+        appended = np.frombuffer(self.appended[name], dtype=kind).copy()
+        if not self.mapped_count:
+            return appended
+        return np.concatenate([self.mapped[name], appended])
+    
+    def _str_column(self, name: str):
+        """(UTF-8 buffer, n+1 offsets) covering mapped and in-memory rows."""
+        data, offsets = self.appended[name]
+        offsets = np.frombuffer(offsets, dtype="int64").copy()
+        if not self.mapped_count:
+            return np.frombuffer(bytes(data), dtype="uint8"), offsets
+        mapped_data, mapped_offsets = self.mapped[name]
+        return (np.concatenate([mapped_data, np.frombuffer(bytes(data), dtype="uint8")]),
+                np.concatenate([mapped_offsets, offsets[1:] + len(mapped_data)]))
+    
+    def values(self, name: str) -> list:
+        """All values of a field as Python objects (None for rows without it)."""
+        if self.kinds[name] != "str":
+            values = self.column(name).tolist()
+        else:
+            data, offsets = self._str_column(name)
+            values = [data[offsets[i]:offsets[i + 1]].tobytes().decode("utf-8") for i in range(len(self))]
+        for start, end in self.absent.get(name, ()):
+            values[start:end] = [None] * (end - start)
+        return values
+    
+    def take(self, rows: np.ndarray) -> "ChunkStore":
+        """New in-memory store holding only `rows` (e.g. everything not deleted)."""
+        rows = np.asarray(rows, dtype="int64")
+        store = ChunkStore(skip=self.skip)
+        store._set_kinds(dict(self.kinds))
+        store.appended_count = len(rows)
+        # Rows stay in order, so each absent run maps to one run of the kept rows
+        for name, runs in self.absent.items():
+            for start, end in runs:
+                start, end = np.searchsorted(rows, [start, end])
+                if end > start:
+                    store._mark_absent(name, int(start), int(end))
+        if not len(rows):
+            return store
+        # Kept rows come in long consecutive runs, so copy text run by run
+        breaks = np.flatnonzero(np.diff(rows) != 1) + 1
+        run_starts = rows[np.concatenate([[0], breaks])]
+        run_ends = rows[np.concatenate([breaks - 1, [len(rows) - 1]])] + 1
+        for name, kind in self.kinds.items():
+            if kind == "str":
+                data, offsets = self._str_column(name)
+                buffer = bytearray()
+                for start, end in zip(run_starts, run_ends):
+                    buffer += data[offsets[start]:offsets[end]].tobytes()
+                new_offsets = np.zeros(len(rows) + 1, dtype="int64")
+                np.cumsum(offsets[rows + 1] - offsets[rows], out=new_offsets[1:])
+                store.appended[name] = (buffer, array("q", new_offsets.tobytes()))
+            else:
+                store.appended[name] = array(TYPECODES[kind], self.column(name)[rows].tobytes())
+        return store
+    
+    def save(self, directory: str):
+        """Write every column (mapped and in-memory rows) to `directory`."""
+        os.makedirs(directory, exist_ok=True)
+        for name, kind in self.kinds.items():
+            base = os.path.join(directory, name)
+            if kind == "str":
+                data, offsets = self._str_column(name)
+                replace_file(base + ".bin", lambda f: f.write(data.tobytes()))
+                replace_file(base + ".offsets.npy", lambda f: np.save(f, offsets))
+            else:
+                column = self.column(name)
+                replace_file(base + ".npy", lambda f: np.save(f, column))
+        
+        # Manifest last: a crash mid-save leaves the previous manifest pointing at complete files
+        manifest = json.dumps({"count": len(self), "columns": self.kinds, "absent": self.absent}).encode()
+        replace_file(os.path.join(directory, MANIFEST), lambda f: f.write(manifest))
+
+def write_chunks(directory: str, chunks: Iterable[Dict], skip=("embedding",)) -> int:
+    """Save chunk dicts column by column. Returns the count."""
+    store = ChunkStore(skip=skip)
+    store.extend(chunks)
+    store.save(directory)
+    return len(store)
@@ -0,0 +1,262 @@
+"""
+Streaming chunker for large documents (used by rag-pipeline-examples.py).
+
+chunk_text() needs the whole document in memory and cuts every chunk_size
+characters, mid-word. StreamingChunker reads from a file object (text or
+binary), an iterator of strings, or a string, holds only about one block
+(1MB) of it at a time, and yields chunks lazily:
+
+    - chunk_size/overlap in characters or tokens (tiktoken cl100k_base;
+      ~4 chars/token if it isn't available)
+    - cuts at whitespace, or at sentence ends (boundary="sentence")
+    - overlap must be smaller than chunk_size (checked up front)
+    - the same chunks for a string as for that text read in any block size
+    - same dicts as chunk_text(): id, text, start_pos, end_pos (character
+      offsets in the stream), plus any extra fields you pass
+    
+    chunker = StreamingChunker(chunk_size=400, overlap=40, unit="tokens")
+    with open("corpus.txt", encoding="utf-8") as f:
+        for batch in embedder.embed_chunks(chunker.chunks(f, doc_id=7)):
+            db.add_documents(batch)
+
+Throughput benchmark:
+    python chunker.py --mb 50
+    python chunker.py corpus.txt --unit tokens --boundary sentence
+"""
+
+import codecs
+import re
+import time
+from typing import Dict, Iterable, Iterator, Optional, Union
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+UNITS = ("chars", "tokens")
+BOUNDARIES = ("whitespace", "sentence")
+CHARS_PER_TOKEN = 4  # estimate when tiktoken isn't available
+SENTENCE_END = re.compile(r"[.!?][\"')\]]*(?=\s)")
+WHITESPACE = re.compile(r"\s")
+
+def _blocks(source: Union[str, Iterable, object], block_size: int) -> Iterator[str]:
+    """Text blocks from a string, a file object (text or binary) or an iterable."""
+    if isinstance(source, str):
+        yield source
+        return
+    if hasattr(source, "read"):
+        pieces = iter(lambda: source.read(block_size), source.read(0))
+    else:
+        pieces = iter(source)
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    for piece in pieces:
+        yield decoder.decode(piece) if isinstance(piece, bytes) else piece
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+class StreamingChunker:
+    def __init__(
+        self,
+        chunk_size: int = 500,
+        overlap: int = 50,
+        unit: str = "chars",
+        boundary: str = "whitespace",
+        block_size: int = 1 << 20
+    ):
+        if unit not in UNITS:
+            raise ValueError(f"unit must be one of {UNITS}")
+        if boundary not in BOUNDARIES:
+            raise ValueError(f"boundary must be one of {BOUNDARIES}")
+        if chunk_size < 1 or not 0 <= overlap < chunk_size:
+            raise ValueError(f"Need chunk_size >= 1 and 0 <= overlap < chunk_size (got {chunk_size}, {overlap})")
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.unit = unit
+        self.boundary = boundary
+        self.block_size = block_size
+        self.encoding = None
+        if unit == "tokens" and tiktoken is not None:
+            try:
+                self.encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception:
+                pass  # BPE file can't be downloaded; estimate ~4 chars/token
+        self.scale = CHARS_PER_TOKEN if unit == "tokens" and self.encoding is None else 1
+    
+    def chunks(self, source, **fields) -> Iterator[Dict]:
+        """Yield chunk dicts (with `fields` added to each) as the source is read."""
+        blocks = _blocks(source, self.block_size)
+        buffer, buffer_start, eof = "", 0, False
+        start, chunk_id = 0, 0
+        # Characters to have buffered past each chunk's start; grows if a token window falls short
+        window = self.chunk_size * (2 * CHARS_PER_TOKEN if self.encoding else self.scale) + 1
+        
+        while True:
+            # A full window past the chunk's first non-space character, so cuts
+            # don't depend on the block size
+            offset = start - buffer_start
+            while True:
+                offset = self._skip_space(buffer, offset, len(buffer))
+                if eof or len(buffer) >= offset + window:
+                    break
+                block = next(blocks, None)
+                if block is None:
+                    eof = True
+                else:
+                    buffer += block
+            if offset >= len(buffer):
+                return
+            
+            cut = self._cut(buffer, offset, window, eof)
+            if cut is None:
+                window *= 2  # long tokens: read more before cutting
+                continue
+            end, next_start = cut
+            yield dict(fields, id=chunk_id, text=buffer[offset:end],
+                       start_pos=buffer_start + offset, end_pos=buffer_start + end)
+            chunk_id += 1
+            if eof and end >= len(buffer):
+                return
+            start = buffer_start + next_start
+            
+            # Drop text no later chunk can reach
+            if start - buffer_start > self.block_size:
+                buffer = buffer[start - buffer_start:]
+                buffer_start = start
+    
+    def _cut(self, buffer: str, offset: int, window: int, eof: bool):
+        """(end, next chunk's start) for the chunk starting at `offset`, or None
+        if the buffered window doesn't hold chunk_size tokens yet."""
+        if self.encoding is None:
+            limit = offset + self.chunk_size * self.scale
+            if limit >= len(buffer) and eof:
+                return len(buffer), len(buffer)
+            end = self._align_end(buffer, offset, min(limit, len(buffer)))
+            return end, self._align_start(buffer, offset, end - self.overlap * self.scale, end)
+        
+        hi = min(len(buffer), offset + window)
+        tokens = self.encoding.encode_ordinary(buffer[offset:hi])
+        if len(tokens) <= self.chunk_size:
+            if eof and hi == len(buffer):
+                return len(buffer), len(buffer)
+            return None
+        _, offsets = self.encoding.decode_with_offsets(tokens[:self.chunk_size + 1])
+        end = self._align_end(buffer, offset, offset + offsets[self.chunk_size])
+        # Overlap starts `overlap` tokens before the (aligned) end
+        inside = sum(1 for o in offsets if offset + o < end)
+        back = offset + offsets[max(inside - self.overlap, 0)]
+        return end, self._align_start(buffer, offset, back, end)
+    
+    def _align_end(self, buffer: str, offset: int, limit: int) -> int:
+        """Move a cut back to a sentence end / whitespace, but not below half the chunk."""
+        floor = offset + (limit - offset) // 2
+        if self.boundary == "sentence":
+            last = None
+            for last in SENTENCE_END.finditer(buffer, floor, limit):
+                pass
+            if last is not None and last.end() > offset:
+                return last.end()
+        for i in range(limit, floor, -1):
+            if i < len(buffer) and buffer[i].isspace():
+                return i
+        return limit
+    
+    def _align_start(self, buffer: str, offset: int, back: int, end: int) -> int:
+        """Start the next chunk at a sentence/word start at or after `back`."""
+        back = max(back, offset + 1)
+        if back >= end:
+            return end
+        if self.boundary == "sentence":
+            match = SENTENCE_END.search(buffer, back - 1, end)
+            if match is not None and match.end() < end:
+                return match.end()
+        if not buffer[back - 1].isspace():
+            match = WHITESPACE.search(buffer, back, end)
+            back = match.start() if match else end
+        return back
+    
+    @staticmethod
+    def _skip_space(buffer: str, i: int, end: int) -> int:
+        while i < end and buffer[i].isspace():
+            i += 1
+        return i
+
+def chunk_stream(source, chunk_size: int = 500, overlap: int = 50, unit: str = "chars",
+                 boundary: str = "whitespace", **fields) -> Iterator[Dict]:
+    """Shortcut for StreamingChunker(...).chunks(source, **fields)."""
+    return StreamingChunker(chunk_size, overlap, unit, boundary).chunks(source, **fields)
+
+# ============================================================================
+# THROUGHPUT BENCHMARK
+# ============================================================================
+
+def synthetic_text(mb: float, seed: int = 0, block_chars: int = 1 << 20) -> Iterator[str]:
+    """~`mb` MB of sentence-like text, yielded in blocks (never all in memory)."""
+    import random
+    rng = random.Random(seed)
+    words = ("the of and to in is was for on that with as by at from order refund "
+             "customer shipped invoice account payment policy delivery support").split()
+    remaining = int(mb * 1e6)
+    while remaining > 0:
+        sentences = []
+        size = 0
+        while size < min(block_chars, remaining):
+            sentence = " ".join(rng.choice(words) for _ in range(rng.randint(6, 24))).capitalize() + ". "
+            sentences.append(sentence)
+            size += len(sentence)
+        remaining -= size
+        yield "".join(sentences)
+
+def benchmark(mb: float = 20, source: Optional[str] = None, configs=None) -> list:
+    """MB/s of each chunker configuration, on a file or synthetic text."""
+    configs = configs or [
+        {"unit": "chars", "boundary": "whitespace"},
+        {"unit": "chars", "boundary": "sentence"},
+        {"unit": "tokens", "boundary": "whitespace", "chunk_size": 128, "overlap": 16},
+        {"unit": "tokens", "boundary": "sentence", "chunk_size": 128, "overlap": 16},
+    ]
+    # Generate the synthetic text up front so the timing is the chunker's alone
+    blocks = None if source else list(synthetic_text(mb))
+    rows = []
+    for config in configs:
+        chunker = StreamingChunker(**config)
+        start = time.perf_counter()
+        count, chars = 0, 0
+        if source:
+            with open(source, "rb") as f:
+                for chunk in chunker.chunks(f):
+                    count += 1
+                    chars = chunk["end_pos"]
+        else:
+            for chunk in chunker.chunks(iter(blocks)):
+                count += 1
+                chars = chunk["end_pos"]
+        seconds = time.perf_counter() - start
+        rows.append(dict(config, chunks=count, mb=chars / 1e6, seconds=seconds,
+                         mb_per_s=chars / 1e6 / seconds, estimated_tokens=chunker.scale > 1))
+    return rows
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Streaming chunker throughput")
+    parser.add_argument("file", nargs="?", help="text file to chunk (default: synthetic text)")
+    parser.add_argument("--mb", type=float, default=20, help="size of the synthetic text")
+    parser.add_argument("--unit", choices=UNITS)
+    parser.add_argument("--boundary", choices=BOUNDARIES)
+    parser.add_argument("--chunk-size", type=int)
+    parser.add_argument("--overlap", type=int)
+    args = parser.parse_args()
+    
+    configs = None
+    if args.unit or args.boundary or args.chunk_size or args.overlap is not None:
+        config = {"unit": args.unit or "chars", "boundary": args.boundary or "whitespace"}
+        if args.chunk_size:
+            config["chunk_size"] = args.chunk_size
+        if args.overlap is not None:
+            config["overlap"] = args.overlap
+        configs = [config]
+    print(f"{'unit':7} {'boundary':11} {'chunks':>9} {'MB':>8} {'MB/s':>8}")
+    for row in benchmark(args.mb, args.file, configs):
+        note = "  (~4 chars/token, tiktoken unavailable)" if row["estimated_tokens"] else ""
+        print(f"{row['unit']:7} {row['boundary']:11} {row['chunks']:9} {row['mb']:8.1f} {row['mb_per_s']:8.1f}{note}")
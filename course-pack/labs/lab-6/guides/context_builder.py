@@ -0,0 +1,166 @@
+"""
+Prompt context from retrieved chunks, in as few tokens as possible (used by answer_with_rag).
+
+Joining the raw hits wastes input tokens: neighbouring chunks of one
+document repeat their overlap (50 characters with chunk_text's defaults),
+the same paragraph copied into several documents comes back several
+times, and nothing caps the total. ContextBuilder:
+
+    1. merges hits from the same document that overlap or touch
+       (by start_pos/end_pos) into one passage, text overlap removed
+    2. drops passages that are near-duplicates (MinHash estimate of word
+       3-gram Jaccard similarity >= dedup_threshold) of a better one
+    3. packs passages best-first until max_tokens is reached, skipping
+       any that don't fit (the best one is truncated rather than dropped)
+
+and numbers the passages [1], [2], ... with a citation for each: the
+chunks (and near-duplicates) it came from.
+
+    built = ContextBuilder(max_tokens=1500).build(hits)
+    built["context"]      # "[1] ...\n\n[2] ..."
+    built["citations"]    # [{"marker": 1, "doc_id": 0, "start_pos": ..., "sources": [hit, ...]}, ...]
+"""
+
+import hashlib
+from typing import Dict, List, Optional
+import numpy as np
+from keyword_index import tokenize
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+MINHASH_PRIME = (1 << 31) - 1  # keeps a * x + b inside uint64
+SEPARATOR = "\n\n"
+
+class MinHasher:
+    """MinHash signatures of word shingles; matching slots estimate Jaccard similarity."""
+    
+    def __init__(self, num_perm: int = 64, shingle_words: int = 3, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, MINHASH_PRIME, num_perm, dtype="uint64")
+        self.b = rng.integers(0, MINHASH_PRIME, num_perm, dtype="uint64")
+        self.shingle_words = shingle_words
+    
+    def signature(self, text: str) -> np.ndarray:
+        words = tokenize(text)
+        n = self.shingle_words
+        shingles = {" ".join(words[i:i + n]) for i in range(max(1, len(words) - n + 1))}
+        hashes = np.array([int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little")
+                           for s in shingles], dtype="uint64") % MINHASH_PRIME
+        return ((np.outer(hashes, self.a) + self.b) % MINHASH_PRIME).min(axis=0)
+    
+    @staticmethod
+    def similarity(a: np.ndarray, b: np.ndarray) -> float:
+        return float(np.mean(a == b))
+
+def merge_hits(hits: List[Dict], max_gap: int = 1) -> List[Dict]:
+    """Merge hits of one document that overlap or are at most `max_gap`
+    characters apart (whitespace a chunker skipped) into passages.
+    
+    Passages are ordered by their best-ranked hit; hits without
+    doc_id/start_pos stay passages of their own.
+    """
+    passages, by_doc = [], {}
+    for rank, hit in enumerate(hits):
+        if "doc_id" in hit and "start_pos" in hit:
+            by_doc.setdefault(hit["doc_id"], []).append((rank, hit))
+        else:
+            passages.append({"text": hit["text"], "rank": rank, "sources": [hit]})
+    
+    for doc_id, doc_hits in by_doc.items():
+        current = None
+        for rank, hit in sorted(doc_hits, key=lambda item: item[1]["start_pos"]):
+            start = hit["start_pos"]
+            end = start + len(hit["text"])  # chunk_text's last end_pos can run past the text
+            if current is not None and start <= current["end_pos"] + max_gap:
+                if end > current["end_pos"]:
+                    skip = max(current["end_pos"] - start, 0)
+                    gap = " " if start > current["end_pos"] else ""
+                    current["text"] += gap + hit["text"][skip:]
+                    current["end_pos"] = end
+                current["rank"] = min(current["rank"], rank)
+                current["sources"].append(hit)
+                continue
+            current = {"doc_id": doc_id, "start_pos": start, "end_pos": end,
+                       "text": hit["text"], "rank": rank, "sources": [hit]}
+            passages.append(current)
+    
+    passages.sort(key=lambda passage: passage["rank"])
+    for passage in passages:
+        del passage["rank"]
+    return passages
+
+class ContextBuilder:
+    def __init__(
+        self,
+        max_tokens: int = 2000,
+        dedup_threshold: float = 0.8,
+        model: str = "gpt-4o-mini",
+        minhash: Optional[MinHasher] = None
+    ):
+        """max_tokens: budget for the whole context (markers and separators included)."""
+        self.max_tokens = max_tokens
+        self.dedup_threshold = dedup_threshold
+        self.minhash = minhash or MinHasher()
+        self.encoding = None
+        if tiktoken is not None:
+            try:
+                self.encoding = tiktoken.encoding_for_model(model)
+            except Exception:
+                pass  # unknown model or BPE file can't be downloaded; estimate ~4 chars/token
+    
+    def count_tokens(self, text: str) -> int:
+        if self.encoding is None:
+            return max(1, len(text) // 4)
+        return len(self.encoding.encode_ordinary(text))
+    
+    def _truncate(self, text: str, tokens: int) -> str:
+        if self.encoding is None:
+            return text[:tokens * 4]
+        return self.encoding.decode(self.encoding.encode_ordinary(text)[:tokens])
+    
+    def build(self, hits: List[Dict]) -> Dict:
+        """Context string, citations (marker -> sources), and token accounting."""
+        passages = merge_hits(hits)
+        
+        # Near-duplicates of a better passage are dropped; their hits become extra sources
+        kept, signatures, duplicates = [], [], 0
+        for passage in passages:
+            signature = self.minhash.signature(passage["text"])
+            match = next((i for i, other in enumerate(signatures)
+                          if self.minhash.similarity(signature, other) >= self.dedup_threshold), None)
+            if match is None:
+                kept.append(passage)
+                signatures.append(signature)
+            else:
+                kept[match]["sources"].extend(passage["sources"])
+                duplicates += 1
+        
+        # Best first; skip what doesn't fit, but never leave the context empty
+        parts, citations, used, skipped = [], [], 0, 0
+        separator = self.count_tokens(SEPARATOR)
+        for passage in kept:
+            marker = f"[{len(citations) + 1}] "
+            cost = self.count_tokens(marker + passage["text"]) + (separator if parts else 0)
+            if used + cost > self.max_tokens:
+                if parts:
+                    skipped += 1
+                    continue
+                passage = dict(passage, text=self._truncate(passage["text"], self.max_tokens - self.count_tokens(marker)))
+                cost = self.count_tokens(marker + passage["text"])
+            parts.append(marker + passage["text"])
+            citations.append(dict(passage, marker=len(citations) + 1))
+            used += cost
+        
+        return {
+            "context": SEPARATOR.join(parts),
+            "citations": citations,
+            "tokens": used,
+            # What joining every raw hit would have cost
+            "raw_tokens": self.count_tokens(SEPARATOR.join(f"[{i + 1}] {hit['text']}" for i, hit in enumerate(hits))),
+            "merged": len(hits) - len(passages),
+            "duplicates": duplicates,
+            "skipped": skipped
+        }
@@ -0,0 +1,135 @@
+"""
+Persistent embedding cache (used by batch_embedder.py / rag-pipeline-examples.py).
+
+Re-running ingestion shouldn't pay to re-embed chunks that didn't change.
+Vectors are keyed by a hash of (model, text) and stored on disk as:
+
+    <dir>/<model>.vectors   float32 rows, appended; read through np.memmap
+    <dir>/<model>.keys      16-byte digests, one per row, same order
+    <dir>/<model>.json      {"model": ..., "dimension": ...}
+
+Lookups return views into the memory map (no copy, no unpickling), the OS
+page cache is shared by every process reading the same files, and opening a
+cache only reads the keys file (16 bytes per vector).
+
+One process writes at a time; readers can call refresh() to see new rows.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+import numpy as np
+
+KEY_BYTES = 16
+
+def _write_at(path: str, offset: int, data: bytes):
+    """Write `data` at `offset` and cut the file after it, so bytes past the
+    last whole row (left by a crash mid-write) are overwritten, not built on."""
+    with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+        f.seek(offset)
+        f.write(data)
+        f.truncate()
+
+class EmbeddingCache:
+    def __init__(self, directory: str, model: str = "text-embedding-3-small"):
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, model.replace("/", "_"))
+        self.model = model
+        self.vectors_path = base + ".vectors"
+        self.keys_path = base + ".keys"
+        self.meta_path = base + ".json"
+        self.dimension: Optional[int] = None
+        self.rows: Dict[bytes, int] = {}
+        self._map: Optional[np.memmap] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                self.dimension = json.load(f)["dimension"]
+        self.refresh()
+    
+    def key(self, text: str) -> bytes:
+        return hashlib.blake2b(f"{self.model}\0{text}".encode(), digest_size=KEY_BYTES).digest()
+    
+    def refresh(self):
+        """Load row keys (again); picks up rows another process appended."""
+        with self._lock:
+            if self.dimension is None or not os.path.exists(self.keys_path):
+                return
+            with open(self.keys_path, "rb") as f:
+                keys = f.read()
+            # A crash between the two writes can leave a partial row: trust whole rows
+            # only (put_many writes over whatever follows them)
+            stored = os.path.getsize(self.vectors_path) // (4 * self.dimension)
+            count = min(len(keys) // KEY_BYTES, stored)
+            self.rows = {keys[i * KEY_BYTES:(i + 1) * KEY_BYTES]: i for i in range(count)}
+            self._map = None
+    
+    def __len__(self) -> int:
+        return len(self.rows)
+    
+    def _vectors(self) -> np.ndarray:
+        if self._map is None and self.rows:
+            self._map = np.memmap(self.vectors_path, dtype="float32", mode="r",
+                                  shape=(len(self.rows), self.dimension))
+        return self._map
+    
+    def get(self, text: str) -> Optional[np.ndarray]:
+        """Read-only view of the cached vector, or None."""
+        with self._lock:
+            row = self.rows.get(self.key(text))
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return self._vectors()[row]
+    
+    def lookup(self, texts: List[str]) -> np.ndarray:
+        """Row number for each text, -1 where it isn't cached."""
+        with self._lock:
+            rows = np.fromiter((self.rows.get(self.key(text), -1) for text in texts),
+                               dtype="int64", count=len(texts))
+            found = int((rows >= 0).sum())
+            self.hits += found
+            self.misses += len(texts) - found
+            return rows
+    
+    def vectors(self, rows: np.ndarray) -> np.ndarray:
+        """Vectors for row numbers from lookup() (copied into one array)."""
+        with self._lock:
+            return np.asarray(self._vectors()[rows])
+    
+    def put_many(self, texts: List[str], vectors: np.ndarray):
+        vectors = np.ascontiguousarray(vectors, dtype="float32")
+        if not len(texts):
+            return
+        with self._lock:
+            if self.dimension is None:
+                self.dimension = vectors.shape[1]
+                with open(self.meta_path, "w") as f:
+                    json.dump({"model": self.model, "dimension": self.dimension}, f)
+            elif vectors.shape[1] != self.dimension:
+                raise ValueError(f"Expected {self.dimension}-dim vectors, got {vectors.shape[1]}")
+            
+            count = len(self.rows)
+            new_keys, new_rows = [], []
+            for text, vector in zip(texts, vectors):
+                key = self.key(text)
+                if key not in self.rows:
+                    self.rows[key] = len(self.rows)
+                    new_keys.append(key)
+                    new_rows.append(vector)
+            if not new_keys:
+                return
+            # Vectors first: a row only counts once its key is written too.
+            # Both go right after the last whole row, not at the end of the file
+            _write_at(self.vectors_path, count * 4 * self.dimension,
+                      np.asarray(new_rows, dtype="float32").tobytes())
+            _write_at(self.keys_path, count * KEY_BYTES, b"".join(new_keys))
+            self._map = None
+    
+    def put(self, text: str, vector):
+        self.put_many([text], np.asarray(vector, dtype="float32").reshape(1, -1))
@@ -0,0 +1,314 @@
+"""
+Parallel ingestion: parse -> chunk -> embed -> index (used by rag-pipeline-examples.py).
+
+A `for doc in docs` loop leaves the CPU idle while waiting on the embeddings
+API and the network idle while parsing PDFs. IngestionPipeline runs the
+stages at the same time, connected by bounded queues:
+
+    parse   process pool (PDFs via pymupdf, other formats via unstructured);
+            .txt/.md files skip it and are streamed straight to the chunker
+    chunk   one thread, StreamingChunker
+    embed   BatchEmbedder (batched, concurrent, rate-limited)
+    index   the calling thread, the only one that writes to the database
+
+A full queue blocks the stage feeding it (backpressure), so memory stays
+bounded however large the corpus is, and the report shows which stage is
+the bottleneck (busy) and which ones are waiting on it (blocked).
+
+With checkpoint_dir, the database is saved there every checkpoint_every_s
+seconds (between documents), along with the list of finished documents;
+re-running with the same directory skips them:
+
+    db = (FAISSVectorDB.load("index", mmap=False) if os.path.exists("index/db.json")
+          else FAISSVectorDB(embedder=embedder))
+    pipeline = IngestionPipeline(db, embedder, checkpoint_dir="index")
+    print_report(pipeline.run(glob.glob("corpus/**/*.pdf", recursive=True)))
+
+Parsers are optional (only needed for non-text files):
+pip install pymupdf unstructured
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, Iterable, Iterator, Optional, Tuple, Union
+from batch_embedder import BatchEmbedder
+from chunk_store import replace_file
+from chunker import StreamingChunker
+
+try:
+    import fitz  # pymupdf
+except ImportError:
+    fitz = None
+
+TEXT_EXTENSIONS = (".txt", ".md", ".rst", ".csv", ".json", ".html", ".htm", ".xml")
+CHECKPOINT = "ingest_checkpoint.json"
+_DONE = object()  # end-of-stream marker on the queues
+
+def parse_document(path: str) -> Tuple[str, float]:
+    """(text, seconds) for a PDF or other binary format; runs in a worker process."""
+    start = time.perf_counter()
+    if path.lower().endswith(".pdf") and fitz is not None:
+        with fitz.open(path) as document:
+            text = "\n".join(page.get_text() for page in document)
+    else:
+        try:
+            from unstructured.partition.auto import partition
+        except ImportError:
+            raise ValueError(f"No parser for {path}: pip install pymupdf unstructured")
+        text = "\n\n".join(str(element) for element in partition(filename=path))
+    return text, time.perf_counter() - start
+
+class IngestionPipeline:
+    def __init__(
+        self,
+        db,
+        embedder: BatchEmbedder,
+        chunker: Optional[StreamingChunker] = None,
+        parse_workers: Optional[int] = None,
+        queue_size: int = 4096,
+        checkpoint_dir: Optional[str] = None,
+        checkpoint_every_s: float = 60
+    ):
+        """
+        db:             FAISSVectorDB to add to (loaded with mmap=False to resume)
+        queue_size:     chunks buffered between chunking and embedding; parsed
+                        documents waiting to be chunked are capped at parse_workers
+        """
+        self.db = db
+        self.embedder = embedder
+        self.chunker = chunker or StreamingChunker()
+        self.parse_workers = parse_workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.checkpoint_dir = checkpoint_dir
+        self.checkpoint_every_s = checkpoint_every_s
+        self.completed = set()
+        self.failed: Dict[str, str] = {}
+        if checkpoint_dir and os.path.exists(os.path.join(checkpoint_dir, CHECKPOINT)):
+            with open(os.path.join(checkpoint_dir, CHECKPOINT)) as f:
+                checkpoint = json.load(f)
+            self.completed = set(checkpoint["completed"])  # failed documents are retried
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._errors = []
+    
+    def _put(self, q: queue.Queue, item, stage: Dict):
+        """Blocking put that counts time spent waiting on the next stage."""
+        start = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        stage["blocked_s"] += time.perf_counter() - start
+    
+    def _drain(self, q: queue.Queue) -> Iterator:
+        """Items until the end marker, or until another stage failed."""
+        while True:
+            try:
+                item = q.get(timeout=0.1)
+            except queue.Empty:
+                if self._stop.is_set():
+                    return
+                continue
+            if item is _DONE:
+                return
+            yield item
+    
+    def _run_stage(self, target, *args):
+        try:
+            target(*args)
+        except BaseException as e:
+            self._errors.append(e)
+            self._stop.set()
+    
+    def _fail(self, doc_id, error: Exception):
+        with self._lock:
+            self.failed[doc_id] = f"{type(error).__name__}: {error}"
+    
+    def _parse(self, sources, parsed: queue.Queue, stats: Dict):
+        """Stage 1: hand out documents; text files pass through unparsed."""
+        stage = stats["parse"]
+        with ProcessPoolExecutor(max_workers=self.parse_workers) as pool:
+            in_flight = {}
+            
+            def collect(block: bool):
+                done, _ = wait(in_flight, timeout=None if block else 0, return_when=FIRST_COMPLETED)
+                for future in done:
+                    doc_id, path = in_flight.pop(future)
+                    try:
+                        text, seconds = future.result()
+                    except Exception as e:
+                        self._fail(doc_id, e)
+                        continue
+                    stage["items"] += 1
+                    stage["busy_s"] += seconds
+                    stage["bytes"] += os.path.getsize(path)
+                    self._put(parsed, (doc_id, path, text), stage)
+            
+            for doc_id, path in sources:
+                if self._stop.is_set():
+                    break
+                if path.lower().endswith(TEXT_EXTENSIONS):
+                    try:
+                        stage["bytes"] += os.path.getsize(path)
+                    except OSError as e:
+                        self._fail(doc_id, e)
+                        continue
+                    stage["items"] += 1
+                    self._put(parsed, (doc_id, path, None), stage)  # read by the chunk stage
+                    continue
+                while len(in_flight) >= 2 * self.parse_workers:
+                    collect(block=True)
+                in_flight[pool.submit(parse_document, path)] = (doc_id, path)
+                collect(block=False)
+            while in_flight and not self._stop.is_set():
+                collect(block=True)
+        self._put(parsed, _DONE, stage)
+    
+    def _chunk(self, parsed: queue.Queue, chunks: queue.Queue, stats: Dict):
+        """Stage 2: one document at a time, so each document's chunks are contiguous."""
+        stage = stats["chunk"]
+        for doc_id, path, text in self._drain(parsed):
+            start = time.perf_counter()
+            blocked = stage["blocked_s"]
+            count = 0
+            if text is None:
+                try:
+                    source = open(path, "rb")  # streamed, never read whole
+                except OSError as e:
+                    self._fail(doc_id, e)
+                    continue
+            else:
+                source = text
+            try:
+                for chunk in self.chunker.chunks(source, doc_id=doc_id):
+                    self._put(chunks, chunk, stage)
+                    count += 1
+            finally:
+                if text is None:
+                    source.close()
+            if not count:
+                with self._lock:
+                    self.completed.add(doc_id)  # nothing to index
+            stage["items"] += count
+            stage["busy_s"] += time.perf_counter() - start - (stage["blocked_s"] - blocked)
+        self._put(chunks, _DONE, stage)
+    
+    def _checkpoint(self):
+        self.db.save(self.checkpoint_dir)
+        with self._lock:
+            data = json.dumps({"completed": sorted(self.completed, key=str), "failed": self.failed}).encode()
+        replace_file(os.path.join(self.checkpoint_dir, CHECKPOINT), lambda f: f.write(data))
+    
+    def run(self, sources: Iterable[Union[str, Tuple[str, str]]]) -> Dict:
+        """Ingest `sources` (paths, or (doc_id, path) pairs; doc_id defaults to
+        the path). Returns the per-stage report (see print_report)."""
+        stats = {stage: {"items": 0, "bytes": 0, "busy_s": 0.0, "blocked_s": 0.0}
+                 for stage in ("parse", "chunk", "embed", "index")}
+        pending = ((source, source) if isinstance(source, str) else tuple(source) for source in sources)
+        todo = ((doc_id, path) for doc_id, path in pending if doc_id not in self.completed)
+        parsed = queue.Queue(maxsize=self.parse_workers)
+        chunks = queue.Queue(maxsize=self.queue_size)
+        threads = [threading.Thread(target=self._run_stage, args=(self._parse, todo, parsed, stats), daemon=True),
+                   threading.Thread(target=self._run_stage, args=(self._chunk, parsed, chunks, stats), daemon=True)]
+        requests_before = dict(self.embedder.stats)
+        start = time.perf_counter()
+        last_checkpoint = start
+        for thread in threads:
+            thread.start()
+        
+        def runs() -> Iterator[list]:
+            """Stage 4 feed: embedded chunks split at document boundaries. Code after
+            each yield runs once add_documents has taken the previous batch."""
+            nonlocal last_checkpoint
+            index, embed = stats["index"], stats["embed"]
+            current = None
+            
+            def feed() -> Iterator[Dict]:
+                # Time spent waiting for chunks isn't embed work: take it back out of busy_s
+                items = self._drain(chunks)
+                while True:
+                    waited = time.perf_counter()
+                    chunk = next(items, _DONE)
+                    embed["busy_s"] -= time.perf_counter() - waited
+                    if chunk is _DONE:
+                        return
+                    yield chunk
+            
+            def handed_off(started: float):
+                # Embedding and indexing share this thread: while add_documents
+                # works on a run, the embed stage is blocked on it
+                seconds = time.perf_counter() - started
+                index["busy_s"] += seconds
+                embed["blocked_s"] += seconds
+            
+            groups = self.embedder.embed_chunks(feed())
+            while True:
+                started = time.perf_counter()
+                group = next(groups, None)
+                embed["busy_s"] += time.perf_counter() - started
+                if group is None:
+                    break
+                run = []
+                for chunk in group:
+                    if chunk["doc_id"] != current:
+                        if run:
+                            added = time.perf_counter()
+                            yield run
+                            handed_off(added)
+                            index["items"] += len(run)
+                            run = []
+                        if current is not None:
+                            with self._lock:
+                                self.completed.add(current)
+                            # Only between documents, and never while an untrained IVF index is buffering
+                            if (self.checkpoint_dir and self.db.index.is_trained
+                                    and time.perf_counter() - last_checkpoint >= self.checkpoint_every_s):
+                                self._checkpoint()
+                                last_checkpoint = time.perf_counter()
+                        current = chunk["doc_id"]
+                    run.append(chunk)
+                if run:
+                    added = time.perf_counter()
+                    yield run
+                    handed_off(added)
+                    index["items"] += len(run)
+            if current is not None and not self._stop.is_set():
+                with self._lock:
+                    self.completed.add(current)
+        
+        try:
+            self.db.add_documents(runs())
+            if self._errors:
+                raise self._errors[0]
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+        if self.checkpoint_dir:
+            self._checkpoint()
+        
+        wall = time.perf_counter() - start
+        # Parse time is summed over the pool's processes: report it as a share of the pool
+        stats["parse"]["busy_s"] /= self.parse_workers
+        embed = stats["embed"]
+        embed["items"] = self.embedder.stats["inputs"] - requests_before["inputs"]
+        embed["requests"] = self.embedder.stats["requests"] - requests_before["requests"]
+        embed["retries"] = self.embedder.stats["retries"] - requests_before["retries"]
+        return {"wall_s": wall, "stages": stats, "documents": len(self.completed), "failed": dict(self.failed)}
+
+def print_report(report: Dict):
+    wall = report["wall_s"]
+    print(f"{report['documents']} documents in {wall:.1f}s ({len(report['failed'])} failed)\n")
+    print(f"{'stage':7} {'items':>9} {'items/s':>9} {'MB/s':>7} {'busy':>6} {'blocked':>8}")
+    for name, stage in report["stages"].items():
+        mb_per_s = f"{stage['bytes'] / 1e6 / wall:7.1f}" if stage["bytes"] else f"{'':7}"
+        print(f"{name:7} {stage['items']:9} {stage['items'] / wall:9.1f} {mb_per_s} "
+              f"{stage['busy_s'] / wall:6.0%} {stage['blocked_s'] / wall:8.0%}")
+    for doc_id, error in report["failed"].items():
+        print(f"  failed: {doc_id}: {error}")
@@ -0,0 +1,188 @@
+"""
+BM25 keyword index kept alongside FAISSVectorDB (used by rag-pipeline-examples.py).
+
+Dense vectors are bad at exact tokens (order IDs, error codes, names) and
+need an embedding API call per query; an inverted index is the opposite.
+FAISSVectorDB(keyword_index=True) feeds every chunk to both, and
+search(mode="hybrid") fuses the two rankings with reciprocal rank fusion.
+
+Postings are compact: per term, an int64 array of chunk uids and a uint32
+array of term frequencies (12 bytes per occurrence, no Python objects per
+posting). Saved indexes are CSR arrays that load with mmap.
+
+    index = BM25Index()
+    index.add(uids, texts)
+    uids, scores = index.search("ORD-10442 refund", top_k=10)
+"""
+
+import json
+import os
+import re
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from chunk_store import replace_file
+
+TOKEN = re.compile(r"\w+")
+# Whole query is an ID-like token (contains a digit: "ORD-10442", "E1234", "#4521")
+# or a quoted phrase: exact matches matter more than meaning
+KEYWORD_QUERY = re.compile(r'^\s*(?:"[^"]+"|[#\w-]*\d[\w-]*)\s*$')
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN.findall(text.lower())
+
+def is_keyword_query(query: str) -> bool:
+    return bool(KEYWORD_QUERY.match(query))
+
+def reciprocal_rank_fusion(rankings: List[np.ndarray], k: int = 60) -> Tuple[np.ndarray, np.ndarray]:
+    """Fuse ranked uid lists: score = sum of 1 / (k + rank). Returns (uids, scores), best first."""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, uid in enumerate(ranking.tolist()):
+            if uid != -1:
+                scores[uid] = scores.get(uid, 0.0) + 1.0 / (k + rank + 1)
+    fused = sorted(scores.items(), key=lambda item: -item[1])
+    return (np.array([uid for uid, _ in fused], dtype="int64"),
+            np.array([score for _, score in fused], dtype="float64"))
+
+class BM25Index:
+    """Not thread-safe: FAISSVectorDB calls it under its own locks."""
+    
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        # In-memory postings: term -> (uids, term frequencies)
+        self.postings: Dict[str, Tuple[array, array]] = {}
+        # Postings loaded from disk (CSR): term -> i, uids/tfs[offsets[i]:offsets[i + 1]]
+        self.mapped_terms: Dict[str, int] = {}
+        self.mapped = None
+        # Tokens per chunk, indexed by uid; 0 = deleted (or never added)
+        self.doc_len = array("I")
+        self.docs = 0
+        self.total_len = 0
+    
+    def add(self, uids: Iterable[int], texts: Iterable[str]):
+        for uid, text in zip(uids, texts):
+            counts = Counter(tokenize(text))
+            length = sum(counts.values())
+            if uid >= len(self.doc_len):
+                self.doc_len.extend([0] * (uid + 1 - len(self.doc_len)))
+            self.doc_len[uid] = length
+            if length:
+                self.docs += 1
+                self.total_len += length
+            for term, tf in counts.items():
+                postings = self.postings.get(term)
+                if postings is None:
+                    postings = self.postings[term] = (array("q"), array("I"))
+                postings[0].append(uid)
+                postings[1].append(tf)
+    
+    def remove(self, uids: Iterable[int]):
+        """Mark chunks deleted; their postings are skipped until compacted()."""
+        for uid in uids:
+            if uid < len(self.doc_len) and self.doc_len[uid]:
+                self.docs -= 1
+                self.total_len -= self.doc_len[uid]
+                self.doc_len[uid] = 0
+    
+    def _postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        uids, tfs = [], []
+        if term in self.mapped_terms:
+            offsets, mapped_uids, mapped_tfs = self.mapped
+            i = self.mapped_terms[term]
+            uids.append(mapped_uids[offsets[i]:offsets[i + 1]])
+            tfs.append(mapped_tfs[offsets[i]:offsets[i + 1]])
+        if term in self.postings:
+            uids.append(np.frombuffer(self.postings[term][0], dtype="int64"))
+            tfs.append(np.frombuffer(self.postings[term][1], dtype="uint32"))
+        if not uids:
+            return np.zeros(0, dtype="int64"), np.zeros(0, dtype="uint32")
+        # Copies, so no view of the growing arrays outlives the call
+        return np.concatenate(uids), np.concatenate(tfs)
+    
+    def terms(self) -> List[str]:
+        return list(self.mapped_terms) + [term for term in self.postings if term not in self.mapped_terms]
+    
+    def search(self, query: str, top_k: int = 10, allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """(uids, BM25 scores) of the best-matching live chunks, best first.
+        
+        allowed: packed bitmap over uids (little-endian bit order, as for
+        faiss.IDSelectorBitmap); chunks whose bit isn't set are skipped.
+        """
+        if not self.docs:
+            return np.zeros(0, dtype="int64"), np.zeros(0)
+        doc_len = np.frombuffer(self.doc_len, dtype="uint32")
+        avgdl = self.total_len / self.docs
+        
+        all_uids, all_scores = [], []
+        for term in set(tokenize(query)):
+            uids, tfs = self._postings(term)
+            lengths = doc_len[uids]
+            live = lengths > 0
+            if allowed is not None:
+                inside = uids < len(allowed) * 8
+                live[inside] &= ((allowed[uids[inside] >> 3] >> (uids[inside] & 7).astype("uint8")) & 1).astype(bool)
+                live[~inside] = False
+            # idf counts every live chunk with the term, so filtering doesn't change scores
+            df = int(np.count_nonzero(lengths > 0))
+            uids, tf, lengths = uids[live], tfs[live].astype("float64"), lengths[live]
+            if not len(uids):
+                continue
+            idf = np.log(1 + (self.docs - df + 0.5) / (df + 0.5))
+            all_scores.append(idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * lengths / avgdl)))
+            all_uids.append(uids)
+        if not all_uids:
+            return np.zeros(0, dtype="int64"), np.zeros(0)
+        
+        # Sum per chunk across query terms
+        uids, inverse = np.unique(np.concatenate(all_uids), return_inverse=True)
+        totals = np.bincount(inverse, weights=np.concatenate(all_scores))
+        top = np.argsort(-totals, kind="stable")[:top_k]
+        return uids[top], totals[top]
+    
+    def compacted(self) -> "BM25Index":
+        """A copy without postings of removed chunks (built off to the side)."""
+        index = BM25Index(self.k1, self.b)
+        index.doc_len = array("I", self.doc_len)
+        index.docs, index.total_len = self.docs, self.total_len
+        doc_len = np.frombuffer(index.doc_len, dtype="uint32").copy()
+        for term in self.terms():
+            uids, tfs = self._postings(term)
+            live = doc_len[uids] > 0
+            if live.any():
+                index.postings[term] = (array("q", uids[live].tobytes()), array("I", tfs[live].tobytes()))
+        return index
+    
+    def save(self, directory: str):
+        """Write postings as CSR arrays: bm25.json (terms) + bm25.*.npy."""
+        terms = self.terms()
+        offsets = np.zeros(len(terms) + 1, dtype="int64")
+        uids, tfs = [], []
+        for i, term in enumerate(terms):
+            term_uids, term_tfs = self._postings(term)
+            offsets[i + 1] = offsets[i] + len(term_uids)
+            uids.append(term_uids)
+            tfs.append(term_tfs)
+        uids = np.concatenate(uids) if uids else np.zeros(0, dtype="int64")
+        tfs = np.concatenate(tfs) if tfs else np.zeros(0, dtype="uint32")
+        doc_len = np.frombuffer(self.doc_len, dtype="uint32").copy()
+        
+        for name, values in (("offsets", offsets), ("uids", uids), ("tfs", tfs), ("doc_len", doc_len)):
+            replace_file(os.path.join(directory, f"bm25.{name}.npy"), lambda f: np.save(f, values))
+        meta = json.dumps({"k1": self.k1, "b": self.b, "docs": self.docs,
+                           "total_len": self.total_len, "terms": terms}).encode()
+        replace_file(os.path.join(directory, "bm25.json"), lambda f: f.write(meta))
+    
+    @classmethod
+    def load(cls, directory: str) -> "BM25Index":
+        with open(os.path.join(directory, "bm25.json")) as f:
+            meta = json.load(f)
+        index = cls(meta["k1"], meta["b"])
+        index.docs, index.total_len = meta["docs"], meta["total_len"]
+        index.mapped_terms = {term: i for i, term in enumerate(meta["terms"])}
+        index.mapped = tuple(np.load(os.path.join(directory, f"bm25.{name}.npy"), mmap_mode="r")
+                             for name in ("offsets", "uids", "tfs"))
+        index.doc_len = array("I", np.load(os.path.join(directory, "bm25.doc_len.npy")).tobytes())
+        return index
@@ -0,0 +1,204 @@
+"""
+Bitmap indexes over chunk metadata, for filtered search (used by FAISSVectorDB).
+
+Filtering after the search (fetch 10x top_k, drop other tenants' chunks)
+costs more the more selective the filter is, and can still come back with
+fewer than top_k hits. Instead, FAISSVectorDB.search(filters=...) turns the
+filter into a bitmap of allowed chunk uids and hands it to FAISS as an
+IDSelectorBitmap, so non-matching vectors are skipped inside the scan.
+
+    db.search("refund policy", filters={"tenant": "acme"})
+    db.search("refund policy", filters={"source": ["faq.md", "terms.md"],      # any of
+                                        "date": {"$gte": "2024-01-01"}})      # range
+
+Values: a plain value (equality), a list (any of), or a dict of operators
+($eq, $in, $gt, $gte, $lt, $lte). Conditions on different fields must all hold.
+
+Each attribute is indexed on first use: value -> RoaringBitmap of uids.
+Like Roaring, uids are split into containers of 2^16 by their high bits;
+a container is a sorted uint16 array (2 bytes per uid) while it holds up to
+4096 uids, and a 65536-bit bitmap (8KB) once that is smaller. Suited to
+low/medium-cardinality fields (source, tenant, language, day), not to
+per-chunk unique values.
+"""
+
+import operator
+from typing import Dict, Iterable, Iterator, Tuple
+import numpy as np
+
+CONTAINER_BITS = 16
+CONTAINER_SIZE = 1 << CONTAINER_BITS
+ARRAY_MAX = 4096  # above this, a bitmap container (8KB) is smaller than an array one
+RANGE_OPERATORS = {"$gt": operator.gt, "$gte": operator.ge, "$lt": operator.lt, "$lte": operator.le}
+
+def _to_bits(lows: np.ndarray) -> np.ndarray:
+    bits = np.zeros(CONTAINER_SIZE, dtype=bool)
+    bits[lows] = True
+    return np.packbits(bits, bitorder="little")
+
+def _to_array(bits: np.ndarray) -> np.ndarray:
+    return np.flatnonzero(np.unpackbits(bits, bitorder="little")).astype("uint16")
+
+def _test(bits: np.ndarray, lows: np.ndarray) -> np.ndarray:
+    """Which of `lows` are set in a bitmap container."""
+    return ((bits[lows >> 3] >> (lows & 7).astype("uint8")) & 1).astype(bool)
+
+def _shrink(container: np.ndarray) -> np.ndarray:
+    """Pick the smaller representation for a container."""
+    if container.dtype == np.uint8:
+        count = int(np.unpackbits(container).sum())
+        return _to_array(container) if count <= ARRAY_MAX else container
+    return _to_bits(container) if len(container) > ARRAY_MAX else container
+
+class RoaringBitmap:
+    """A set of non-negative int64 uids in compressed containers."""
+    
+    def __init__(self, uids: Iterable[int] = ()):
+        # uid >> 16 -> sorted uint16 array, or uint8[8192] packed bits (little-endian)
+        self.containers: Dict[int, np.ndarray] = {}
+        uids = np.asarray(uids, dtype="int64")
+        if len(uids):
+            self.add(uids)
+    
+    def add(self, uids: np.ndarray):
+        uids = np.unique(np.asarray(uids, dtype="int64"))
+        highs = uids >> CONTAINER_BITS
+        lows = (uids & (CONTAINER_SIZE - 1)).astype("uint16")
+        bounds = np.concatenate([[0], np.flatnonzero(np.diff(highs)) + 1, [len(uids)]])
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            high = int(highs[start])
+            container = self.containers.get(high)
+            if container is None:
+                container = lows[start:end]
+            elif container.dtype == np.uint8:
+                container = container | _to_bits(lows[start:end])
+            else:
+                container = np.union1d(container, lows[start:end])
+            self.containers[high] = _shrink(container)
+    
+    def __len__(self) -> int:
+        return sum(int(np.unpackbits(c).sum()) if c.dtype == np.uint8 else len(c)
+                   for c in self.containers.values())
+    
+    def __and__(self, other: "RoaringBitmap") -> "RoaringBitmap":
+        result = RoaringBitmap()
+        for high in self.containers.keys() & other.containers.keys():
+            a, b = self.containers[high], other.containers[high]
+            if a.dtype == np.uint8 and b.dtype == np.uint8:
+                container = a & b
+            elif a.dtype == np.uint8 or b.dtype == np.uint8:
+                bits, lows = (a, b) if a.dtype == np.uint8 else (b, a)
+                container = lows[_test(bits, lows)]
+            else:
+                container = np.intersect1d(a, b, assume_unique=True)
+            container = _shrink(container)
+            if len(container):  # an empty bitmap shrinks to an empty array
+                result.containers[high] = container
+        return result
+    
+    def __or__(self, other: "RoaringBitmap") -> "RoaringBitmap":
+        return RoaringBitmap.union([self, other])
+    
+    @staticmethod
+    def union(bitmaps: Iterable["RoaringBitmap"]) -> "RoaringBitmap":
+        result = RoaringBitmap()
+        for bitmap in bitmaps:
+            for high, b in bitmap.containers.items():
+                a = result.containers.get(high)
+                if a is None:
+                    result.containers[high] = b
+                    continue
+                if a.dtype == np.uint8 or b.dtype == np.uint8:
+                    a = a if a.dtype == np.uint8 else _to_bits(a)
+                    container = a | (b if b.dtype == np.uint8 else _to_bits(b))
+                else:
+                    container = np.union1d(a, b)
+                result.containers[high] = _shrink(container)
+        return result
+    
+    def to_array(self) -> np.ndarray:
+        """All uids, sorted."""
+        parts = [(high << CONTAINER_BITS) + (_to_array(c) if c.dtype == np.uint8 else c).astype("int64")
+                 for high, c in sorted(self.containers.items())]
+        return np.concatenate(parts) if parts else np.zeros(0, dtype="int64")
+    
+    def to_bitmap(self, n: int) -> np.ndarray:
+        """Packed bits for uids [0, n), little-endian bit order (faiss.IDSelectorBitmap's)."""
+        out = np.zeros((n + 7) // 8, dtype="uint8")
+        for high, container in self.containers.items():
+            base = high * (CONTAINER_SIZE // 8)
+            if base >= len(out):
+                continue
+            if container.dtype == np.uint8:
+                segment = container[:len(out) - base]
+                out[base:base + len(segment)] |= segment
+            else:
+                positions = (high << CONTAINER_BITS) + container.astype("int64")
+                positions = positions[positions < n]
+                np.bitwise_or.at(out, positions >> 3, (1 << (positions & 7)).astype("uint8"))
+        return out
+
+def _groups(uids: np.ndarray, values: list) -> Iterator[Tuple[object, np.ndarray]]:
+    """(value, uids having it) for each distinct value."""
+    keys, inverse = np.unique(np.asarray(values), return_inverse=True)
+    order = np.argsort(inverse, kind="stable")
+    bounds = np.searchsorted(inverse[order], np.arange(len(keys) + 1))
+    for i, key in enumerate(keys.tolist()):
+        yield key, uids[order[bounds[i]:bounds[i + 1]]]
+
+class MetadataIndex:
+    """attribute -> value -> RoaringBitmap of chunk uids.
+    
+    Not thread-safe: FAISSVectorDB calls it under its own locks. Deleted
+    uids are left in the bitmaps; the caller masks them out.
+    """
+    
+    def __init__(self):
+        self.attributes: Dict[str, Dict[object, RoaringBitmap]] = {}
+    
+    def index(self, name: str, uids: np.ndarray, values: list):
+        """Index (or re-index) attribute `name` from every chunk's value (None = chunk lacks it)."""
+        uids = np.asarray(uids, dtype="int64")
+        present = [i for i, value in enumerate(values) if value is not None]
+        if len(present) < len(values):
+            uids, values = uids[present], [values[i] for i in present]
+        bitmaps = {}
+        if not values:
+            self.attributes[name] = bitmaps
+            return
+        for value, value_uids in _groups(uids, values):
+            bitmaps[value] = RoaringBitmap(value_uids)
+        self.attributes[name] = bitmaps
+    
+    def add(self, uids: np.ndarray, chunks: list):
+        """Keep already-indexed attributes up to date as chunks are added."""
+        uids = np.asarray(uids, dtype="int64")
+        for name, bitmaps in self.attributes.items():
+            present = [i for i, chunk in enumerate(chunks) if chunk.get(name) is not None]
+            if not present:
+                continue
+            values = [chunks[i][name] for i in present]
+            for value, value_uids in _groups(uids[present], values):
+                if value in bitmaps:
+                    bitmaps[value].add(value_uids)
+                else:
+                    bitmaps[value] = RoaringBitmap(value_uids)
+    
+    def match(self, name: str, condition) -> RoaringBitmap:
+        """uids whose `name` satisfies `condition` (value, list, or operator dict)."""
+        bitmaps = self.attributes[name]
+        if not isinstance(condition, dict):
+            condition = {"$in": condition} if isinstance(condition, (list, tuple, set)) else {"$eq": condition}
+        selected = None
+        for op, operand in condition.items():
+            if op == "$eq":
+                values = [operand]
+            elif op == "$in":
+                values = list(operand)
+            elif op in RANGE_OPERATORS:
+                values = [value for value in bitmaps if RANGE_OPERATORS[op](value, operand)]
+            else:
+                raise ValueError(f"Unknown filter operator {op!r} (use $eq, $in, {', '.join(RANGE_OPERATORS)})")
+            bitmap = RoaringBitmap.union(bitmaps[value] for value in values if value in bitmaps)
+            selected = bitmap if selected is None else selected & bitmap
+        return selected if selected is not None else RoaringBitmap()
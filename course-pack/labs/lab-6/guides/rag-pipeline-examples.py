@@ -4,22 +4,54 @@ Building AI-Powered Applications | Week 6
 
 Minimal but complete RAG implementation.
 
+Companion modules (same folder):
+    vector_indexes.py  - FAISS index types + recall/latency report
+    batch_embedder.py  - batched, concurrent, rate-limited embedding
+    embedding_cache.py - on-disk (memory-mapped) embedding cache
+    chunk_store.py     - compact columnar chunk metadata (in memory and on disk)
+    keyword_index.py   - BM25 index for hybrid (keyword + vector) search
+    metadata_index.py  - roaring-style bitmaps for metadata-filtered search
+    reranker.py        - local cross-encoder reranking (batched CPU, cached)
+    context_builder.py - merged, deduplicated, token-budgeted prompt context
+    chunker.py         - streaming, token/sentence-aware chunking
+    ingest_pipeline.py - parallel parse/chunk/embed/index pipeline with checkpoints
+
 Dependencies:
 pip install openai faiss-cpu numpy python-dotenv --break-system-packages
 """
 
+import json
 import os
-from typing import List, Dict
+import threading
+import time
+from array import array
+from typing import List, Dict, Iterable, Optional, Union
 from openai import OpenAI
-import numpy as np
-import faiss
 from dotenv import load_dotenv
+import faiss
+import numpy as np
+from batch_embedder import BatchEmbedder
+from chunk_store import ChunkStore
+from context_builder import ContextBuilder
+from embedding_cache import EmbeddingCache
+from keyword_index import BM25Index, is_keyword_query, reciprocal_rank_fusion
+from metadata_index import MetadataIndex
+from reranker import Reranker
+from vector_indexes import (build_index, min_training_vectors, prepare, read_index, search_params,
+                            set_search_params, to_scores, with_ids, write_index)
 
 load_dotenv()
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
 def chunk_text(text: str, chunk_size: int = 500, overlap: int = 50) -> List[Dict]:
-    """Split text into overlapping chunks."""
+    """Split text into overlapping chunks.
+    
+    For large files, token-based sizes or word/sentence-aligned cuts, use
+    chunker.StreamingChunker.
+    """
+    if not 0 <= overlap < chunk_size:
+        # start = end - overlap would never advance
+        raise ValueError(f"overlap ({overlap}) must be smaller than chunk_size ({chunk_size})")
     chunks = []
     start = 0
     chunk_id = 0
@@ -45,45 +77,423 @@ def generate_embedding(text: str) -> List[float]:
     )
     return response.data[0].embedding
 
+def generate_embeddings(texts: List[str]) -> List[List[float]]:
+    """Generate embeddings, one request per 2048 texts (the API's limit)."""
+    embeddings = []
+    for start in range(0, len(texts), 2048):
+        response = client.embeddings.create(
+            model="text-embedding-3-small",
+            input=texts[start:start + 2048]
+        )
+        embeddings.extend(item.embedding for item in sorted(response.data, key=lambda item: item.index))
+    return embeddings
+
 class FAISSVectorDB:
-    """Simple FAISS vector database."""
+    """Simple FAISS vector database.
+    
+    index_type picks the FAISS index (see vector_indexes.py): "flat_ip"
+    (exact cosine, default), "ivf_flat", "hnsw", "ivf_pq", or "flat_l2".
+    IVF indexes train on the first add_documents batch (or call train()).
+    
+    save() writes the index and chunk metadata to a directory; load() maps
+    them back in, so worker startup doesn't re-embed or rebuild anything.
+    
+    Every chunk gets a global "uid" (its FAISS id, never reused).
+    upsert_document()/delete_document() replace or remove a document's chunks:
+    deleted uids become tombstones that searches skip inside the FAISS scan,
+    and compact() (run in the background once COMPACT_RATIO of the index is
+    dead) drops them for real while queries keep using the old index.
+    
+    With keyword_index=True, chunks are also indexed with BM25 (see
+    keyword_index.py) and search(..., mode="keyword" / "hybrid") is available.
     
-    def __init__(self, dimension: int = 1536):
+    search(..., filters={"tenant": "acme"}) only returns chunks whose fields
+    match (see metadata_index.py). The filter becomes a bitmap of allowed uids
+    that FAISS checks inside the scan, so a filtered query costs about what
+    an unfiltered one does and still returns top_k hits when enough match
+    (HNSW may return fewer for very selective filters; raise ef_search).
+    """
+    
+    # FAISS wants ~39+ training points per IVF list for good centroids
+    TRAINING_VECTORS_PER_LIST = 40
+    # Start a background compaction once this fraction of indexed chunks is deleted
+    COMPACT_RATIO = 0.2
+    SEARCH_MODES = ("vector", "keyword", "hybrid")
+    # Candidates each retriever contributes to hybrid fusion (at least)
+    HYBRID_CANDIDATES = 20
+    
+    def __init__(self, dimension: int = 1536, index_type: str = "flat_ip",
+                 nprobe: int = 16, ef_search: int = 64,
+                 embedder: Optional[BatchEmbedder] = None, keyword_index: bool = False,
+                 **index_options):
         self.dimension = dimension
-        self.index = faiss.IndexFlatL2(dimension)
-        self.chunks = []
+        self.index_type = index_type
+        # Embeds queries; with an EmbeddingCache, repeated queries skip the API call
+        self.embedder = embedder
+        self.index_options = index_options
+        self.index = with_ids(build_index(index_type, dimension, **index_options))
+        self.nlist = getattr(self.index, "nlist", 0)
+        self.min_training_vectors = min_training_vectors(self.index)
+        # Text/ids/positions by column; embeddings are dropped once they're in the index
+        self.chunks = ChunkStore()
+        self.bm25 = BM25Index() if keyword_index else None
+        self.read_only = False
+        self.next_id = 0
+        self.deleted = set()
+        self.doc_chunks = None  # doc_id -> uids, built on first upsert/delete
+        self.metadata = MetadataIndex()  # bitmaps per filtered field, built on first use
+        self._selector = None
+        self._row_cache = None
+        self._compaction = None
+        # Writers (add/upsert/delete/compact/save) run one at a time; FAISS can't
+        # search and add concurrently, so searches and index changes take turns
+        self._write_lock = threading.RLock()
+        self._index_lock = threading.Lock()
+        self.tune(nprobe=nprobe, ef_search=ef_search)
+    
+    def tune(self, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+        """Trade recall for speed at query time (IVF: nprobe, HNSW: ef_search)."""
+        set_search_params(self.index, nprobe=nprobe, ef_search=ef_search)
+        self._selector = None  # cached search params copy nprobe/ef_search
+    
+    def train(self, embeddings):
+        """Train IVF centroids on a representative sample (>= min_training_vectors)."""
+        vectors = prepare(embeddings, self.index_type)
+        if len(vectors) < self.min_training_vectors:
+            raise ValueError(f"Need at least {self.min_training_vectors} vectors to train {self.index_type} "
+                             f"(got {len(vectors)}); use fewer lists/PQ bits, or flat_ip for small collections")
+        self.index.train(vectors)
+    
+    def add_documents(self, chunks: Union[List[Dict], Iterable[List[Dict]]]):
+        """Add chunks with embeddings to index.
+        
+        Also accepts a stream of embedded batches (e.g. BatchEmbedder.embed_chunks),
+        added as they arrive. An untrained IVF index buffers batches until it has
+        enough vectors to train on.
+        """
+        if self.read_only:
+            raise RuntimeError("Index was loaded with mmap=True and is read-only; load(mmap=False) to add")
+        if isinstance(chunks, list) and (not chunks or isinstance(chunks[0], dict)):
+            chunks = [chunks]
+        with self._write_lock:
+            pending = []
+            for batch in chunks:
+                if not batch:
+                    continue
+                if self.index.is_trained:
+                    self._add_batch(batch)
+                    continue
+                pending.extend(batch)
+                if len(pending) >= max(self.TRAINING_VECTORS_PER_LIST * self.nlist, self.min_training_vectors):
+                    self._add_batch(pending)
+                    pending = []
+            if pending:
+                self._add_batch(pending)
+    
+    def _add_batch(self, chunks: List[Dict]):
+        # Reject a bad batch before it trains the index or uses up uids
+        self.chunks.check(chunks)
+        embeddings = prepare([chunk["embedding"] for chunk in chunks], self.index_type)
+        if not self.index.is_trained:
+            self.train(embeddings)
+        uids = np.arange(self.next_id, self.next_id + len(chunks), dtype="int64")
+        self.next_id += len(chunks)
+        # Store first, so any uid a concurrent search finds already has its row
+        self.chunks.extend(dict(chunk, uid=int(uid)) for chunk, uid in zip(chunks, uids))
+        with self._index_lock:
+            self.index.add_with_ids(embeddings, uids)
+            if self.bm25 is not None:
+                self.bm25.add(uids.tolist(), (chunk["text"] for chunk in chunks))
+            self.metadata.add(uids, chunks)
+        if self.doc_chunks is not None:
+            for chunk, uid in zip(chunks, uids):
+                if "doc_id" in chunk:
+                    self.doc_chunks.setdefault(chunk["doc_id"], array("q")).append(uid)
+    
+    def _documents(self) -> Dict:
+        """doc_id -> uids of its live chunks."""
+        if self.doc_chunks is None:
+            self.doc_chunks = {}
+            if "doc_id" in self.chunks.kinds:
+                for doc_id, uid in zip(self.chunks.values("doc_id"), self.chunks.column("uid").tolist()):
+                    if doc_id is not None and uid not in self.deleted:
+                        self.doc_chunks.setdefault(doc_id, array("q")).append(uid)
+        return self.doc_chunks
+    
+    def upsert_document(self, doc_id, chunks: Union[List[Dict], Iterable[List[Dict]]]):
+        """Replace every chunk of `doc_id` with `chunks` (embedded, as for add_documents).
+        
+        The new chunks are added before the old ones are deleted, so the
+        document never disappears from search results.
+        """
+        if isinstance(chunks, list) and (not chunks or isinstance(chunks[0], dict)):
+            chunks = [chunks]
+        with self._write_lock:
+            old = set(self._documents().get(doc_id, ()))
+            self.add_documents([dict(chunk, doc_id=doc_id) for chunk in batch] for batch in chunks)
+            self._delete(doc_id, old)
     
-    def add_documents(self, chunks: List[Dict]):
-        """Add chunks with embeddings to index."""
-        embeddings = np.array([chunk["embedding"] for chunk in chunks]).astype('float32')
-        self.index.add(embeddings)
-        self.chunks.extend(chunks)
+    def delete_document(self, doc_id) -> int:
+        """Remove all chunks of `doc_id`; returns how many were removed."""
+        with self._write_lock:
+            return self._delete(doc_id, set(self._documents().get(doc_id, ())))
     
-    def search(self, query: str, top_k: int = 5) -> List[Dict]:
+    def _delete(self, doc_id, uids: set) -> int:
+        if self.read_only:
+            raise RuntimeError("Index was loaded with mmap=True and is read-only; load(mmap=False) to delete")
+        documents = self._documents()
+        remaining = array("q", (uid for uid in documents.pop(doc_id, ()) if uid not in uids))
+        if remaining:
+            documents[doc_id] = remaining
+        if not uids:
+            return 0
+        with self._index_lock:
+            self.deleted |= uids
+            self._selector = None
+            if self.bm25 is not None:
+                self.bm25.remove(uids)
+        if len(self.deleted) >= self.COMPACT_RATIO * self.index.ntotal:
+            self.compact(background=True)
+        return len(uids)
+    
+    def compact(self, background: bool = False):
+        """Physically drop deleted chunks from the index and chunk store.
+        
+        The new index is built off to the side; searches keep using the current
+        one until it is swapped in. Writers wait while compaction runs.
+        """
+        if background:
+            if self._compaction is None or not self._compaction.is_alive():
+                self._compaction = threading.Thread(target=self.compact, daemon=True)
+                self._compaction.start()
+            return self._compaction
+        
+        if self.read_only:
+            raise RuntimeError("Index was loaded with mmap=True and is read-only; load(mmap=False) to compact")
+        with self._write_lock:
+            if not self.deleted:
+                return
+            dead = np.fromiter(self.deleted, dtype="int64", count=len(self.deleted))
+            if self.index_type == "hnsw":
+                # HNSW graphs can't remove nodes: rebuild from the stored vectors
+                ids = faiss.vector_to_array(self.index.id_map)
+                keep = ~np.isin(ids, dead)
+                vectors = self.index.index.reconstruct_n(0, self.index.ntotal)
+                index = with_ids(build_index(self.index_type, self.dimension, **self.index_options))
+                set_search_params(index, ef_search=faiss.downcast_index(self.index.index).hnsw.efSearch)
+                index.add_with_ids(vectors[keep], ids[keep])
+            else:
+                index = faiss.clone_index(self.index)
+                index.remove_ids(faiss.IDSelectorBatch(dead))
+            store, uids = self._rows()
+            store = store.take(np.flatnonzero(~np.isin(uids, dead)))
+            bm25 = self.bm25.compacted() if self.bm25 is not None else None
+            
+            with self._index_lock:
+                self.index, self.chunks, self.bm25 = index, store, bm25
+                self.metadata = MetadataIndex()  # drops deleted uids; rebuilt on next filter
+                self.deleted = set()
+                self._selector = None
+                self._row_cache = None
+    
+    def _rows(self):
+        """(chunk store, uid of each row); uids ascend, so hits are found by binary search."""
+        store = self.chunks
+        if self._row_cache is None or self._row_cache[0] is not store or len(self._row_cache[1]) != len(store):
+            uids = store.column("uid") if len(store) else np.zeros(0, dtype="int64")
+            self._row_cache = (store, uids)
+        return self._row_cache
+    
+    def _search_params(self):
+        """FAISS search parameters that skip tombstoned uids (None if there are none)."""
+        if not self.deleted:
+            return None
+        if self._selector is None:
+            dead_uids = np.fromiter(self.deleted, dtype="int64", count=len(self.deleted))
+            dead = faiss.IDSelectorBatch(dead_uids)
+            live = faiss.IDSelectorNot(dead)
+            # Keep the selectors referenced: the params only hold pointers
+            self._selector = (dead_uids, dead, live, search_params(self.index, live))
+        return self._selector[3]
+    
+    def _allowed(self, filters: Dict) -> np.ndarray:
+        """Packed bitmap of live uids matching every filter (call under _index_lock)."""
+        if not len(self.chunks):
+            return np.zeros((self.next_id + 7) // 8, dtype="uint8")
+        matching = None
+        for name, condition in filters.items():
+            if name not in self.metadata.attributes:
+                if name not in self.chunks.kinds:
+                    raise ValueError(f"Can't filter on {name!r}: chunks have no such field")
+                store, uids = self._rows()
+                self.metadata.index(name, uids, store.values(name))
+            bitmap = self.metadata.match(name, condition)
+            matching = bitmap if matching is None else matching & bitmap
+        allowed = matching.to_bitmap(self.next_id)
+        if self._search_params() is not None:
+            dead = self._selector[0]
+            np.bitwise_and.at(allowed, dead >> 3, ~(1 << (dead & 7)).astype("uint8"))
+        return allowed
+    
+    def save(self, directory: str):
+        """Write index.faiss, db.json and the chunk columns to `directory`."""
+        os.makedirs(directory, exist_ok=True)
+        with self._write_lock:
+            write_index(self.index, os.path.join(directory, "index.faiss"))
+            self.chunks.save(directory)
+            if self.bm25 is not None:
+                self.bm25.save(directory)
+            with open(os.path.join(directory, "db.json"), "w") as f:
+                json.dump({"dimension": self.dimension, "index_type": self.index_type,
+                           "index_options": self.index_options, "next_id": self.next_id,
+                           "deleted": sorted(self.deleted), "keyword_index": self.bm25 is not None}, f)
+    
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True, embedder: Optional[BatchEmbedder] = None,
+             nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> "FAISSVectorDB":
+        """Open a saved database. With mmap (default) it's read-only, loads in
+        constant time, and processes opening the same directory share memory.
+        nprobe/ef_search default to the values the index was saved with.
+        """
+        with open(os.path.join(directory, "db.json")) as f:
+            config = json.load(f)
+        db = cls(config["dimension"], config["index_type"], embedder=embedder, **config["index_options"])
+        db.index = read_index(os.path.join(directory, "index.faiss"), db.index_type, mmap=mmap)
+        db.tune(nprobe=nprobe, ef_search=ef_search)
+        db.chunks = ChunkStore(directory)
+        if config.get("keyword_index"):
+            db.bm25 = BM25Index.load(directory)
+        db.next_id = config["next_id"]
+        db.deleted = set(config["deleted"])
+        db.read_only = mmap
+        return db
+    
+    def embed_queries(self, queries: List[str]):
+        if self.embedder is not None:
+            return self.embedder.embed(queries)
+        return generate_embeddings(queries)
+    
+    def search(self, query: str, top_k: int = 5, mode: str = "vector",
+               filters: Optional[Dict] = None) -> List[Dict]:
         """Search for relevant chunks."""
-        query_embedding = generate_embedding(query)
-        query_vector = np.array([query_embedding]).astype('float32')
+        return self.search_batch([query], top_k, mode, filters)[0]
+    
+    def search_batch(self, queries: List[str], top_k: int = 5, mode: str = "vector",
+                     filters: Optional[Dict] = None) -> List[List[Dict]]:
+        """Search many queries at once: embeddings in batches, one FAISS search.
         
-        distances, indices = self.index.search(query_vector, top_k)
+        Returns one result list per query, in order. Much faster than calling
+        search() in a loop (FAISS scans the index once for the whole matrix).
         
+        mode: "vector" (dense, default), "keyword" (BM25 only, no embedding
+        call) or "hybrid" (both rankings fused with RRF; "score" is then the
+        fused score). In hybrid mode, ID-like queries such as "ORD-10442" that
+        BM25 matches return the keyword matches first (BM25 scores), topped up
+        to top_k with vector results; the embedding call is skipped only when
+        the keyword matches alone fill top_k.
+        
+        filters: {field: value / [values] / {"$gte": ...}} applied to every
+        query (see metadata_index.py); only matching chunks are returned.
+        """
+        if mode not in self.SEARCH_MODES:
+            raise ValueError(f"mode must be one of {self.SEARCH_MODES}")
+        if mode != "vector" and self.bm25 is None:
+            raise ValueError(f'mode="{mode}" needs FAISSVectorDB(keyword_index=True)')
+        if not queries:
+            return []
+        # Over-fetch for fusion: rankings lose -1 padding and deleted uids
+        fetch_k = max(2 * top_k, self.HYBRID_CANDIDATES) if mode == "hybrid" else top_k
+        
+        allowed = None
+        if filters:
+            with self._index_lock:
+                allowed = self._allowed(filters)
+            if not allowed.any():
+                return [[] for _ in queries]  # nothing matches: skip embedding and search
+        
+        keyword = {}
+        if mode != "vector":
+            with self._index_lock:
+                keyword = {i: self.bm25.search(query, fetch_k, allowed) for i, query in enumerate(queries)}
+        keyword_first = {i for i, query in enumerate(queries)
+                         if mode == "hybrid" and is_keyword_query(query) and len(keyword[i][0])}
+        vector_queries = [i for i in range(len(queries)) if mode == "vector" or (
+            mode == "hybrid" and (i not in keyword_first or len(keyword[i][0]) < top_k))]
+        
+        vector = {}
+        if vector_queries:
+            query_vectors = prepare(self.embed_queries([queries[i] for i in vector_queries]), self.index_type)
+            with self._index_lock:
+                if allowed is None:
+                    params = self._search_params()
+                else:
+                    # Tombstones are already cleared from `allowed`; the selector
+                    # only points at the bitmap, which stays referenced here
+                    selector = faiss.IDSelectorBitmap(len(allowed) * 8, faiss.swig_ptr(allowed))
+                    params = search_params(self.index, selector)
+                distances, uids = self.index.search(query_vectors, fetch_k, params=params)
+            vector = dict(zip(vector_queries, zip(uids, to_scores(distances, self.index_type))))
+        
+        with self._index_lock:
+            store, row_uids = self._rows()
         results = []
-        for distance, idx in zip(distances[0], indices[0]):
-            chunk = self.chunks[idx].copy()
-            chunk["score"] = float(1 / (1 + distance))
-            results.append(chunk)
+        for i in range(len(queries)):
+            if i in keyword_first and i in vector:
+                # Exact keyword matches first, then vector results they don't repeat
+                new = ~np.isin(vector[i][0], keyword[i][0])
+                uids = np.concatenate([keyword[i][0], vector[i][0][new]])
+                scores = np.concatenate([keyword[i][1], vector[i][1][new]])
+            elif i in vector and i in keyword:
+                uids, scores = reciprocal_rank_fusion([vector[i][0], keyword[i][0]])
+            else:
+                uids, scores = vector[i] if i in vector else keyword[i]
+            rows = np.searchsorted(row_uids, uids)
+            
+            hits = []
+            for score, uid, row in zip(scores.tolist(), uids.tolist(), rows.tolist()):
+                if len(hits) == top_k:
+                    break
+                # -1: approximate indexes may find fewer than top_k; a uid can also
+                # be gone if a compaction swapped the store in since the search
+                if uid == -1 or row >= len(row_uids) or row_uids[row] != uid:
+                    continue
+                chunk = store[row]  # a new dict, built only for the hits
+                chunk["score"] = score
+                hits.append(chunk)
+            results.append(hits)
         
         return results
 
-def answer_with_rag(query: str, vector_db: FAISSVectorDB) -> Dict:
-    """Answer query using RAG."""
+def answer_with_rag(query: str, vector_db: FAISSVectorDB, reranker: Optional[Reranker] = None,
+                    top_k: int = 3, candidates: int = 20,
+                    context_builder: Optional[ContextBuilder] = None) -> Dict:
+    """Answer query using RAG.
+    
+    With a reranker, `candidates` chunks are retrieved and the reranker keeps
+    the best top_k. "timings" reports retrieval, rerank and LLM time (ms).
+    
+    The context is built by context_builder (default ContextBuilder(): merged
+    overlapping chunks, no near-duplicates, at most 2000 tokens). "citations"
+    maps each [n] in the answer to the chunks behind it; "sources" lists the
+    chunks that made it into the context.
+    """
     # Retrieve context
-    results = vector_db.search(query, top_k=3)
-    context = "\n\n".join([f"[{i+1}] {r['text']}" for i, r in enumerate(results)])
+    timings = {}
+    start = time.perf_counter()
+    results = vector_db.search(query, top_k=candidates if reranker else top_k)
+    timings["retrieve_ms"] = (time.perf_counter() - start) * 1000
+    if reranker is not None:
+        start = time.perf_counter()
+        results = reranker.rerank(query, results, top_k)
+        timings["rerank_ms"] = (time.perf_counter() - start) * 1000
+    built = (context_builder or ContextBuilder()).build(results)
+    context = built["context"]
     
     # Build prompt
     prompt = f"Context:\n{context}\n\nQuestion: {query}\n\nAnswer:"
     
     # Get LLM response
+    start = time.perf_counter()
     response = client.chat.completions.create(
         model="gpt-4o-mini",
         messages=[
@@ -91,10 +501,14 @@ def answer_with_rag(query: str, vector_db: FAISSVectorDB) -> Dict:
             {"role": "user", "content": prompt}
         ]
     )
+    timings["llm_ms"] = (time.perf_counter() - start) * 1000
     
     return {
         "answer": response.choices[0].message.content,
-        "sources": results
+        "sources": [hit for citation in built["citations"] for hit in citation["sources"]],
+        "citations": built["citations"],
+        "context_tokens": built["tokens"],
+        "timings": timings
     }
 
 # Example usage
@@ -106,17 +520,25 @@ if __name__ == "__main__":
         "SQL is used for databases and was developed by IBM in the 1970s."
     ]
     
-    # Chunk and embed
+    # Chunk, then embed in batches (one request per ~2048 chunks, not per chunk)
     chunks = []
-    for doc in docs:
-        doc_chunks = chunk_text(doc, chunk_size=100)
-        for chunk in doc_chunks:
-            chunk["embedding"] = generate_embedding(chunk["text"])
-        chunks.extend(doc_chunks)
-    
-    # Build index
-    db = FAISSVectorDB()
-    db.add_documents(chunks)
+    for doc_id, doc in enumerate(docs):
+        for chunk in chunk_text(doc, chunk_size=100):
+            chunk["doc_id"] = doc_id
+            chunks.append(chunk)
+    
+    # Build index from the stream of embedded batches. The on-disk cache means
+    # re-running this only embeds chunks whose text changed.
+    embedder = BatchEmbedder(client, cache=EmbeddingCache(".embedding_cache"))
+    db = FAISSVectorDB(embedder=embedder)
+    db.add_documents(embedder.embed_chunks(chunks))
+    
+    # When a document changes, replace just its chunks (no rebuild)
+    docs[0] += " Python 3.0 was released in 2008."
+    db.upsert_document(0, embedder.embed_chunks(chunk_text(docs[0], chunk_size=100)))
+    
+    # Persist it; workers then start with FAISSVectorDB.load("rag_index", embedder=embedder)
+    db.save("rag_index")
     
     # Query
     result = answer_with_rag("Who created Python?", db)
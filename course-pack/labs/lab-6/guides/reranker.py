@@ -0,0 +1,155 @@
+"""
+Cross-encoder reranking of retrieved chunks (used by answer_with_rag).
+
+Bi-encoder search (one vector per chunk, compared to one vector per query)
+is fast but coarse. A cross-encoder reads the query and a chunk together
+and scores how well the chunk answers it, which is far more precise, but
+it needs one model call per (query, chunk) pair. So: retrieve ~20
+candidates, rerank them, keep the best 3. Precision at a small top_k lets
+answer_with_rag send a shorter context to the LLM.
+
+Reranker runs the model locally on CPU:
+
+    - pairs are batched, sorted by length so each batch pads little
+    - ONNX Runtime with int8 dynamic quantization (onnx_scorer), or a
+      sentence-transformers CrossEncoder (torch_scorer, int8 via torch)
+    - scores are cached per (query, chunk text), so repeated questions
+      and overlapping candidate lists only score new pairs
+    - stats/last_ms report the rerank latency apart from retrieval and LLM
+
+    reranker = Reranker(onnx_scorer("reranker_onnx/model.onnx"))
+    hits = reranker.rerank(query, db.search(query, top_k=20), top_k=3)
+
+Export the default model to ONNX once with:
+optimum-cli export onnx --model cross-encoder/ms-marco-MiniLM-L-6-v2 --task text-classification reranker_onnx/
+
+Dependencies (either backend):
+pip install onnxruntime tokenizers
+pip install sentence-transformers
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+DEFAULT_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"  # 22M parameters, fast enough for CPU
+
+# (query, passage) pairs -> one relevance score per pair
+Scorer = Callable[[List[Tuple[str, str]]], np.ndarray]
+
+def onnx_scorer(
+    model_path: str,
+    tokenizer: str = DEFAULT_MODEL,
+    max_length: int = 256,
+    quantize: bool = True,
+    threads: Optional[int] = None
+) -> Scorer:
+    """Score pairs with an exported cross-encoder in ONNX Runtime (CPU).
+    
+    With quantize, weights are converted to int8 once (model.int8.onnx next
+    to the original) and that file is used: faster on CPU, with near-identical ranking.
+    """
+    import onnxruntime as ort
+    from tokenizers import Tokenizer
+    if quantize and not model_path.endswith(".int8.onnx"):
+        quantized = model_path[:-len(".onnx")] + ".int8.onnx"
+        if not os.path.exists(quantized):
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            quantize_dynamic(model_path, quantized, weight_type=QuantType.QInt8)
+        model_path = quantized
+    options = ort.SessionOptions()
+    if threads:
+        options.intra_op_num_threads = threads
+    session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+    inputs = {i.name for i in session.get_inputs()}
+    encoder = Tokenizer.from_pretrained(tokenizer)
+    encoder.enable_truncation(max_length)
+    encoder.enable_padding()  # to the longest pair in the batch
+    
+    def score(pairs: List[Tuple[str, str]]) -> np.ndarray:
+        encodings = encoder.encode_batch(pairs)
+        feed = {"input_ids": np.array([e.ids for e in encodings], dtype="int64"),
+                "attention_mask": np.array([e.attention_mask for e in encodings], dtype="int64")}
+        if "token_type_ids" in inputs:
+            feed["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype="int64")
+        logits = session.run(None, feed)[0]
+        return logits[:, 0] if logits.ndim == 2 else logits
+    
+    return score
+
+def torch_scorer(model: str = DEFAULT_MODEL, max_length: int = 256, quantize: bool = True) -> Scorer:
+    """Score pairs with a sentence-transformers CrossEncoder on CPU (int8 Linear layers)."""
+    import torch
+    from sentence_transformers import CrossEncoder
+    encoder = CrossEncoder(model, max_length=max_length, device="cpu")
+    if quantize:
+        encoder.model = torch.quantization.quantize_dynamic(encoder.model, {torch.nn.Linear}, dtype=torch.qint8)
+    
+    def score(pairs: List[Tuple[str, str]]) -> np.ndarray:
+        return np.asarray(encoder.predict(pairs, batch_size=len(pairs), show_progress_bar=False), dtype="float32")
+    
+    return score
+
+class Reranker:
+    def __init__(self, scorer: Optional[Scorer] = None, batch_size: int = 32, cache_size: int = 100_000):
+        """scorer defaults to torch_scorer() (downloads DEFAULT_MODEL on first use)."""
+        self.scorer = scorer or torch_scorer()
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self.cache: "OrderedDict[bytes, float]" = OrderedDict()  # LRU
+        self.stats = {"queries": 0, "pairs": 0, "cached": 0, "batches": 0, "seconds": 0.0}
+        self.last_ms = 0.0
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _key(query: str, text: str) -> bytes:
+        return hashlib.blake2b(f"{query}\0{text}".encode("utf-8"), digest_size=16).digest()
+    
+    def score(self, query: str, texts: Sequence[str]) -> np.ndarray:
+        """Relevance of each text to the query (cached pairs aren't rescored)."""
+        start = time.perf_counter()
+        keys = [self._key(query, text) for text in texts]
+        scores = np.empty(len(texts), dtype="float32")
+        todo = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                if key in self.cache:
+                    self.cache.move_to_end(key)
+                    scores[i] = self.cache[key]
+                else:
+                    todo.append(i)
+        
+        # Similar lengths in each batch: less padding, so less wasted compute
+        todo.sort(key=lambda i: len(texts[i]))
+        batches = 0
+        for b in range(0, len(todo), self.batch_size):
+            batch = todo[b:b + self.batch_size]
+            scores[batch] = self.scorer([(query, texts[i]) for i in batch])
+            batches += 1
+        
+        with self._lock:
+            for i in todo:
+                self.cache[keys[i]] = float(scores[i])
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+            seconds = time.perf_counter() - start
+            self.stats["queries"] += 1
+            self.stats["pairs"] += len(texts)
+            self.stats["cached"] += len(texts) - len(todo)
+            self.stats["batches"] += batches
+            self.stats["seconds"] += seconds
+            self.last_ms = seconds * 1000
+        return scores
+    
+    def rerank(self, query: str, hits: List[Dict], top_k: int = 3) -> List[Dict]:
+        """The top_k hits by cross-encoder score ("rerank_score"; "score" keeps the retrieval score)."""
+        if not hits:
+            self.last_ms = 0.0
+            return []
+        scores = self.score(query, [hit["text"] for hit in hits])
+        order = np.argsort(-scores, kind="stable")[:top_k]
+        return [dict(hits[i], rerank_score=float(scores[i])) for i in order]
@@ -0,0 +1,216 @@
+"""
+FAISS index choices for FAISSVectorDB (used by rag-pipeline-examples.py).
+
+    flat_ip   exact search, cosine similarity (vectors L2-normalized)     default
+    ivf_flat  inverted lists: scans `nprobe` of `nlist` clusters          needs training
+    hnsw      graph search: `ef_search` candidates per query              no training
+    ivf_pq    IVF + product quantization: ~`pq_m` bytes per vector        needs training
+    flat_l2   exact L2 distance (the original behaviour)
+
+read_index() maps saved indexes instead of reading them into RAM; a mapped
+index is read-only.
+
+All except flat_l2 use inner product on normalized vectors, so a score is the
+cosine similarity: 1.0 is identical, and scores are comparable across queries.
+
+Recall vs. latency report against flat_ip on synthetic data:
+    python vector_indexes.py --n 100000 --dim 384
+"""
+
+import os
+import time
+from typing import Dict, List, Optional
+import numpy as np
+import faiss
+
+INDEX_TYPES = ("flat_ip", "ivf_flat", "hnsw", "ivf_pq", "flat_l2")
+
+def uses_cosine(index_type: str) -> bool:
+    return index_type != "flat_l2"
+
+def build_index(
+    index_type: str,
+    dimension: int,
+    nlist: int = 1024,
+    pq_m: int = 64,
+    pq_bits: int = 8,
+    hnsw_m: int = 32,
+    ef_construction: int = 200
+) -> faiss.Index:
+    """Create an empty index. nlist ~ 4*sqrt(N) is a good start for IVF."""
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"index_type must be one of {INDEX_TYPES}")
+    metric = faiss.METRIC_INNER_PRODUCT
+    
+    if index_type == "flat_l2":
+        return faiss.IndexFlatL2(dimension)
+    if index_type == "flat_ip":
+        return faiss.IndexFlatIP(dimension)
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, hnsw_m, metric)
+        index.hnsw.efConstruction = ef_construction
+        return index
+    
+    quantizer = faiss.IndexFlatIP(dimension)
+    if index_type == "ivf_flat":
+        index = faiss.IndexIVFFlat(quantizer, dimension, nlist, metric)
+    else:
+        if dimension % pq_m:
+            raise ValueError(f"pq_m ({pq_m}) must divide the dimension ({dimension})")
+        index = faiss.IndexIVFPQ(quantizer, dimension, nlist, pq_m, pq_bits, metric)
+    return index
+
+def with_ids(index: faiss.Index) -> faiss.Index:
+    """An index that takes add_with_ids()/remove_ids() with caller-chosen ids.
+    
+    IVF lists store ids natively (wrapping them in IndexIDMap would break
+    remove_ids); the other types get an IndexIDMap.
+    """
+    if isinstance(index, faiss.IndexIVF):
+        return index
+    return faiss.IndexIDMap(index)
+
+def min_training_vectors(index: faiss.Index) -> int:
+    """Fewest vectors train() accepts: one per IVF list, and for IVF-PQ one
+    per PQ centroid (2**pq_bits) too. 0 for indexes that need no training."""
+    if index.is_trained:
+        return 0
+    ivf = faiss.downcast_index(faiss.extract_index_ivf(index))
+    if isinstance(ivf, faiss.IndexIVFPQ):
+        return max(ivf.nlist, 1 << ivf.pq.nbits)
+    return ivf.nlist
+
+def set_search_params(index: faiss.Index, nprobe: Optional[int] = None,
+                      ef_search: Optional[int] = None):
+    """Speed/recall knobs: more probes or candidates = better recall, slower."""
+    if nprobe is not None:
+        try:
+            faiss.extract_index_ivf(index).nprobe = nprobe
+        except RuntimeError:
+            pass  # not an IVF index
+    if ef_search is not None:
+        inner = faiss.downcast_index(index.index) if hasattr(index, "id_map") else index
+        if isinstance(inner, faiss.IndexHNSW):
+            inner.hnsw.efSearch = ef_search
+
+def search_params(index: faiss.Index, selector: faiss.IDSelector) -> faiss.SearchParameters:
+    """Parameters that make a search skip ids `selector` rejects (inside the scan).
+    
+    IVF and HNSW need their own parameter types, which would otherwise reset
+    nprobe / ef_search to defaults, so the index's current values are copied.
+    """
+    inner = faiss.downcast_index(index.index) if hasattr(index, "id_map") else index
+    if isinstance(inner, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=inner.nprobe)
+    if isinstance(inner, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=inner.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+def prepare(vectors, index_type: str) -> np.ndarray:
+    """float32, C-contiguous, and L2-normalized for the cosine index types."""
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    if vectors.ndim == 1:
+        vectors = vectors.reshape(1, -1)
+    if uses_cosine(index_type):
+        vectors = vectors.copy() if not vectors.flags.writeable else vectors
+        faiss.normalize_L2(vectors)
+    return vectors
+
+def to_scores(distances: np.ndarray, index_type: str) -> np.ndarray:
+    """Cosine similarity for the cosine types, 1/(1+d) for flat_l2."""
+    if uses_cosine(index_type):
+        return distances
+    return 1 / (1 + distances)
+
+def write_index(index: faiss.Index, path: str):
+    """Write via a temp file + rename, so processes mapping the old file are unaffected."""
+    faiss.write_index(index, path + ".tmp")
+    os.replace(path + ".tmp", path)
+
+def read_index(path: str, index_type: str, mmap: bool = True) -> faiss.Index:
+    """Load an index; with mmap, vectors stay in the (shared) OS page cache.
+    
+    IO_FLAG_MMAP maps IVF inverted lists; flat and HNSW storage needs
+    IO_FLAG_MMAP_IFC (faiss >= 1.8). Adding to a mapped index is not allowed.
+    """
+    if not mmap:
+        return faiss.read_index(path)
+    if index_type.startswith("ivf"):
+        return faiss.read_index(path, faiss.IO_FLAG_MMAP)
+    return faiss.read_index(path, getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP))
+
+# ============================================================================
+# RECALL / LATENCY REPORT
+# ============================================================================
+
+def synthetic_vectors(n: int, dim: int, clusters: int = 200, seed: int = 0) -> np.ndarray:
+    """Clustered random vectors (embeddings are clustered, uniform noise is not)."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype("float32")
+    labels = rng.integers(0, clusters, n)
+    return centers[labels] + 0.5 * rng.standard_normal((n, dim)).astype("float32")
+
+def recall_report(
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    k: int = 10,
+    nlist: Optional[int] = None,
+    pq_m: int = 16,
+    nprobes: List[int] = (1, 4, 16, 64),
+    ef_searches: List[int] = (16, 64, 256)
+) -> List[Dict]:
+    """recall@k and per-query latency of each index type vs. exact flat_ip."""
+    nlist = nlist or max(16, int(4 * np.sqrt(len(vectors))))
+    vectors = prepare(vectors, "flat_ip")
+    queries = prepare(queries, "flat_ip")
+    
+    rows = []
+    def measure(name: str, index: faiss.Index, setting: str, build_s: float):
+        start = time.perf_counter()
+        _, ids = index.search(queries, k)
+        ms = (time.perf_counter() - start) * 1000 / len(queries)
+        recall = np.mean([len(set(found) & set(true)) / k for found, true in zip(ids, truth)])
+        rows.append({"index": name, "setting": setting, "recall": float(recall),
+                     "ms_per_query": ms, "build_s": build_s})
+    
+    start = time.perf_counter()
+    flat = build_index("flat_ip", vectors.shape[1])
+    flat.add(vectors)
+    build_s = time.perf_counter() - start
+    _, truth = flat.search(queries, k)
+    measure("flat_ip", flat, "exact", build_s)
+    
+    for index_type in ("ivf_flat", "ivf_pq", "hnsw"):
+        start = time.perf_counter()
+        index = build_index(index_type, vectors.shape[1], nlist=nlist, pq_m=pq_m)
+        if not index.is_trained:
+            index.train(vectors[:min(len(vectors), 256 * nlist)])
+        index.add(vectors)
+        build_s = time.perf_counter() - start
+        if index_type == "hnsw":
+            for ef in ef_searches:
+                set_search_params(index, ef_search=ef)
+                measure(index_type, index, f"ef_search={ef}", build_s)
+        else:
+            for nprobe in nprobes:
+                set_search_params(index, nprobe=nprobe)
+                measure(index_type, index, f"nprobe={nprobe}", build_s)
+    return rows
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Recall vs. latency of FAISS index types")
+    parser.add_argument("--n", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--pq-m", type=int, default=16)
+    args = parser.parse_args()
+    
+    data = synthetic_vectors(args.n + args.queries, args.dim)
+    report = recall_report(data[:args.n], data[args.n:], args.k, pq_m=args.pq_m)
+    print(f"{args.n} vectors x {args.dim} dims, recall@{args.k} vs. flat_ip\n")
+    print(f"{'index':10} {'setting':16} {'recall':>8} {'ms/query':>10} {'build s':>9}")
+    for row in report:
+        print(f"{row['index']:10} {row['setting']:16} {row['recall']:8.3f} "
+              f"{row['ms_per_query']:10.3f} {row['build_s']:9.1f}")